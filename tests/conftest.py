@@ -0,0 +1,15 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pytest
+
+from yaga_modules.interface_objects import lsl_stream_hub
+
+
+@pytest.fixture(autouse=True)
+def resetLSLStreamHub():
+    # the tests register streams, processor chains and signal graphs on the module-level hub; they must not leak into other tests
+    yield
+    lsl_stream_hub.reset()
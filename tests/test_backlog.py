@@ -0,0 +1,61 @@
+import time
+
+import numpy as np
+import pylsl
+import pytest
+
+from yaga_modules.interface_objects import LSLStream
+
+
+FS = 600.0
+FRAME_RATE = 60.0
+EXPECTED_SAMPLES = 10 # FS / FRAME_RATE
+
+
+@pytest.fixture(scope='module')
+def outlet():
+    return pylsl.StreamOutlet(pylsl.StreamInfo('yaga_test_backlog', 'EMG', 2, FS, pylsl.cf_float32, 'yaga_test_backlog'))
+
+
+def pushFrame(outlet, stream, n_samples):
+    # pushes the samples of a frame and waits until the inlet received them
+    outlet.push_chunk(np.zeros((n_samples, 2), dtype=np.float32))
+    deadline = time.perf_counter() + 2
+    while stream.inlet.samples_available() < n_samples and time.perf_counter() < deadline:
+        time.sleep(0.005)
+
+
+@pytest.mark.parametrize('catchup_frames', [1, 5, 10])
+def test_catchup_processes_the_backlog_within_catchup_frames(outlet, catchup_frames):
+    stream = LSLStream('yaga_test_backlog', backlog_policy='catchup', catchup_frames=catchup_frames)
+    stream.inlet.open_stream()
+    time.sleep(0.3)
+    stream.pull(FRAME_RATE) # drop samples pushed for previous tests
+
+    for _ in range(3):
+        pushFrame(outlet, stream, EXPECTED_SAMPLES)
+        stream.pull(FRAME_RATE)
+        assert stream.backlog == 0
+
+    # hiccup: the samples of 9 frames arrive at once
+    pushFrame(outlet, stream, 9*EXPECTED_SAMPLES)
+    stream.pull(FRAME_RATE)
+    backlogs = [stream.backlog]
+    processed_samples = [stream.samples.shape[1]]
+    for _ in range(catchup_frames - 1):
+        pushFrame(outlet, stream, EXPECTED_SAMPLES)
+        stream.pull(FRAME_RATE)
+        backlogs.append(stream.backlog)
+        processed_samples.append(stream.samples.shape[1])
+
+    assert backlogs[-1] == 0, backlogs
+    assert all(earlier > later for earlier, later in zip(backlogs, backlogs[1:]) if earlier > 0), backlogs
+    # the backlog is processed in equal parts (the last part can be smaller)
+    assert len(set(processed_samples[:-1])) <= 1, processed_samples
+    assert stream.statistics()['overflows'] == 1
+
+    # a second hiccup is a second overflow
+    pushFrame(outlet, stream, 9*EXPECTED_SAMPLES)
+    stream.pull(FRAME_RATE)
+    assert stream.statistics()['overflows'] == 2
+    stream.inlet.close_stream()
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+from yaga_modules.interface_objects import ProcessorChainPlan, SignalProcessor
+from yaga_modules.signal_processing import BandPower, ButterFilter, MovAvg, Power
+
+
+BANDS = ((4, 8), (8, 13), (13, 30), (30, 45), (45, 70), (70, 100)) # [Hz]
+
+
+@pytest.mark.parametrize('n_bands', [1, 2, 6])
+@pytest.mark.parametrize('chunk_size', [7, 35])
+def test_band_power_equals_one_chain_per_band(n_bands, chunk_size):
+    fs = 1000.0
+    n_channels = 3
+    window_length = 0.25
+    bands = BANDS[:n_bands]
+    samples = np.random.default_rng(n_bands).standard_normal((n_channels, 2000))
+    band_chain_plans = [ProcessorChainPlan([SignalProcessor(ButterFilter(4, band, 'bandpass'), None), SignalProcessor(Power(2), None), SignalProcessor(MovAvg(window_length), None)],
+                                           n_channels, 2*chunk_size, fs) for band in bands]
+    band_power_plan = ProcessorChainPlan([SignalProcessor(BandPower(bands, 4, window_length), None)], n_channels, 2*chunk_size, fs)
+
+    for idx in range(0, samples.shape[1], chunk_size):
+        chunk = samples[:, idx:idx + chunk_size]
+        band_outputs = np.concatenate([band_chain_plan.run(chunk).copy() for band_chain_plan in band_chain_plans], axis=0) # band-major
+        np.testing.assert_allclose(band_power_plan.run(chunk), band_outputs, rtol=0, atol=1e-9)
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+import pyxdf
+
+from yaga_modules import calibration
+from yaga_modules.signal_processing import MaxAvgPowerNormalizationXDF, MaxEuclidNormalizationXDF
+
+
+@pytest.fixture
+def xdf_file(tmp_path, monkeypatch):
+    # calibration file with a data stream and a marker stream; pyxdf.load_xdf is replaced, so that the number of parsed files can be counted
+    rng = np.random.default_rng(0)
+    n_samples = 20000
+    data_stream = {'info': {'name': ['emg'], 'nominal_srate': ['1000']}, 'time_series': rng.standard_normal((n_samples, 3)) + 2,
+                   'time_stamps': 100 + np.arange(n_samples) / 1000}
+    marker_stream = {'info': {'name': ['markers'], 'nominal_srate': ['0']}, 'time_series': [['start'], ['end']], 'time_stamps': np.array([102.0, 115.0])}
+    parsed_files = []
+
+    def loadXdf(file_name, select_streams=None):
+        parsed_files.append(file_name)
+        return [data_stream, marker_stream], None
+
+    monkeypatch.setattr(pyxdf, 'load_xdf', loadXdf)
+    monkeypatch.setattr(calibration, '_loaded_streams', {})
+    xdf_file = tmp_path / 'calibration.xdf'
+    xdf_file.write_bytes(rng.bytes(1000))
+    return xdf_file, parsed_files
+
+
+def test_disabled_cache_is_neither_read_nor_written(xdf_file):
+    xdf_file, parsed_files = xdf_file
+    for _ in range(2):
+        MaxAvgPowerNormalizationXDF(str(xdf_file), 'emg', 'markers', 'start', 'end', use_cache=False)
+        MaxEuclidNormalizationXDF(str(xdf_file), 'emg', 'markers', 'start', 'end', use_cache=False)
+    assert len(parsed_files) == 4 # every calibration parses the XDF file
+    assert not (xdf_file.parent / calibration.CACHE_DIRECTORY).exists()
+
+
+def test_only_the_constants_are_cached_by_default(xdf_file):
+    xdf_file, parsed_files = xdf_file
+    normalization = MaxAvgPowerNormalizationXDF(str(xdf_file), 'emg', 'markers', 'start', 'end')
+    calibration._loaded_streams.clear()
+    cached_normalization = MaxAvgPowerNormalizationXDF(str(xdf_file), 'emg', 'markers', 'start', 'end') # cached constants
+    assert len(parsed_files) == 1
+    assert cached_normalization.max_value == normalization.max_value
+    cache_files = list((xdf_file.parent / calibration.CACHE_DIRECTORY).iterdir())
+    assert cache_files and all(cache_file.is_file() and cache_file.suffix == '.json' for cache_file in cache_files) # no stream directories
+
+    MaxAvgPowerNormalizationXDF(str(xdf_file), 'emg', 'markers', 'start', 'end', data_stream_channels=[0, 1]) # the streams are parsed again
+    assert len(parsed_files) == 2
+
+
+def test_cache_is_used_for_constants_and_streams(xdf_file):
+    xdf_file, parsed_files = xdf_file
+    normalization = MaxAvgPowerNormalizationXDF(str(xdf_file), 'emg', 'markers', 'start', 'end', cache_streams=True)
+    MaxAvgPowerNormalizationXDF(str(xdf_file), 'emg', 'markers', 'start', 'end', cache_streams=True) # cached constants
+    calibration._loaded_streams.clear()
+    MaxAvgPowerNormalizationXDF(str(xdf_file), 'emg', 'markers', 'start', 'end', data_stream_channels=[0, 1], cache_streams=True) # cached streams
+    assert len(parsed_files) == 1
+    assert any(cache_file.is_dir() for cache_file in (xdf_file.parent / calibration.CACHE_DIRECTORY).iterdir())
+
+    uncached_normalization = MaxAvgPowerNormalizationXDF(str(xdf_file), 'emg', 'markers', 'start', 'end', use_cache=False)
+    assert len(parsed_files) == 2
+    assert uncached_normalization.max_value == normalization.max_value
@@ -0,0 +1,95 @@
+import time
+
+import numpy as np
+import pylsl
+import pytest
+
+from yaga_modules.interface_objects import AFFINE_STEP, InterfaceObject, lsl_stream_hub
+from yaga_modules.signal_processing import Abs, Mean, Scaler
+
+
+FS = 1000.0
+CHUNK_SIZE = 17
+
+
+@pytest.fixture
+def outlet():
+    stream_name = 'yaga_test_sharing'
+    return pylsl.StreamOutlet(pylsl.StreamInfo(stream_name, 'EMG', 2, FS, pylsl.cf_double64, stream_name))
+
+
+def connectObjects(stream_name, chains):
+    interface_objects = []
+    for processors in chains:
+        interface_object = InterfaceObject()
+        interface_object.connectToLSLStreams([stream_name])
+        for processor in processors:
+            interface_object.addSignalProcessingToLSLStream(processor)
+        interface_objects.append(interface_object)
+    lsl_stream_hub.streams[stream_name].inlet.open_stream()
+    time.sleep(0.3)
+    return interface_objects
+
+
+def readFrame(outlet, interface_objects, value):
+    # pushes a chunk with the given value and returns the last processed sample of every interface object
+    outlet.push_chunk(np.full((CHUNK_SIZE, 2), value))
+    for _ in range(100):
+        time.sleep(0.01)
+        lsl_stream_hub.pull()
+        for interface_object in interface_objects:
+            interface_object.readLSLStream()
+        if lsl_stream_hub.streams[outlet.get_info().name()].samples is not None:
+            break
+    return [interface_object.lsl_streams_samples[outlet.get_info().name()].copy() for interface_object in interface_objects]
+
+
+def test_equal_processors_of_different_objects_are_not_shared(outlet):
+    first_scaler, second_scaler = Scaler(2), Scaler(2)
+    interface_objects = connectObjects('yaga_test_sharing', [[first_scaler, Abs()], [second_scaler, Abs()]])
+    first_sample, second_sample = readFrame(outlet, interface_objects, -1.0)
+    np.testing.assert_array_equal(first_sample, [2, 2])
+    np.testing.assert_array_equal(second_sample, [2, 2])
+
+    # a parameter change of one object's processor does not affect the other object
+    second_scaler.scale = 100
+    first_sample, second_sample = readFrame(outlet, interface_objects, -1.0)
+    np.testing.assert_array_equal(first_sample, [2, 2])
+    np.testing.assert_array_equal(second_sample, [100, 100])
+
+
+def test_same_processors_are_shared(outlet):
+    scaler, abs_processor = Scaler(2), Abs()
+    interface_objects = connectObjects('yaga_test_sharing', [[scaler, abs_processor], [scaler, abs_processor]])
+    first_sample, second_sample = readFrame(outlet, interface_objects, -1.0)
+    assert len(lsl_stream_hub.chain_plans) == 1
+    np.testing.assert_array_equal(first_sample, [2, 2])
+
+    # a parameter change of a shared processor reaches every object which shares the chain
+    scaler.scale = 100
+    first_sample, second_sample = readFrame(outlet, interface_objects, -1.0)
+    assert len(lsl_stream_hub.chain_plans) == 1
+    np.testing.assert_array_equal(first_sample, [100, 100])
+    np.testing.assert_array_equal(second_sample, [100, 100])
+
+
+def test_parameter_changes_of_fused_processors_reach_the_subscribers_of_their_chain(outlet):
+    # the first two objects share Scaler and Mean (fused into one affine step), the third object has equal but separate processors
+    shared_scaler, shared_mean, separate_scaler = Scaler(2), Mean(), Scaler(2)
+    interface_objects = connectObjects('yaga_test_sharing', [[shared_scaler, shared_mean], [shared_scaler, shared_mean], [separate_scaler, Mean()]])
+    samples = readFrame(outlet, interface_objects, 1.0)
+    assert len(lsl_stream_hub.chain_plans) == 2
+    assert all(chain_plan.steps[0].processor is AFFINE_STEP for chain_plan in lsl_stream_hub.chain_plans.values())
+    for sample in samples:
+        np.testing.assert_array_equal(sample, [2, 2])
+
+    shared_scaler.scale = 5
+    samples = readFrame(outlet, interface_objects, 1.0)
+    np.testing.assert_array_equal(samples[0], [5, 5])
+    np.testing.assert_array_equal(samples[1], [5, 5])
+    np.testing.assert_array_equal(samples[2], [2, 2])
+
+    separate_scaler.post_offset = 1
+    samples = readFrame(outlet, interface_objects, 1.0)
+    np.testing.assert_array_equal(samples[0], [5, 5])
+    np.testing.assert_array_equal(samples[2], [3, 3])
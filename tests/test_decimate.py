@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+from scipy import signal
+
+from yaga_modules.interface_objects import ProcessorChainPlan, SignalProcessor
+from yaga_modules.signal_processing import Abs, Decimate, MovAvg
+
+
+def runChunks(chain_plan, samples, time_stamps, chunk_sizes):
+    outputs, output_time_stamps = [], []
+    start, chunk_idx = 0, 0
+    while start < samples.shape[1]:
+        end = start + chunk_sizes[chunk_idx % len(chunk_sizes)]
+        chunk_idx += 1
+        output = chain_plan.run(samples[:, start:end], time_stamps[start:end])
+        if output is not None:
+            outputs.append(output.copy())
+            output_time_stamps.append(chain_plan.time_stamps)
+        start = end
+    return np.concatenate(outputs, axis=1), np.concatenate(output_time_stamps)
+
+
+@pytest.mark.parametrize('factor', [2, 3, 10])
+@pytest.mark.parametrize('chunk_sizes', [[7], [13], [33], [1, 17, 4, 29, 11]])
+def test_decimated_time_stamps_are_regular(factor, chunk_sizes):
+    fs = 1000.0
+    samples = np.random.default_rng(0).standard_normal((3, 2000))
+    time_stamps = 100 + np.arange(samples.shape[1]) / fs
+    chain_plan = ProcessorChainPlan([SignalProcessor(Abs(), None), SignalProcessor(Decimate(factor), None), SignalProcessor(MovAvg(0.05), None)], 3, 64, fs)
+    output, output_time_stamps = runChunks(chain_plan, samples, time_stamps, chunk_sizes)
+
+    assert output.shape[1] == len(output_time_stamps)
+    np.testing.assert_allclose(np.diff(output_time_stamps), factor / fs, rtol=0, atol=1e-9)
+    np.testing.assert_array_equal(output_time_stamps, time_stamps[::factor]) # the retained samples keep their time stamps
+
+
+def test_chained_decimation_keeps_the_time_stamps_of_the_retained_samples():
+    fs = 1000.0
+    samples = np.random.default_rng(1).standard_normal((2, 3000))
+    time_stamps = np.arange(samples.shape[1]) / fs
+    chain_plan = ProcessorChainPlan([SignalProcessor(Decimate(2), None), SignalProcessor(Decimate(5), None)], 2, 64, fs)
+    _, output_time_stamps = runChunks(chain_plan, samples, time_stamps, [23, 9])
+    np.testing.assert_array_equal(output_time_stamps, time_stamps[::10])
+
+
+@pytest.mark.parametrize('factor', [2, 5, 10, 20])
+def test_streaming_decimation_equals_offline_decimation(factor):
+    samples = np.random.default_rng(2).standard_normal((4, 3000))
+    decimate = Decimate(factor)
+    output = np.concatenate([decimate.update(samples[:, start:start + 35], 2048.0) for start in range(0, samples.shape[1], 35)], axis=1)
+    offline_output = signal.lfilter(signal.firwin(20*factor + 1, 1.0/factor, window='hamming'), 1, samples, axis=1)[:, ::factor]
+    np.testing.assert_allclose(output, offline_output, atol=1e-12)
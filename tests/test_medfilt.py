@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from yaga_modules.signal_processing import MedFilt
+
+
+@pytest.mark.parametrize('window_length', [0.005, 0.01, 0.05])
+@pytest.mark.parametrize('chunk_sizes', [[1], [7], [64], [3, 40, 1, 17]])
+def test_running_median_of_the_last_window(window_length, chunk_sizes):
+    fs = 1000.0
+    samples = np.random.default_rng(0).standard_normal((3, 500))
+    med_filt = MedFilt(window_length)
+    outputs = []
+    start, chunk_idx = 0, 0
+    while start < samples.shape[1]:
+        end = start + chunk_sizes[chunk_idx % len(chunk_sizes)]
+        chunk_idx += 1
+        outputs.append(med_filt.update(samples[:, start:end], fs))
+        start = end
+    output = np.concatenate(outputs, axis=1)
+
+    window_samples = int(np.round(window_length * fs)) // 2 * 2 + 1
+    padded_samples = np.concatenate((np.zeros((3, window_samples - 1)), samples), axis=1) # zeros before the window is filled
+    expected_output = np.median(np.lib.stride_tricks.sliding_window_view(padded_samples, window_samples, axis=1), axis=2)
+    np.testing.assert_array_equal(output, expected_output)
+
+
+def test_output_array():
+    fs = 1000.0
+    samples = np.random.default_rng(1).standard_normal((2, 100))
+    out = np.empty((2, 50))
+    med_filt, reference_med_filt = MedFilt(0.011), MedFilt(0.011)
+    for start in (0, 50):
+        result = med_filt.update(samples[:, start:start + 50], fs, out=out)
+        assert result is out
+        np.testing.assert_array_equal(out, reference_med_filt.update(samples[:, start:start + 50], fs))
+
+
+def test_buffers_are_not_reallocated_for_smaller_chunks():
+    fs = 1000.0
+    rng = np.random.default_rng(2)
+    med_filt = MedFilt(0.021)
+    med_filt.update(rng.standard_normal((2, 64)), fs)
+    buffer, filtered_buffer = med_filt.buffer, med_filt.filtered_buffer
+    for chunk_size in (17, 1, 33, 64, 5):
+        med_filt.update(rng.standard_normal((2, chunk_size)), fs)
+        assert med_filt.buffer is buffer and med_filt.filtered_buffer is filtered_buffer
@@ -0,0 +1,43 @@
+import time
+
+import numpy as np
+import pylsl
+
+from yaga_modules.interface_objects import InterfaceObject, OffloadedProcessorChain, lsl_stream_hub
+from yaga_modules.signal_processing import Abs, Scaler
+
+
+FS = 1000.0
+CHUNK_SIZE = 17
+
+
+def test_worker_starts_before_the_first_frame():
+    stream_name = 'yaga_test_offload'
+    outlet = pylsl.StreamOutlet(pylsl.StreamInfo(stream_name, 'EMG', 2, FS, pylsl.cf_double64, stream_name))
+    interface_object = InterfaceObject()
+    interface_object.connectToLSLStreams([stream_name])
+    interface_object.addSignalProcessingToLSLStream(Scaler(-2), offload=True)
+    interface_object.addSignalProcessingToLSLStream(Abs(), offload=True)
+
+    # the chain is compiled when the processors are added; only the chain of the complete processor list remains
+    chain_plans = list(lsl_stream_hub.chain_plans.values())
+    assert len(chain_plans) == 1 and isinstance(chain_plans[0], OffloadedProcessorChain)
+    chain_plan = chain_plans[0]
+    assert not chain_plan.started
+    lsl_stream_hub.startChainWorkers()
+    assert chain_plan.worker.is_alive()
+
+    lsl_stream_hub.streams[stream_name].inlet.open_stream()
+    time.sleep(0.3)
+    outputs = []
+    for _ in range(100):
+        outlet.push_chunk(np.ones((CHUNK_SIZE, 2)))
+        time.sleep(0.02)
+        lsl_stream_hub.pull()
+        interface_object.readLSLStream()
+        if lsl_stream_hub.chain_outputs.get((stream_name, interface_object.lsl_chain_signatures[stream_name])) is not None:
+            outputs.append(interface_object.lsl_streams_samples[stream_name].copy())
+        if len(outputs) >= 3:
+            break
+    assert len(outputs) >= 3
+    np.testing.assert_array_equal(outputs[-1], [2, 2])
@@ -0,0 +1,43 @@
+import time
+
+import numpy as np
+import pylsl
+
+from yaga_modules.interface_objects import InterfaceObject, lsl_stream_hub
+from yaga_modules.signal_processing import BandPower
+
+
+FS = 1000.0
+BANDS = ((8, 13), (13, 30), (30, 45)) # 3 bands of 2 channels: 6 output channels
+
+
+def test_output_channels_can_be_read_before_the_first_samples():
+    stream_name = 'yaga_test_output_channels'
+    outlet = pylsl.StreamOutlet(pylsl.StreamInfo(stream_name, 'EEG', 2, FS, pylsl.cf_double64, stream_name))
+    frame_object, window_object = InterfaceObject(), InterfaceObject()
+    frame_object.connectToLSLStreams([stream_name])
+    frame_object.addSignalProcessingToLSLStream(BandPower(BANDS))
+    frame_object.relayLSLSignals([stream_name], [[5, 0]], 'yaga_test_output_channels_relay')
+    window_object.connectToLSLStreams([stream_name], aggregation_mode='window_mean')
+    window_object.addSignalProcessingToLSLStream(BandPower(BANDS))
+
+    # no samples have been received yet: the held samples have the output channels of the chain
+    lsl_stream_hub.pull()
+    for interface_object in (frame_object, window_object):
+        interface_object.readLSLStream()
+        assert interface_object.lsl_streams_samples[stream_name].shape[0] == 6
+        assert interface_object.lsl_streams_samples[stream_name][5] == 0
+    np.testing.assert_array_equal(frame_object.lsl_relay_buffer, [0, 0])
+
+    # the window aggregator is sized for the output channels as well
+    lsl_stream_hub.streams[stream_name].inlet.open_stream()
+    time.sleep(0.3)
+    outlet.push_chunk(np.random.default_rng(0).standard_normal((50, 2)))
+    for _ in range(100):
+        time.sleep(0.01)
+        lsl_stream_hub.pull()
+        window_object.readLSLStream()
+        if lsl_stream_hub.streams[stream_name].samples is not None:
+            break
+    assert window_object.lsl_streams_samples[stream_name].shape == (6,)
+    assert window_object.lsl_streams_samples[stream_name][5] > 0
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from yaga_modules.interface_objects import AFFINE_STEP, ProcessorChainPlan, SignalProcessor
+from yaga_modules.signal_processing import Abs, LinearMap, Mean, Scaler, SpatialFilter
+
+
+def sequentialUpdate(processors, samples, fs):
+    # reference: every processor updates the samples on its own
+    samples = samples.copy()
+    for processor in processors:
+        if processor.channels is None:
+            output = processor.object.update(samples, fs)
+            samples = np.broadcast_to(output, samples.shape).copy() if output.shape[0] == 1 else output # outputs with one channel are broadcasted
+        else:
+            samples[processor.channels, :] = processor.object.update(samples[processor.channels, :], fs)
+    return samples
+
+
+def chain(scaler, linear_map, spatial_filter):
+    return [SignalProcessor(scaler, [0, 2]), SignalProcessor(linear_map, None), SignalProcessor(Abs(), None), SignalProcessor(spatial_filter, None)]
+
+
+@pytest.mark.parametrize('change', ['scale', 'pre_offset', 'in_val2', 'matrix_element', 'matrix'])
+def test_fused_transform_follows_parameter_changes(change):
+    fs = 1000.0
+    rng = np.random.default_rng(0)
+    scaler, linear_map, spatial_filter = Scaler(scale=2), LinearMap(0, 1, 0, 10), SpatialFilter(rng.standard_normal((2, 3)))
+    processors = chain(scaler, linear_map, spatial_filter)
+    chain_plan = ProcessorChainPlan(processors, 3, 32, fs)
+    assert sum(step.processor is AFFINE_STEP for step in chain_plan.steps) == 2
+
+    samples = rng.standard_normal((3, 20))
+    np.testing.assert_allclose(chain_plan.run(samples), sequentialUpdate(processors, samples, fs))
+
+    if change == 'scale':
+        scaler.scale = -3
+    elif change == 'pre_offset':
+        scaler.pre_offset = 0.5
+    elif change == 'in_val2':
+        linear_map.in_val2 = 4
+    elif change == 'matrix_element':
+        spatial_filter.matrix[1, 2] = 7 # changed in place
+    else:
+        spatial_filter.matrix = rng.standard_normal((2, 3))
+    samples = rng.standard_normal((3, 20))
+    np.testing.assert_allclose(chain_plan.run(samples), sequentialUpdate(processors, samples, fs))
+
+
+def test_fused_row_transform_follows_parameter_changes():
+    fs = 1000.0
+    rng = np.random.default_rng(1)
+    scaler, mean = Scaler(scale=2), Mean()
+    processors = [SignalProcessor(scaler, None), SignalProcessor(mean, None)]
+    chain_plan = ProcessorChainPlan(processors, 4, 32, fs)
+    for scale, post_offset in [(2, 0), (-1, 0), (-1, 3), (0.5, 3)]:
+        scaler.scale, scaler.post_offset = scale, post_offset
+        samples = rng.standard_normal((4, 10))
+        np.testing.assert_allclose(chain_plan.run(samples), sequentialUpdate(processors, samples, fs))
+
+
+def test_fused_and_separate_channel_scales_agree():
+    # a list of scales contains one factor per (selected) channel
+    fs = 1000.0
+    rng = np.random.default_rng(3)
+    scaler = Scaler(scale=[1, -2], pre_offset=[0.5, 0], post_offset=1)
+    fused_processors = [SignalProcessor(scaler, [1, 3]), SignalProcessor(LinearMap(0, 1, 0, 10), None)]
+    fused_chain_plan = ProcessorChainPlan(fused_processors, 4, 32, fs)
+    separate_chain_plan = ProcessorChainPlan([SignalProcessor(scaler, [1, 3])], 4, 32, fs)
+    assert fused_chain_plan.steps[0].processor is AFFINE_STEP and separate_chain_plan.steps[0].processor is scaler
+    for scale in ([1, -2], np.array([3, 0.5])):
+        scaler.scale = scale
+        samples = rng.standard_normal((4, 10))
+        expected_samples = samples.copy()
+        expected_samples[[1, 3], :] = (samples[[1, 3], :] + np.reshape(scaler.pre_offset, (-1, 1))) * np.reshape(scale, (-1, 1)) + 1
+        np.testing.assert_allclose(separate_chain_plan.run(samples), expected_samples)
+        np.testing.assert_allclose(fused_chain_plan.run(samples), expected_samples * 10)
+
+
+def test_changed_number_of_output_channels_is_rejected():
+    rng = np.random.default_rng(2)
+    spatial_filter = SpatialFilter(rng.standard_normal((2, 3)))
+    chain_plan = ProcessorChainPlan([SignalProcessor(Scaler(scale=2), None), SignalProcessor(spatial_filter, None)], 3, 32, 1000.0)
+    chain_plan.run(rng.standard_normal((3, 10)))
+    spatial_filter.matrix = rng.standard_normal((1, 3))
+    with pytest.raises(AssertionError):
+        chain_plan.run(rng.standard_normal((3, 10)))
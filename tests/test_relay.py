@@ -0,0 +1,52 @@
+import time
+
+import numpy as np
+import pylsl
+import pytest
+
+from yaga_modules.interface_objects import InterfaceObject, lsl_stream_hub
+from yaga_modules.signal_processing import Decimate, Scaler
+
+
+FS = 1000.0
+CHUNK_SIZE = 17 # not a multiple of the decimation factor
+DECIMATION_FACTOR = 4
+
+
+def test_chunk_relay_pushes_the_time_stamps_of_the_decimated_samples():
+    source_name = 'yaga_test_relay_source'
+    relay_name = 'yaga_test_relay_output'
+    source_outlet = pylsl.StreamOutlet(pylsl.StreamInfo(source_name, 'EMG', 3, FS, pylsl.cf_float32, source_name))
+    interface_object = InterfaceObject()
+    interface_object.connectToLSLStreams([source_name])
+    interface_object.addSignalProcessingToLSLStream(Scaler(2))
+    interface_object.addSignalProcessingToLSLStream(Decimate(DECIMATION_FACTOR))
+    interface_object.relayLSLSignals([source_name], [[2, 0]], relay_name, mode='chunk')
+    lsl_stream_hub.streams[source_name].inlet.open_stream()
+    time.sleep(0.3)
+
+    # the source time stamps start at an arbitrary time (not at the local clock)
+    source_time_stamps = 1000 + np.arange(60*CHUNK_SIZE) / FS
+    relay_inlet = None
+    for chunk_idx in range(60):
+        chunk_time_stamps = source_time_stamps[chunk_idx*CHUNK_SIZE:(chunk_idx + 1)*CHUNK_SIZE]
+        source_outlet.push_chunk(np.ones((CHUNK_SIZE, 3), dtype=np.float32), chunk_time_stamps.tolist())
+        time.sleep(0.02)
+        lsl_stream_hub.pull()
+        interface_object.readLSLStream()
+        if relay_inlet is None and interface_object.lsl_relay_outlet is not None:
+            relay_inlet = pylsl.StreamInlet(pylsl.resolve_byprop('name', relay_name, timeout=5)[0])
+            relay_inlet.open_stream()
+            time.sleep(0.3)
+    assert relay_inlet is not None, 'the relay outlet was not created'
+    assert relay_inlet.info().nominal_srate() == pytest.approx(FS / DECIMATION_FACTOR)
+
+    time.sleep(0.2)
+    relayed_samples, relayed_time_stamps = relay_inlet.pull_chunk(timeout=1, max_samples=10000)
+    relayed_time_stamps = np.array(relayed_time_stamps)
+    assert len(relayed_time_stamps) > 20
+    np.testing.assert_allclose(np.diff(relayed_time_stamps), DECIMATION_FACTOR / FS, rtol=0, atol=1e-9)
+    # every relayed time stamp is the time stamp of a retained source sample
+    retained_idcs = np.round((relayed_time_stamps - source_time_stamps[0]) * FS).astype(int)
+    np.testing.assert_allclose(relayed_time_stamps, source_time_stamps[retained_idcs], rtol=0, atol=1e-9)
+    assert np.all(retained_idcs % DECIMATION_FACTOR == 0)
@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+from scipy import signal
+
+from yaga_modules.signal_processing import RunningSumFilter
+
+
+@pytest.mark.parametrize('window_samples', [1, 5, 64, 500])
+@pytest.mark.parametrize('initial_value', [0.0, 1.0])
+def test_running_sum_equals_lfilter(window_samples, initial_value):
+    # moving average as FIR filter with window_samples coefficients; the initial state is zero (MovAvg) or the step response steady-state
+    # (MaxAvgPowerNormalizationXDF)
+    n_channels = 4
+    rng = np.random.default_rng(window_samples)
+    b = np.repeat(1.0/window_samples, window_samples)
+    z = np.tile(signal.lfilter_zi(b, 1).reshape(1, -1), [n_channels, 1]) * initial_value if window_samples > 1 else np.zeros((n_channels, 0))
+    running_sum_filter = RunningSumFilter(n_channels, window_samples, initial_value)
+
+    # chunks with varying sizes, including chunks longer than the window, test the carried filter state
+    chunk_sizes = list(rng.integers(1, 100, size=50)) + [2*window_samples + 1, 1, window_samples, window_samples + 1, 3]
+    for chunk_size in chunk_sizes:
+        chunk = rng.standard_normal((n_channels, chunk_size)) + initial_value
+        expected_output, z = signal.lfilter(b, 1, chunk, zi=z)
+        np.testing.assert_allclose(running_sum_filter.filter(chunk), expected_output, rtol=1e-9, atol=1e-9)
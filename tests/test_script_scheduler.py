@@ -0,0 +1,55 @@
+from collections import namedtuple
+
+from yaga_modules.script_scheduler import ScriptScheduler
+
+
+ScriptItem = namedtuple('ScriptItem', ('name', 'time', 'time_type', 'rel_name', 'wait_for_signal', 'wait_for_lsl_marker', 'actions'), defaults=(None, None, 'abs', None, None, None, None))
+
+
+class Paradigm:
+
+    def checkForSignal(self, signal):
+        return False
+
+    def checkForLSLMarker(self, marker):
+        return False
+
+
+def runFrames(script, duration, frame_interval=1/60):
+    # simulates the render loop: ScriptItems are triggered in runDueItems, their execution times are logged after the screen update
+    scheduler = ScriptScheduler(script)
+    execution_times = {}
+    frames = []
+    frame_idx = 0
+    while not scheduler.finished() and frame_idx*frame_interval < duration:
+        time = frame_idx*frame_interval
+        names = scheduler.runDueItems(time, 0.0, execution_times, Paradigm())
+        for name in names:
+            execution_times[name] = time # flip time
+        if names:
+            frames.append((time, names))
+        frame_idx += 1
+    return frames
+
+
+def test_chained_relative_items_of_repeated_trials_fire_at_their_own_times():
+    script = []
+    for trial_idx in range(4):
+        if trial_idx == 0:
+            script.append(ScriptItem(name='trial_start', time=1))
+        else:
+            script.append(ScriptItem(name='trial_start', time=1, time_type='rel', rel_name='trial_end'))
+        script.append(ScriptItem(name='red', time=2, time_type='rel', rel_name='trial_start'))
+        script.append(ScriptItem(name='trial_end', time=3, time_type='rel', rel_name='red'))
+
+    frames = runFrames(script, 60)
+    assert all(len(names) == 1 for _, names in frames), frames
+    times = [time for time, _ in frames]
+    intervals = [later - earlier for earlier, later in zip(times, times[1:])]
+    assert len(frames) == 12
+    assert all(abs(interval - expected) < 1/60 + 1e-9 for interval, expected in zip(intervals, [2, 3, 1]*4))
+
+
+def test_absolute_items_due_in_the_same_frame_fire_together():
+    frames = runFrames([ScriptItem(name='a', time=1), ScriptItem(name='b', time=1), ScriptItem(name='c', time=1.5)], 5)
+    assert [names for _, names in frames] == [['a', 'b'], ['c']]
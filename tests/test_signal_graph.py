@@ -0,0 +1,63 @@
+import time
+
+import numpy as np
+import pylsl
+
+from yaga_modules.interface_objects import lsl_stream_hub
+from yaga_modules.signal_graph import SignalGraph, interpolateSamples
+from yaga_modules.signal_processing import Decimate
+
+
+FS = 1000.0
+CHUNK_SIZE = 17 # not a multiple of the decimation factor
+DECIMATION_FACTOR = 4
+
+
+def test_interpolation_equals_np_interp():
+    rng = np.random.default_rng(0)
+    time_stamps = np.sort(rng.random(20))
+    samples = rng.standard_normal((3, 20))
+    target_time_stamps = np.linspace(-0.2, 1.2, 50)
+    expected = np.stack([np.interp(target_time_stamps, time_stamps, channel_samples) for channel_samples in samples])
+    np.testing.assert_allclose(interpolateSamples(time_stamps, samples, target_time_stamps), expected)
+
+
+def test_decimating_node_publishes_the_time_stamps_of_the_retained_samples():
+    # the node "decimated" decimates the EMG stream; the node "combined" interpolates a ramp stream (value = time stamp) at the time stamps of
+    # "decimated", i.e. its second channel equals the time stamps of the decimated samples
+    emg_outlet = pylsl.StreamOutlet(pylsl.StreamInfo('yaga_test_graph_emg', 'EMG', 2, FS, pylsl.cf_double64, 'yaga_test_graph_emg'))
+    ramp_outlet = pylsl.StreamOutlet(pylsl.StreamInfo('yaga_test_graph_ramp', 'Ramp', 1, FS, pylsl.cf_double64, 'yaga_test_graph_ramp'))
+    graph = SignalGraph()
+    graph.addNode('decimated', ['yaga_test_graph_emg'], [Decimate(DECIMATION_FACTOR)])
+    graph.addNode('combined', ['decimated', 'yaga_test_graph_ramp'])
+    decimated_node = lsl_stream_hub.connect('decimated')
+    combined_node = lsl_stream_hub.connect('combined')
+    for stream_name in ('yaga_test_graph_emg', 'yaga_test_graph_ramp'):
+        lsl_stream_hub.streams[stream_name].inlet.open_stream()
+    time.sleep(0.3)
+
+    start_time = pylsl.local_clock()
+    decimated_time_stamps, combined_samples, combined_time_stamps = [], [], []
+    for chunk_idx in range(60):
+        chunk_time_stamps = start_time + (chunk_idx*CHUNK_SIZE + np.arange(CHUNK_SIZE)) / FS
+        emg_outlet.push_chunk(np.ones((CHUNK_SIZE, 2)), chunk_time_stamps.tolist())
+        ramp_outlet.push_chunk((chunk_time_stamps - start_time).reshape((-1, 1)), chunk_time_stamps.tolist())
+        time.sleep(0.02)
+        lsl_stream_hub.pull()
+        if decimated_node.samples is not None:
+            decimated_time_stamps.append(decimated_node.time_stamps)
+        if combined_node.samples is not None:
+            combined_samples.append(combined_node.samples.copy())
+            combined_time_stamps.append(combined_node.time_stamps)
+
+    decimated_time_stamps = np.concatenate(decimated_time_stamps)
+    assert len(decimated_time_stamps) > 100
+    np.testing.assert_allclose(np.diff(decimated_time_stamps), DECIMATION_FACTOR / FS, rtol=0, atol=1e-6)
+
+    # skip the samples before the first ramp samples arrived
+    combined_samples, combined_time_stamps = np.concatenate(combined_samples, axis=1), np.concatenate(combined_time_stamps)
+    valid = combined_samples[2] > 0
+    assert np.count_nonzero(valid) > 100
+    # tolerance: the time stamps of both streams are synchronized with slightly different clock offsets (time_sync); the misaligned time stamps deviated
+    # by up to several milliseconds
+    np.testing.assert_allclose(combined_samples[2, valid], combined_time_stamps[valid] - start_time, rtol=0, atol=1e-4)
@@ -0,0 +1,61 @@
+# compares the cost of pulling LSL chunks as lists of lists (converted with np.array) with pulling them into a preallocated NumPy buffer (dest_obj)
+# a local LSL outlet streams 256 channels at 2048 Hz; every iteration pulls the samples of one 60 FPS frame
+#
+# usage: python tools/benchmark_lsl_pull.py [CHANNELS] [SAMPLING_RATE] [FPS]
+
+import sys
+import time
+import numpy as np
+import pylsl
+
+
+N_ITERATIONS = 500
+MAX_SAMPLES = 1024
+
+n_channels = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+fs = float(sys.argv[2]) if len(sys.argv) > 2 else 2048
+fps = float(sys.argv[3]) if len(sys.argv) > 3 else 60
+chunk_size = int(np.ceil(fs/fps))
+
+lsl_info = pylsl.StreamInfo('yaga_pull_benchmark', 'EMG', n_channels, fs, pylsl.cf_float32, 'yaga_pull_benchmark')
+outlet = pylsl.StreamOutlet(lsl_info)
+inlet = pylsl.StreamInlet(pylsl.resolve_byprop('name', 'yaga_pull_benchmark', timeout=5)[0], max_buflen=1, recover=True)
+inlet.open_stream()
+time.sleep(0.5)
+
+chunk = np.random.randn(chunk_size, n_channels).astype(np.float32)
+pull_buffer = np.empty((MAX_SAMPLES, n_channels), dtype=np.float32)
+work_buffer = np.empty((MAX_SAMPLES, n_channels), dtype=np.float64)
+
+
+def pullList():
+    samples_list, _ = inlet.pull_chunk(timeout=0.0, max_samples=MAX_SAMPLES)
+    return np.array(samples_list).transpose()
+
+
+def pullBuffer():
+    _, time_stamps = inlet.pull_chunk(timeout=0.0, max_samples=MAX_SAMPLES, dest_obj=pull_buffer)
+    n_samples = len(time_stamps)
+    np.copyto(work_buffer[:n_samples], pull_buffer[:n_samples])
+    return work_buffer[:n_samples].T
+
+
+def benchmark(pull):
+    durations = []
+    n_pulled = 0
+    for _ in range(N_ITERATIONS):
+        outlet.push_chunk(chunk)
+        time.sleep(0.002) # wait until the samples arrive at the inlet
+        start = time.perf_counter()
+        samples = pull()
+        durations.append(time.perf_counter() - start)
+        n_pulled += samples.shape[1] if samples.ndim == 2 else 0
+    return np.median(durations)*1000, n_pulled/N_ITERATIONS
+
+
+print('%d channels, %g Hz, %g FPS (%d samples per frame)' % (n_channels, fs, fps, chunk_size))
+list_duration, list_samples = benchmark(pullList)
+buffer_duration, buffer_samples = benchmark(pullBuffer)
+print('pull_chunk -> list -> np.array:  %8.3f ms per frame (%.1f samples)' % (list_duration, list_samples))
+print('pull_chunk -> dest_obj buffer:   %8.3f ms per frame (%.1f samples)' % (buffer_duration, buffer_samples))
+print('speed-up: %.1fx' % (list_duration/buffer_duration))
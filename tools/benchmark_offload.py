@@ -0,0 +1,70 @@
+# compares the time the render loop spends per frame on an expensive processor chain (256-channel bandpass filter and band power in 6 bands)
+# when the chain runs in the render loop and when it is offloaded into a worker process (addSignalProcessingToLSLStream(..., offload=True))
+# a local LSL outlet streams 256 channels at 2048 Hz; every iteration pushes and processes the samples of one 60 FPS frame
+# note: the offloaded chain needs a free CPU core; the output of the offloaded chain is checked against the chain in the render loop
+#
+# usage: python tools/benchmark_offload.py [CHANNELS] [SAMPLING_RATE] [FPS]
+
+import sys
+import time
+from pathlib import Path
+import numpy as np
+import pylsl
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from yaga_modules.interface_objects import InterfaceObject, lsl_stream_hub
+from yaga_modules.signal_processing import ButterFilter, BandPower
+
+
+N_ITERATIONS = 300
+BANDS = ((4, 8), (8, 13), (13, 30), (30, 45), (45, 70), (70, 100)) # [Hz]
+
+
+def benchmark(interface_object, outlet, chunks):
+    durations = []
+    outputs = []
+    for chunk in chunks:
+        outlet.push_chunk(chunk)
+        time.sleep(1.0/fps) # frame interval; the worker process processes the samples of the previous frame in the meantime
+        start = time.perf_counter()
+        lsl_stream_hub.pull()
+        interface_object.readLSLStream()
+        durations.append(time.perf_counter() - start)
+        lsl_samples = lsl_stream_hub.chain_outputs.get((lsl_stream_name, interface_object.lsl_chain_signatures[lsl_stream_name]))
+        if lsl_samples is not None:
+            outputs.append(lsl_samples.copy())
+    return np.median(durations)*1000, np.max(durations)*1000, np.concatenate(outputs, axis=1)
+
+
+if __name__ == '__main__':
+    n_channels = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    fs = float(sys.argv[2]) if len(sys.argv) > 2 else 2048
+    fps = float(sys.argv[3]) if len(sys.argv) > 3 else 60
+    chunk_size = int(np.ceil(fs/fps))
+    lsl_stream_name = 'yaga_offload_benchmark'
+
+    outlet = pylsl.StreamOutlet(pylsl.StreamInfo(lsl_stream_name, 'EMG', n_channels, fs, pylsl.cf_float32, lsl_stream_name))
+    rng = np.random.default_rng(0)
+    chunks = [rng.standard_normal((chunk_size, n_channels)).astype(np.float32) for _ in range(N_ITERATIONS)]
+
+    print('%d channels, %g Hz, %g FPS (%d samples per frame)' % (n_channels, fs, fps, chunk_size))
+    outputs = {}
+    for offload in (False, True):
+        interface_object = InterfaceObject()
+        interface_object.connectToLSLStreams([lsl_stream_name])
+        interface_object.addSignalProcessingToLSLStream(ButterFilter(4, [1, 200], 'bandpass'), offload=offload)
+        interface_object.addSignalProcessingToLSLStream(BandPower(BANDS), offload=offload)
+        lsl_stream_hub.startChainWorkers() # like YAGA before the first frame
+        lsl_stream_hub.streams[lsl_stream_name].inlet.open_stream()
+        time.sleep(0.5)
+        lsl_stream_hub.pull() # discard samples of the previous run
+
+        median_duration, max_duration, outputs[offload] = benchmark(interface_object, outlet, chunks)
+        print('%-22s%8.3f ms per frame (max. %.3f ms)' % ('offloaded chain:' if offload else 'chain in render loop:', median_duration, max_duration))
+        lsl_stream_hub.streams[lsl_stream_name].inlet.close_stream()
+    lsl_stream_hub.stopChainWorkers()
+
+    # the offloaded chain may not have processed the samples of the last frames yet
+    n_samples = outputs[True].shape[1]
+    assert np.allclose(outputs[False][:, :n_samples], outputs[True]), 'the output of the offloaded chain differs from the output of the chain in the render loop'
+    print('outputs are identical (%d of %d samples processed by the worker)' % (n_samples, outputs[False].shape[1]))
@@ -0,0 +1,136 @@
+# 1. compares the moving average filters of MovAvg and MaxAvgPowerNormalizationXDF (running sums) with the previous implementation (FIR filter with
+#    window_samples coefficients, applied with lfilter) across window lengths
+# 2. compares the costs of an EMG envelope chain processed at the full sampling rate with the same chain decimated after rectification (the decimated
+#    chain is only faster for large frames, e.g. 256 channels at 10240 Hz; for small frames, the fixed costs per processing step dominate)
+# 3. compares the band power of several bands computed with one processor chain per band (ButterFilter, Power, MovAvg) with a single BandPower chain
+# 4. compares an EMG envelope chain processed in float64 with the same chain processed in float32 (LSL stream option dtype='float32')
+# every iteration filters the samples of one 60 FPS frame; the deviations between the outputs are reported, the equality of the outputs is tested in tests/
+#
+# usage: python tools/benchmark_signal_processing.py [CHANNELS] [SAMPLING_RATE] [FPS]
+
+import sys
+import time
+from pathlib import Path
+import numpy as np
+from scipy import signal
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from yaga_modules.signal_processing import RunningSumFilter, ButterFilter, Abs, Decimate, MovAvg, Scaler, Power, BandPower
+from yaga_modules.interface_objects import ProcessorChainPlan, SignalProcessor
+
+
+N_ITERATIONS = 200
+WINDOW_LENGTHS = (0.01, 0.1, 0.5, 1, 2) # [s]
+DECIMATION_FACTORS = (2, 5, 10, 20)
+BANDS = ((4, 8), (8, 13), (13, 30), (30, 45), (45, 70), (70, 100)) # [Hz]
+BAND_POWER_WINDOW = 0.25 # [s]
+
+
+class LFilterMovAvg:
+
+    def __init__(self, n_channels, window_samples, initial_value):
+        self.b = np.repeat(1.0/window_samples, window_samples)
+        if initial_value:
+            self.z = np.tile(signal.lfilter_zi(self.b, 1).reshape(1, -1), [n_channels, 1]) # step response steady-state (MaxAvgPowerNormalizationXDF)
+        else:
+            self.z = np.zeros((n_channels, window_samples - 1)) # zero state (MovAvg)
+
+    def filter(self, samples_in):
+        samples_out, self.z = signal.lfilter(self.b, 1, samples_in, zi=self.z)
+        return samples_out
+
+
+def benchmark(moving_average, chunks):
+    durations = []
+    outputs = []
+    for chunk in chunks:
+        start = time.perf_counter()
+        outputs.append(moving_average.filter(chunk))
+        durations.append(time.perf_counter() - start)
+    return np.median(durations)*1000, np.concatenate(outputs, axis=1)
+
+
+if __name__ == '__main__':
+    n_channels = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    fs = float(sys.argv[2]) if len(sys.argv) > 2 else 2048
+    fps = float(sys.argv[3]) if len(sys.argv) > 3 else 60
+    chunk_size = int(np.ceil(fs/fps))
+
+    print('%d channels, %g Hz, %g FPS (%d samples per frame)' % (n_channels, fs, fps, chunk_size))
+    print('%-18s%-16s%18s%18s%10s%16s' % ('window [s]', 'initial state', 'lfilter [ms]', 'running sum [ms]', 'speed-up', 'max. deviation'))
+    rng = np.random.default_rng(0)
+    for window_length in WINDOW_LENGTHS:
+        window_samples = int(np.round(window_length*fs))
+        for initial_value in (0.0, 1.0):
+            # chunks with varying sizes (including chunks longer than the window) test the carried filter state
+            chunk_sizes = rng.integers(1, 3*chunk_size, size=N_ITERATIONS)
+            chunk_sizes[N_ITERATIONS//2] = 2*window_samples + 1
+            chunks = [rng.standard_normal((n_channels, size)) + initial_value for size in chunk_sizes]
+
+            lfilter_duration, lfilter_output = benchmark(LFilterMovAvg(n_channels, window_samples, initial_value), chunks)
+            running_sum_duration, running_sum_output = benchmark(RunningSumFilter(n_channels, window_samples, initial_value), chunks)
+            max_deviation = np.max(np.abs(lfilter_output - running_sum_output))
+            print('%-18g%-16s%18.3f%18.3f%9.1fx%16.2e' % (window_length, 'zeros' if initial_value == 0 else 'lfilter_zi', lfilter_duration, running_sum_duration, lfilter_duration/running_sum_duration, max_deviation))
+
+    print()
+    print('%-18s%22s%22s%10s' % ('decimation factor', 'full rate [ms]', 'decimated [ms]', 'speed-up'))
+    signal_samples = rng.standard_normal((n_channels, N_ITERATIONS*chunk_size))
+    for factor in DECIMATION_FACTORS:
+        # EMG envelope: bandpass, rectification, (decimation,) smoothing, lowpass, scaling
+        durations = {}
+        for decimated in (False, True):
+            processors = [SignalProcessor(ButterFilter(4, [20, 400], 'bandpass'), None), SignalProcessor(Abs(), None)]
+            if decimated:
+                processors.append(SignalProcessor(Decimate(factor), None))
+            processors += [SignalProcessor(MovAvg(0.1), None), SignalProcessor(ButterFilter(2, 5), None), SignalProcessor(Scaler(2), None)]
+            chain_plan = ProcessorChainPlan(processors, n_channels, 2*chunk_size, fs)
+            chain_durations = []
+            for idx in range(0, signal_samples.shape[1], chunk_size):
+                start = time.perf_counter()
+                chain_plan.run(signal_samples[:, idx:idx + chunk_size])
+                chain_durations.append(time.perf_counter() - start)
+            durations[decimated] = np.median(chain_durations)*1000
+        print('%-18d%22.3f%22.3f%9.1fx' % (factor, durations[False], durations[True], durations[False]/durations[True]))
+
+    print()
+    print('%-18s%22s%22s%10s%16s' % ('bands', 'chain per band [ms]', 'BandPower [ms]', 'speed-up', 'max. deviation'))
+    for n_bands in range(1, len(BANDS) + 1):
+        bands = BANDS[:n_bands]
+        band_chain_plans = [ProcessorChainPlan([SignalProcessor(ButterFilter(4, band, 'bandpass'), None), SignalProcessor(Power(2), None), SignalProcessor(MovAvg(BAND_POWER_WINDOW), None)], n_channels, 2*chunk_size, fs) for band in bands]
+        band_power_plan = ProcessorChainPlan([SignalProcessor(BandPower(bands, 4, BAND_POWER_WINDOW), None)], n_channels, 2*chunk_size, fs)
+        durations = {'chain per band': [], 'BandPower': []}
+        max_deviation = 0
+        for idx in range(0, signal_samples.shape[1], chunk_size):
+            chunk = signal_samples[:, idx:idx + chunk_size]
+            start = time.perf_counter()
+            band_outputs = [band_chain_plan.run(chunk).copy() for band_chain_plan in band_chain_plans]
+            durations['chain per band'].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            band_power_output = band_power_plan.run(chunk)
+            durations['BandPower'].append(time.perf_counter() - start)
+            max_deviation = max(max_deviation, np.max(np.abs(np.concatenate(band_outputs, axis=0) - band_power_output)))
+        chain_duration, band_power_duration = np.median(durations['chain per band'])*1000, np.median(durations['BandPower'])*1000
+        print('%-18d%22.3f%22.3f%9.1fx%16.2e' % (n_bands, chain_duration, band_power_duration, chain_duration/band_power_duration, max_deviation))
+
+    print()
+    print('%-18s%22s%22s%10s%16s' % ('chain', 'float64 [ms]', 'float32 [ms]', 'speed-up', 'rel. deviation'))
+    chains = {
+        'envelope': lambda: [SignalProcessor(ButterFilter(4, [20, 400], 'bandpass'), None), SignalProcessor(Abs(), None), SignalProcessor(MovAvg(0.1), None), SignalProcessor(Scaler(2), None)],
+        'band power': lambda: [SignalProcessor(BandPower(BANDS[2:], 4, BAND_POWER_WINDOW), None)],
+    }
+    for chain_name, chain in chains.items():
+        durations = {}
+        outputs = {}
+        for dtype in (np.float64, np.float32):
+            chain_plan = ProcessorChainPlan(chain(), n_channels, 2*chunk_size, fs, dtype)
+            chain_durations = []
+            chain_outputs = []
+            for idx in range(0, signal_samples.shape[1], chunk_size):
+                chunk = signal_samples[:, idx:idx + chunk_size].astype(dtype) # the stream's work buffer has the processing data type
+                start = time.perf_counter()
+                chain_outputs.append(chain_plan.run(chunk).copy())
+                chain_durations.append(time.perf_counter() - start)
+            durations[dtype] = np.median(chain_durations)*1000
+            outputs[dtype] = np.concatenate(chain_outputs, axis=1)
+        deviation = np.max(np.abs(outputs[np.float64] - outputs[np.float32])) / np.max(np.abs(outputs[np.float64]))
+        print('%-18s%22.3f%22.3f%9.1fx%16.2e' % (chain_name, durations[np.float64], durations[np.float32], durations[np.float64]/durations[np.float32], deviation))
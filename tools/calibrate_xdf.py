@@ -0,0 +1,125 @@
+# computes the calibration constants of MaxEuclidNormalizationXDF and MaxAvgPowerNormalizationXDF for all XDF files in a directory (and its
+# subdirectories), e.g. for all subjects and sessions of a study; the XDF files are processed in parallel in a pool of worker processes
+# the constants are stored in the calibration cache next to every XDF file (see yaga_modules/calibration.py), i.e. the signal processing objects of a
+# paradigm load them at the start of an experiment without parsing the XDF file (the parameters in the paradigm must match the configuration)
+# the results are also written to a table (CSV file)
+#
+# the configuration file (JSON) lists the normalization methods and their parameters (the parameters of the signal processing objects without xdf_file):
+#
+#   [
+#     {"method": "MaxAvgPowerNormalizationXDF", "data_stream_name": "hdemg", "marker_stream_name": "markers", "start_marker": "start", "end_marker": "end"},
+#     {"method": "MaxEuclidNormalizationXDF", "data_stream_name": "force", "marker_stream_name": "markers", "start_marker": "start", "end_marker": "end",
+#      "data_stream_channels": [0, 1]}
+#   ]
+#
+# usage: python tools/calibrate_xdf.py [-w WORKERS] [-o RESULTS_FILE] CONFIG_FILE XDF_DIRECTORY
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import contextlib
+import csv
+import getopt
+import inspect
+import io
+import json
+import multiprocessing
+import os
+from pathlib import Path
+import sys
+import time
+import traceback
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from yaga_modules import signal_processing
+from yaga_modules.calibration import CACHE_DIRECTORY, fileHash
+
+
+# normalization methods and the attributes with their calibration constants
+CALIBRATION_METHODS = {'MaxEuclidNormalizationXDF': ('min_values', 'norm_value'), 'MaxAvgPowerNormalizationXDF': ('max_value',)}
+RESULTS_COLUMNS = ('xdf_file', 'method', 'parameters', 'status', 'constants', 'duration')
+
+
+def calibrateFile(xdf_file, methods):
+    # runs all normalization methods on one XDF file (in a worker process); the streams of the file are loaded only once for all methods
+    results = []
+    for method in methods:
+        configured_parameters = {name: value for name, value in method.items() if name != 'method'}
+        parameters = dict(configured_parameters)
+        if 'n_workers' in inspect.signature(getattr(signal_processing, method['method'])).parameters:
+            parameters['n_workers'] = 1 # the XDF files are already processed in parallel
+        start = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                normalization = getattr(signal_processing, method['method'])(str(xdf_file), **parameters)
+            constants = {name: getattr(normalization, name) for name in CALIBRATION_METHODS[method['method']]}
+            status = 'ok'
+        except Exception:
+            constants = {}
+            status = 'error: %s' % traceback.format_exc().strip().splitlines()[-1]
+        results.append({'xdf_file': str(xdf_file), 'method': method['method'], 'parameters': json.dumps(configured_parameters),
+                         'status': status, 'constants': json.dumps(constants, default=lambda value: value.tolist()), 'duration': '%.2f' % (time.perf_counter() - start)})
+    return results
+
+
+def loadConfiguration(config_file):
+    methods = json.loads(Path(config_file).read_text())
+    for method in methods:
+        if method.get('method') not in CALIBRATION_METHODS:
+            raise Exception('unknown normalization method "%s" (supported methods: %s)' % (method.get('method'), ', '.join(CALIBRATION_METHODS)))
+        parameters = {name: value for name, value in method.items() if name != 'method'}
+        try:
+            inspect.signature(getattr(signal_processing, method['method'])).bind('xdf_file', **parameters)
+        except TypeError as err:
+            raise Exception('invalid parameters of %s: %s' % (method['method'], err))
+    return methods
+
+
+if __name__ == '__main__':
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'hw:o:', ['help', 'workers=', 'output='])
+    except getopt.GetoptError as err:
+        print(err)
+        print('use -h or --help to see available options')
+        sys.exit(2)
+
+    n_workers = os.cpu_count()
+    results_file = None
+    for opt, arg in opts:
+        if opt in ('-h', '--help'):
+            print('\npython %s [-w WORKERS] [-o RESULTS_FILE] CONFIG_FILE XDF_DIRECTORY\n' % sys.argv[0])
+            print('-w, --workers\t... number of worker processes (default: number of CPU cores)')
+            print('-o, --output\t... results table (CSV), default: XDF_DIRECTORY/calibration_results.csv')
+            print('-h, --help\t... show help')
+            sys.exit()
+        elif opt in ('-w', '--workers'):
+            n_workers = int(arg)
+        elif opt in ('-o', '--output'):
+            results_file = Path(arg)
+    if len(args) != 2:
+        print('usage: python %s [-w WORKERS] [-o RESULTS_FILE] CONFIG_FILE XDF_DIRECTORY' % sys.argv[0])
+        sys.exit(2)
+
+    methods = loadConfiguration(args[0])
+    xdf_directory = Path(args[1])
+    results_file = results_file or xdf_directory / 'calibration_results.csv'
+    xdf_files = sorted(xdf_file for xdf_file in xdf_directory.rglob('*.xdf') if CACHE_DIRECTORY not in xdf_file.parts)
+    print('%d XDF files, %d normalization methods, %d worker processes' % (len(xdf_files), len(methods), n_workers))
+
+    # hash the files before the workers start, so that the workers do not update the hash index of a directory concurrently
+    for xdf_file in xdf_files:
+        fileHash(xdf_file)
+
+    results = []
+    with ProcessPoolExecutor(n_workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = {executor.submit(calibrateFile, xdf_file, methods): xdf_file for xdf_file in xdf_files}
+        for future_idx, future in enumerate(as_completed(futures), 1):
+            file_results = future.result()
+            results += file_results
+            n_errors = sum(result['status'] != 'ok' for result in file_results)
+            print('[%d/%d] %s%s' % (future_idx, len(xdf_files), futures[future], ' (%d errors)' % n_errors if n_errors else ''))
+
+    results.sort(key=lambda result: result['xdf_file']) # the methods of a file stay in the order of the configuration
+    with open(results_file, 'w', newline='') as file:
+        writer = csv.DictWriter(file, RESULTS_COLUMNS)
+        writer.writeheader()
+        writer.writerows(results)
+    print('%d calibrations (%d errors), results: %s' % (len(results), sum(result['status'] != 'ok' for result in results), results_file))
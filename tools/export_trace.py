@@ -0,0 +1,19 @@
+# converts a trace file recorded with "yaga.py --trace FILE" into the Chrome trace event format (JSON)
+# the JSON file can be opened with chrome://tracing or https://ui.perfetto.dev
+#
+# usage: python tools/export_trace.py TRACE_FILE [JSON_FILE]
+
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from yaga_modules.flight_recorder import exportChromeTrace
+
+
+if len(sys.argv) not in (2, 3):
+    print('usage: python %s TRACE_FILE [JSON_FILE]' % sys.argv[0])
+    sys.exit(2)
+
+trace_file = Path(sys.argv[1])
+json_file = Path(sys.argv[2]) if len(sys.argv) == 3 else trace_file.with_suffix('.json')
+exportChromeTrace(trace_file, json_file)
@@ -23,13 +23,17 @@
 from importlib import import_module
 import sys
 import getopt
-import math
 import pylsl
 from panda3d.core import WindowProperties, loadPrcFileData
 from direct.showbase.ShowBase import ShowBase
 from direct.showbase.DirectObject import DirectObject
 from direct.task import Task
 
+from yaga_modules.script_scheduler import ScriptScheduler
+from yaga_modules.frame_timing import FrameTimer
+from yaga_modules.flight_recorder import FlightRecorder, SCRIPT_ITEM, SIGNAL, MARKER
+from yaga_modules.interface_objects import InterfaceObject, lsl_stream_hub
+
 
 
 #%% set FPS
@@ -47,7 +51,7 @@ from direct.task import Task
 
 #%% parse command line arguments
 try:
-    opts, args = getopt.getopt(sys.argv[1:], 'hmp:', ['help', 'maximize', 'paradigm=', 'subject=', 'session=', 'run=', 'var1=', 'var2=', 'var3='])
+    opts, args = getopt.getopt(sys.argv[1:], 'hmp:', ['help', 'maximize', 'paradigm=', 'trace=', 'subject=', 'session=', 'run=', 'var1=', 'var2=', 'var3='])
 except getopt.GetoptError as err:
     print(err)
     print('use -h or --help to see available options')
@@ -55,6 +59,7 @@ except getopt.GetoptError as err:
 
 maximize_window = False
 paradigm_file = None
+trace_file = None
 
 class CommandlineDict(dict):
     def __missing__(self, key):
@@ -67,6 +72,7 @@ for opt, arg in opts:
         print('\n' + sys.argv[0].removeprefix('./').removeprefix('.\\') + ' -p PARADIGM [-m] [--subject STRING] [--session NUMBER] [--run NUMBER] [-h]\n')
         print('-p, --paradigm\t... paradigm file')
         print('-m, --maximize\t... maximize window')
+        print('--trace\t\t... record frame events into the specified trace file (see tools/export_trace.py)')
         print('-h, --help\t... show help')
         print('\nthe following parameters can be used in the paradigm file to build, e.g., filenames or as general purpose variables:')
         print('--subject\t... subject code')
@@ -80,6 +86,8 @@ for opt, arg in opts:
         paradigm_file = arg.removesuffix('.py').removeprefix('./').removeprefix('.\\')
     elif opt in ('-m', '--maximize'):
         maximize_window = True
+    elif opt == '--trace':
+        trace_file = arg
     elif opt == '--subject':
         paradigm_variables['subject'] = arg
     elif opt == '--session':
@@ -114,15 +122,19 @@ except ImportError as err:
 #%% main class running yaga
 class YAGA(ShowBase):
 
-    def __init__(self, paradigm_variables, maximize_window=False):
+    def __init__(self, paradigm_variables, maximize_window=False, trace_file=None):
         loadPrcFileData('', 'background-color 0.40 0.40 0.40')
 
         ShowBase.__init__(self)
 
         self.frame_script_items = []
+        self.script_scheduler = None
         self.script_item_execution_times = {}
         self.start_time = None
         self.frame_signals = []
+        self.frame_timer = None
+        self.flight_recorder = FlightRecorder(trace_file) if trace_file else None
+        InterfaceObject.flight_recorder = self.flight_recorder
 
         display_width = base.pipe.getDisplayWidth()
         display_height = base.pipe.getDisplayHeight()
@@ -153,8 +165,9 @@ class YAGA(ShowBase):
         lsl_info = pylsl.StreamInfo('yaga', 'Markers', 1, pylsl.IRREGULAR_RATE, pylsl.cf_string, 'yaga_markers')
         self.lsl_marker_outlet = pylsl.StreamOutlet(lsl_info)
 
-        # load paradigm
+        # load paradigm and compile its script
         self.paradigm = paradigm.Paradigm(paradigm_variables)
+        self.script_scheduler = ScriptScheduler(self.paradigm.script, self.paradigm.script_lookahead)
 
         # set-up NI-DAQmx
         if self.paradigm.nidaqmx_trigger_line:
@@ -176,66 +189,52 @@ class YAGA(ShowBase):
             self.nidaqmx_line_value = None
             self.nidaqmx_high_onset = None
 
+        # pull LSL streams in a background thread
+        if self.paradigm.lsl_ingestion_thread:
+            lsl_stream_hub.startIngestionThread()
+
+        # start the worker processes of offloaded signal processing chains (the chains are compiled when the paradigm adds their processors)
+        lsl_stream_hub.startChainWorkers()
+
         # start LSL recorder (this is the most time intensive operation -> several seconds)
         self.paradigm.startLSLRecorder()
 
+        # set up frame timing measurements
+        if self.paradigm.frame_timing:
+            self.frame_timer = FrameTimer(['runScript', 'readLSL', 'updateStates', 'maintainExecutedScriptItems'], self.paradigm.interface_objects, fps=self.paradigm.frame_timing_fps)
+
         # add main tasks
         # sort parameter: task with lower value execute sooner. "updateStates" should be the last task, so that all informations are available to the task. sort value must be between 1 and 19
-        self.task = taskMgr.add(self.runScript, 'runScript', sort=1)
-        self.task = taskMgr.add(self.readLSL, 'readLSL', sort=2)
-        self.task = taskMgr.add(self.updateStates, 'updateStates', sort=3)
+        self.task = taskMgr.add(self.timedTask(self.runScript, 'runScript', starts_frame=True), 'runScript', sort=1)
+        self.task = taskMgr.add(self.timedTask(self.readLSL, 'readLSL'), 'readLSL', sort=2)
+        self.task = taskMgr.add(self.timedTask(self.updateStates, 'updateStates'), 'updateStates', sort=3)
 
         # task for frame-synced execution time-related code (i.e. logging scipt item execution times and sending LSL events); this task has a high sort value so that it runs after the screen update task
-        self.task = taskMgr.add(self.maintainExecutedScriptItems, 'maintainExecutedScriptItems', sort=100)
+        self.task = taskMgr.add(self.timedTask(self.maintainExecutedScriptItems, 'maintainExecutedScriptItems'), 'maintainExecutedScriptItems', sort=100)
 
         return Task.done
 
+    def timedTask(self, task_function, task_name, starts_frame=False):
+        # measure the execution time of a task when frame timing is enabled and record its start and end when tracing is enabled
+        if self.flight_recorder:
+            task_function = self.flight_recorder.traceTask(task_function, task_name)
+        if self.frame_timer:
+            task_function = self.frame_timer.timeTask(task_function, task_name, starts_frame)
+        return task_function
+
     def runScript(self, task):
         if not self.start_time:
             self.start_time = pylsl.local_clock()
         time = pylsl.local_clock() - self.start_time
 
-        script = self.paradigm.script
-        self.frame_script_items = []
-        run_actions = False
-        if len(script) > 0:
-
-            # check if it is time to activate a ScriptItem
-            if script[0].time != None:
-                assert isinstance(script[0].time, (int, float)), 'field "time" must be a number'
-                if script[0].time_type == 'abs':
-                    if time >= script[0].time:
-                        run_actions = True
-                elif script[0].time_type == 'rel':
-                    if time >= self.script_item_execution_times.get(script[0].rel_name, math.inf) - self.start_time + script[0].time:
-                        run_actions = True
-                else:
-                    raise Exception('field "time_type" is not supported: "%s"' % script[0].time_type)
-
-            # if ScriptItem is waiting for a signal, check for it
-            if script[0].wait_for_signal and self.paradigm.checkForSignal(script[0].wait_for_signal):
-                run_actions = True
-                self.paradigm.removeSignal(script[0].wait_for_signal)
-
-            # if ScriptItem is waiting for an LSL marker, check for it
-            if script[0].wait_for_lsl_marker and self.paradigm.checkForLSLMarker(script[0].wait_for_lsl_marker):
-                run_actions = True
-                self.paradigm.removeLSLMarker(script[0].wait_for_lsl_marker)
-
-            if run_actions:
-                # execute ScriptItem's actions
-                for action in script[0].actions:
-                    action()
-
-                # save script item names for later when they are send via LSL
-                if script[0].name:
-                    assert isinstance(script[0].name, str), 'field "name" must be "None" or a string'
-                    self.frame_script_items.append(script[0].name)
-
-                # delete ScriptItem
-                script.pop(0)
-
+        if not self.script_scheduler.finished():
+            # execute all ScriptItems which are due in this frame
+            self.frame_script_items = self.script_scheduler.runDueItems(time, self.start_time, self.script_item_execution_times, self.paradigm)
+            if self.flight_recorder:
+                for script_item_name in self.frame_script_items:
+                    self.flight_recorder.record(SCRIPT_ITEM, script_item_name)
         else:
+            self.frame_script_items = []
             messenger.send('quit')
 
         return Task.cont
@@ -243,6 +242,7 @@ class YAGA(ShowBase):
     def maintainExecutedScriptItems(self, task):
         # this task should run immediately after the screen update
         local_time = pylsl.local_clock()
+        lsl_stream_hub.setFlipTime(local_time) # used to predict when the LSL samples of the next frame become visible
 
         # reset NI-DAQmx output to low
         if self.nidaqmx_task and self.nidaqmx_line_value and local_time - self.nidaqmx_high_onset >= self.paradigm.nidaqmx_high_duration:
@@ -255,6 +255,8 @@ class YAGA(ShowBase):
         for script_item_name in self.frame_script_items:
             # send script item as an LSL marker
             self.lsl_marker_outlet.push_sample([script_item_name], timestamp=local_time, pushthrough=True)
+            if self.flight_recorder:
+                self.flight_recorder.record(MARKER, script_item_name)
 
             # set NI-DAQmx output to high when the specified event/ScriptItem occurs
             if self.nidaqmx_task and script_item_name == self.paradigm.nidaqmx_event:
@@ -271,13 +273,21 @@ class YAGA(ShowBase):
         for signal in self.frame_signals:
             # send signal as an LSL marker
             self.lsl_marker_outlet.push_sample([signal], timestamp=local_time, pushthrough=True)
+            if self.flight_recorder:
+                self.flight_recorder.record(MARKER, signal)
 
         return Task.cont
 
     def readLSL(self, task):
+        # pull new samples from all LSL streams (once per stream, independent of the number of connected interface objects)
+        lsl_stream_hub.pull()
+
         # update interface objects linked to an LSL stream
-        for interface_object in self.paradigm.interface_objects:
-            interface_object.readLSLStream()
+        if self.frame_timer:
+            self.frame_timer.readLSLStreams(self.paradigm.interface_objects)
+        else:
+            for interface_object in self.paradigm.interface_objects:
+                interface_object.readLSLStream()
 
         # read LSL markers
         self.paradigm.readLSLMarkers()
@@ -287,19 +297,32 @@ class YAGA(ShowBase):
     def updateStates(self, task):
         local_time = pylsl.local_clock()
         self.frame_signals = []
-        for interface_object in self.paradigm.interface_objects:
-            signal = interface_object.updateState(local_time)
+        if self.frame_timer:
+            signals = self.frame_timer.updateStates(self.paradigm.interface_objects, local_time)
+        else:
+            signals = [interface_object.updateState(local_time) for interface_object in self.paradigm.interface_objects]
+        for signal in signals:
             if signal:
                 self.frame_signals.append(signal)
                 self.paradigm.setSignal(signal)
+                if self.flight_recorder:
+                    self.flight_recorder.record(SIGNAL, signal)
 
         return Task.cont
 
     def quit(self):
         self.paradigm.stopLSLRecorder()
+        lsl_stream_hub.stopIngestionThread()
+        lsl_stream_hub.stopChainWorkers()
         print(taskMgr)
+        if self.frame_timer:
+            self.frame_timer.printSummary()
+        if self.flight_recorder:
+            self.flight_recorder.close()
         sys.exit()
 
 
-app = YAGA(paradigm_variables, maximize_window)
-app.run()
+# the guard prevents worker processes of offloaded processor chains (which import this script) from starting YAGA
+if __name__ == '__main__':
+    app = YAGA(paradigm_variables, maximize_window, trace_file)
+    app.run()
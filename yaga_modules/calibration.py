@@ -0,0 +1,213 @@
+from collections import namedtuple, deque
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import json
+import multiprocessing
+import os
+from pathlib import Path
+
+import numpy as np
+import pyxdf
+
+
+# calibration data of the *NormalizationXDF signal processing methods
+# parsing a large XDF file takes long, and several normalization methods of a paradigm often use the same calibration file; therefore:
+# 1. the calibration constants are cached in JSON files, keyed by the hash of the XDF file, the normalization method and its parameters
+# 2. streams are parsed only once per process
+# 3. optionally (cache_streams=True), the streams which are extracted from an XDF file are cached as uncompressed NumPy files (.npy), which are
+#    memory-mapped when they are loaded again; the stream cache is opt-in, as it duplicates the data of the XDF file (e.g. gigabytes for HD-EMG recordings)
+# with use_cache=False, the constants and the streams are always calculated from the XDF file, and the cache directory is neither read nor written
+# only the data and marker streams of the calibration are loaded from an XDF file (e.g. no video or unrelated streams), and they are processed in chunks of
+# CHUNK_SAMPLES samples, i.e. the memory use of the calibration does not grow with the number of channels and the length of the recording
+# the cache directory is created next to the XDF file; the hash of an XDF file is only recomputed when its size or modification time change
+
+CACHE_DIRECTORY = '.yaga_calibration_cache'
+CALIBRATION_VERSION = 1 # increment when the calibration methods change, i.e. cached constants become invalid
+HASH_BLOCK_SIZE = 16 * 1024 * 1024 # [bytes]
+CHUNK_SAMPLES = 65536
+PARALLEL_MIN_VALUES = 2**24 # calibrations process a stream in worker processes by default if it has at least this number of values (samples x channels);
+                            # starting the worker processes takes longer than processing smaller streams
+
+XDFStream = namedtuple('XDFStream', ('time_series', 'time_stamps', 'fs')) # time_series: [samples x channels]
+
+_loaded_streams = {} # streams which were loaded by this process, keyed by (file hash, stream name)
+
+
+def _cacheDirectory(xdf_file):
+    return Path(xdf_file).resolve().parent / CACHE_DIRECTORY
+
+
+def fileHash(xdf_file):
+    # SHA-256 of the file; the hashes are stored in the cache index together with the size and modification time of the files
+    xdf_file = Path(xdf_file).resolve()
+    file_stat = xdf_file.stat()
+    index_file = _cacheDirectory(xdf_file) / 'index.json'
+    index = json.loads(index_file.read_text()) if index_file.exists() else {}
+    entry = index.get(xdf_file.name)
+    if entry and entry['size'] == file_stat.st_size and entry['mtime_ns'] == file_stat.st_mtime_ns:
+        return entry['hash']
+
+    file_hash = hashlib.sha256()
+    with open(xdf_file, 'rb') as file:
+        for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b''):
+            file_hash.update(block)
+    index[xdf_file.name] = {'size': file_stat.st_size, 'mtime_ns': file_stat.st_mtime_ns, 'hash': file_hash.hexdigest()}
+    _writeCacheFile(index_file, lambda path: path.write_text(json.dumps(index, indent=2)))
+    return file_hash.hexdigest()
+
+
+def _writeCacheFile(path, write):
+    # the cache is optional, e.g. when the XDF file is on a read-only drive; files are written to a temporary file first, so that other processes never see
+    # incomplete files
+    try:
+        path.parent.mkdir(exist_ok=True)
+        temporary_path = path.with_name(path.name + '.%d.tmp' % os.getpid())
+        write(temporary_path)
+        os.replace(temporary_path, path)
+        return True
+    except OSError as err:
+        print('calibration cache: could not write %s (%s)' % (path, err))
+        return False
+
+
+def loadStreams(xdf_file, stream_names, use_cache=True, cache_streams=False):
+    # returns a dictionary with an XDFStream for every stream name; the XDF file is only parsed if a stream is neither loaded nor cached
+    # without cache, the streams are always parsed from the XDF file, and neither the loaded streams nor the cache directory are used; with cache_streams,
+    # the parsed streams are stored in the cache directory
+    if not use_cache:
+        return _parseStreams(xdf_file, stream_names)
+
+    file_hash = fileHash(xdf_file)
+    cache_directory = _cacheDirectory(xdf_file)
+    streams = {}
+    for stream_name in stream_names:
+        if (file_hash, stream_name) not in _loaded_streams and cache_streams:
+            stream_directory = _streamDirectory(cache_directory, file_hash, stream_name)
+            if stream_directory.exists():
+                _loaded_streams[(file_hash, stream_name)] = _loadStream(stream_directory)
+        if (file_hash, stream_name) in _loaded_streams:
+            streams[stream_name] = _loaded_streams[(file_hash, stream_name)]
+
+    missing_stream_names = [stream_name for stream_name in stream_names if stream_name not in streams]
+    if missing_stream_names:
+        for stream_name, xdf_stream in _parseStreams(xdf_file, missing_stream_names).items():
+            if cache_streams:
+                stream_directory = _streamDirectory(cache_directory, file_hash, stream_name)
+                if _writeCacheFile(stream_directory, lambda path: _saveStream(path, xdf_stream)):
+                    xdf_stream = _loadStream(stream_directory) # memory-mapped, i.e. the parsed samples are released
+            _loaded_streams[(file_hash, stream_name)] = xdf_stream
+            streams[stream_name] = xdf_stream
+    return streams
+
+
+def _parseStreams(xdf_file, stream_names):
+    print('calibration: loading streams %s from XDF file %s' % (', '.join(stream_names), xdf_file))
+    try:
+        data, _ = pyxdf.load_xdf(xdf_file, select_streams=[{'name': stream_name} for stream_name in stream_names])
+    except ValueError as err: # no stream found
+        raise Exception('streams %s not found in %s (%s)' % (', '.join(stream_names), xdf_file, err))
+    streams = {}
+    for stream_name in stream_names:
+        matching_streams = [stream for stream in data if stream['info']['name'] == [stream_name]]
+        if len(matching_streams) == 0:
+            raise Exception('stream "%s" not found' % stream_name)
+        if len(matching_streams) > 1:
+            raise Exception('found more than one stream "%s"' % stream_name)
+        stream = matching_streams[0]
+        time_series = stream['time_series'] if isinstance(stream['time_series'], np.ndarray) else np.array(stream['time_series'], dtype=str) # marker streams are lists of lists of strings
+        streams[stream_name] = XDFStream(time_series, np.asarray(stream['time_stamps']), float(stream['info']['nominal_srate'][0]))
+    return streams
+
+
+def _streamDirectory(cache_directory, file_hash, stream_name):
+    return cache_directory / ('%s_%s' % (file_hash, hashlib.sha256(stream_name.encode()).hexdigest()[:16]))
+
+
+def _saveStream(path, xdf_stream):
+    path.mkdir()
+    np.save(path / 'time_series.npy', xdf_stream.time_series)
+    np.save(path / 'time_stamps.npy', xdf_stream.time_stamps)
+    np.save(path / 'fs.npy', np.array(xdf_stream.fs))
+
+
+def _loadStream(path):
+    # the samples are memory-mapped, i.e. only the parts which are used by the calibration are read from the disk
+    return XDFStream(np.load(path / 'time_series.npy', mmap_mode='r'), np.load(path / 'time_stamps.npy'), float(np.load(path / 'fs.npy')))
+
+
+def sampleChunks(n_samples, chunk_samples=None):
+    # start and end indices of consecutive chunks of a stream
+    chunk_samples = chunk_samples or CHUNK_SAMPLES
+    for start in range(0, n_samples, chunk_samples):
+        yield start, min(start + chunk_samples, n_samples)
+
+
+def channelSamples(xdf_stream, channels, start, end):
+    # samples [channels x samples] of the selected channels (None: all channels) between the start and end indices as float64 array
+    time_series = xdf_stream.time_series[start:end]
+    if channels:
+        time_series = time_series[:, channels]
+    return np.array(time_series, dtype=np.float64).transpose()
+
+
+def workerPool(n_workers):
+    # pool of worker processes for mapChunks (None for a single worker, i.e. the chunks are processed in this process)
+    # spawn (instead of fork) works on all platforms; the functions passed to mapChunks must be module-level functions
+    return ProcessPoolExecutor(n_workers, mp_context=multiprocessing.get_context('spawn')) if n_workers > 1 else None
+
+
+def mapChunks(function, arguments, pool=None, n_workers=1):
+    # returns function(*chunk_arguments) for all chunk arguments in their order; with a pool of n_workers worker processes, at most two chunks per worker
+    # are submitted at a time (i.e. the memory use stays bounded)
+    if pool is None:
+        for chunk_arguments in arguments:
+            yield function(*chunk_arguments)
+        return
+
+    futures = deque()
+    for chunk_arguments in arguments:
+        futures.append(pool.submit(function, *chunk_arguments))
+        if len(futures) >= 2*n_workers:
+            yield futures.popleft().result()
+    while futures:
+        yield futures.popleft().result()
+
+
+def cachedConstants(xdf_file, method_name, parameters, calculate):
+    # returns the calibration constants (a dictionary of numbers and lists) of a normalization method; calculate() is only called if the constants of the
+    # XDF file, the method and the parameters are not cached
+    key = json.dumps([CALIBRATION_VERSION, fileHash(xdf_file), method_name, parameters], sort_keys=True, default=str)
+    constants_file = _cacheDirectory(xdf_file) / ('%s.json' % hashlib.sha256(key.encode()).hexdigest())
+    if constants_file.exists():
+        print('calibration: using cached constants of %s (%s)' % (method_name, constants_file.name))
+        return json.loads(constants_file.read_text())
+
+    constants = calculate()
+    _writeCacheFile(constants_file, lambda path: path.write_text(json.dumps(constants)))
+    return constants
+
+
+def markerEpochs(marker_stream, start_marker, end_marker):
+    # returns the start and end time stamps of all epochs between the start and end markers [epochs x 2]
+    markers = np.asarray(marker_stream.time_series).reshape(len(marker_stream.time_stamps), -1)[:, 0]
+    start_timestamps = marker_stream.time_stamps[markers == start_marker]
+    end_timestamps = marker_stream.time_stamps[markers == end_marker]
+    assert len(start_timestamps) == len(end_timestamps), 'number of start and end markers are different'
+    assert np.all(end_timestamps > start_timestamps), 'end maker must be after start marker'
+    return np.column_stack((start_timestamps, end_timestamps))
+
+
+def epochIndices(time_stamps, epochs):
+    # indices of the samples of all epochs (start and end time stamps included) in the order of the epochs; time_stamps must be sorted
+    epochs = np.asarray(epochs).reshape(-1, 2)
+    start_idcs = np.searchsorted(time_stamps, epochs[:, 0], side='left')
+    end_idcs = np.searchsorted(time_stamps, epochs[:, 1], side='right')
+    n_epoch_samples = np.maximum(end_idcs - start_idcs, 0)
+    # consecutive indices starting at the start index of every epoch
+    epoch_offsets = np.cumsum(n_epoch_samples) - n_epoch_samples
+    return np.arange(n_epoch_samples.sum()) + np.repeat(start_idcs - epoch_offsets, n_epoch_samples)
+
+
+def epochedSignal(signal_values, time_stamps, epochs):
+    # concatenates the values [samples] of all epochs
+    return signal_values[epochIndices(time_stamps, epochs)]
@@ -0,0 +1,145 @@
+import json
+import time
+import numpy as np
+import pylsl
+
+
+TRACE_MAGIC = b'YAGATRC1'
+DEFAULT_CAPACITY = 2**20 # number of events kept in the ring buffer (approx. 20 MB)
+NAMES_SIZE = 2**16 # [bytes] reserved for the names of tasks, ScriptItems, signals and LSL streams
+
+HEADER_DTYPE = np.dtype([('magic', 'S8'), ('capacity', '<u8'), ('n_events', '<u8'), ('names_used', '<u8'), ('clock_offset', '<f8')])
+
+# event types
+TASK_START = 1
+TASK_END = 2
+SCRIPT_ITEM = 3
+SIGNAL = 4
+LSL_CHUNK = 5
+MARKER = 6
+
+
+# file layout: header | name table (newline separated, UTF-8) | event times | event types | event name indices | event values
+def _mapTraceFile(file, mode, capacity=None):
+    if capacity is None:
+        capacity = int(np.memmap(file, dtype=HEADER_DTYPE, mode='r', shape=())['capacity'])
+    layout = [('times', '<f8'), ('types', 'u1'), ('name_ids', '<u4'), ('values', '<f8')]
+    size = HEADER_DTYPE.itemsize + NAMES_SIZE + sum([capacity*np.dtype(dtype).itemsize for _, dtype in layout])
+    buffer = np.memmap(file, dtype=np.uint8, mode=mode, shape=(size,))
+
+    views = {'header': buffer[:HEADER_DTYPE.itemsize].view(HEADER_DTYPE).reshape(()),
+             'name_table': buffer[HEADER_DTYPE.itemsize:HEADER_DTYPE.itemsize + NAMES_SIZE]}
+    offset = HEADER_DTYPE.itemsize + NAMES_SIZE
+    for column, dtype in layout:
+        n_bytes = capacity*np.dtype(dtype).itemsize
+        views[column] = buffer[offset:offset + n_bytes].view(dtype)
+        offset += n_bytes
+    return buffer, views
+
+
+# records frame events into a memory-mapped ring buffer; the file can be converted into a Chrome trace (Perfetto) with exportChromeTrace
+# all memory is allocated when the recorder is created, i.e. recording an event only writes into preallocated arrays
+# names are registered once and events reference them by index; event times are perf_counter values (convert to LSL time with the clock offset)
+class FlightRecorder:
+
+    def __init__(self, file, capacity=DEFAULT_CAPACITY):
+        self.buffer, views = _mapTraceFile(file, 'w+', capacity)
+        self.header = views['header']
+        self.name_table = views['name_table']
+        self.times = views['times']
+        self.types = views['types']
+        self.event_name_ids = views['name_ids']
+        self.values = views['values']
+        self.capacity = capacity
+        self.n_events = 0
+        self.name_ids = {}
+        self.names_used = 0
+
+        self.header['magic'] = TRACE_MAGIC
+        self.header['capacity'] = capacity
+        self.header['clock_offset'] = pylsl.local_clock() - time.perf_counter()
+        print('flight recorder: tracing frame events to "%s"' % file)
+
+    def nameId(self, name):
+        name_id = self.name_ids.get(name)
+        if name_id is None:
+            encoded_name = str(name).replace('\n', ' ').encode() + b'\n'
+            if self.names_used + len(encoded_name) > NAMES_SIZE:
+                return 0xFFFFFFFF # name table is full; the event is exported without a name
+            self.name_table[self.names_used:self.names_used + len(encoded_name)] = np.frombuffer(encoded_name, dtype=np.uint8)
+            self.names_used += len(encoded_name)
+            self.header['names_used'] = self.names_used
+            name_id = len(self.name_ids)
+            self.name_ids[name] = name_id
+        return name_id
+
+    def record(self, event_type, name, value=0.0):
+        idx = self.n_events % self.capacity
+        self.times[idx] = time.perf_counter()
+        self.types[idx] = event_type
+        self.event_name_ids[idx] = self.nameId(name)
+        self.values[idx] = value
+        self.n_events += 1
+        self.header['n_events'] = self.n_events
+
+    def traceTask(self, task_function, task_name):
+        # wraps a Panda3D task function so that its start and end are recorded
+        def tracedTask(task):
+            self.record(TASK_START, task_name)
+            result = task_function(task)
+            self.record(TASK_END, task_name)
+            return result
+
+        return tracedTask
+
+    def close(self):
+        self.buffer.flush()
+
+
+def readTrace(file):
+    _, views = _mapTraceFile(file, 'r')
+    header = views['header']
+    if bytes(header['magic']) != TRACE_MAGIC:
+        raise Exception('"%s" is not a YAGA trace file' % file)
+    capacity = int(header['capacity'])
+    n_events = int(header['n_events'])
+    names = bytes(views['name_table'][:int(header['names_used'])]).decode().split('\n')[:-1]
+
+    # put events into chronological order (the oldest events are overwritten when the ring buffer is full)
+    if n_events > capacity:
+        order = np.roll(np.arange(capacity), -(n_events % capacity))
+    else:
+        order = np.arange(n_events)
+    events = {column: np.array(views[column][order]) for column in ('times', 'types', 'name_ids', 'values')}
+    return events, names, float(header['clock_offset'])
+
+
+# converts a trace file into the Chrome trace event format (JSON), which can be opened with chrome://tracing or https://ui.perfetto.dev
+# time stamps are LSL times in microseconds
+def exportChromeTrace(trace_file, json_file):
+    events, names, clock_offset = readTrace(trace_file)
+
+    trace_events = []
+    open_tasks = set()
+    for event_time, event_type, name_id, value in zip(events['times'], events['types'], events['name_ids'], events['values']):
+        name = names[name_id] if name_id < len(names) else '?'
+        ts = (event_time + clock_offset) * 1e6
+        if event_type == TASK_START:
+            open_tasks.add(name)
+            trace_events.append({'name': name, 'cat': 'task', 'ph': 'B', 'ts': ts, 'pid': 1, 'tid': 1})
+        elif event_type == TASK_END:
+            if name in open_tasks: # skip end events whose start event was overwritten in the ring buffer
+                open_tasks.discard(name)
+                trace_events.append({'name': name, 'cat': 'task', 'ph': 'E', 'ts': ts, 'pid': 1, 'tid': 1})
+        elif event_type == SCRIPT_ITEM:
+            trace_events.append({'name': name, 'cat': 'script_item', 'ph': 'i', 's': 'p', 'ts': ts, 'pid': 1, 'tid': 2})
+        elif event_type == SIGNAL:
+            trace_events.append({'name': name, 'cat': 'signal', 'ph': 'i', 's': 'p', 'ts': ts, 'pid': 1, 'tid': 2})
+        elif event_type == MARKER:
+            trace_events.append({'name': name, 'cat': 'marker', 'ph': 'i', 's': 'p', 'ts': ts, 'pid': 1, 'tid': 3})
+        elif event_type == LSL_CHUNK:
+            trace_events.append({'name': 'LSL chunk ' + name, 'cat': 'lsl', 'ph': 'C', 'ts': ts, 'pid': 1, 'args': {'samples': float(value)}})
+
+    with open(json_file, 'w') as f:
+        json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, f)
+    print('exported %d events to "%s"' % (len(trace_events), json_file))
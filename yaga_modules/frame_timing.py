@@ -0,0 +1,114 @@
+import time
+import numpy as np
+import pylsl
+
+
+HISTOGRAM_RESOLUTION = 0.05 # [ms]
+HISTOGRAM_MAX_DURATION = 1000 # [ms]; longer durations are counted in the last histogram bin
+SUMMARY_PERCENTILES = (50, 90, 99, 99.9)
+
+
+# measures the execution time of YAGA's frame tasks and of the LSL read-out and state update of each interface object
+# the measurements of each frame are published as an LSL stream with a regular sampling rate (one sample per frame), so that they can be recorded
+# together with the data streams; percentiles of all measurements are printed when YAGA quits
+# channels (durations in [ms]): frame interval, missed deadline (0/1), one channel per task, one channel per readLSLStream and updateState call
+class FrameTimer:
+
+    def __init__(self, task_names, interface_objects, fps=60, lsl_stream_name='yaga_frame_timing', deadline_tolerance=1.5):
+        self.fps = fps
+        self.deadline = deadline_tolerance * 1000.0 / fps # [ms]; a frame interval longer than this value counts as missed vsync deadline
+
+        # channel layout
+        self.channel_labels = ['frame_interval', 'missed_deadline']
+        self.task_channels = {}
+        for task_name in task_names:
+            self.task_channels[task_name] = len(self.channel_labels)
+            self.channel_labels.append(task_name)
+        self.read_channel_offset = len(self.channel_labels)
+        self.channel_labels += ['%s_%d_readLSLStream' % (type(interface_object).__name__, object_idx) for object_idx, interface_object in enumerate(interface_objects)]
+        self.update_channel_offset = len(self.channel_labels)
+        self.channel_labels += ['%s_%d_updateState' % (type(interface_object).__name__, object_idx) for object_idx, interface_object in enumerate(interface_objects)]
+        n_channels = len(self.channel_labels)
+
+        # set up outgoing LSL stream; channel labels are stored in the stream's meta data
+        lsl_info = pylsl.StreamInfo(lsl_stream_name, 'FrameTiming', n_channels, fps, pylsl.cf_float32, lsl_stream_name)
+        lsl_channels = lsl_info.desc().append_child('channels')
+        for channel_label in self.channel_labels:
+            lsl_channel = lsl_channels.append_child('channel')
+            lsl_channel.append_child_value('label', channel_label)
+            lsl_channel.append_child_value('unit', 'ms')
+        self.lsl_outlet = pylsl.StreamOutlet(lsl_info)
+
+        # per-frame measurements and histograms of all frames (constant memory, used for the percentile summary)
+        self.frame_sample = np.zeros((n_channels,), dtype=np.float32)
+        self.n_histogram_bins = int(HISTOGRAM_MAX_DURATION / HISTOGRAM_RESOLUTION)
+        self.histograms = np.zeros((n_channels, self.n_histogram_bins), dtype=np.int64)
+        self.channel_idcs = np.arange(n_channels)
+        self.max_durations = np.zeros((n_channels,))
+        self.frame_start = None
+        self.frame_start_lsl_time = None
+        self.n_frames = 0
+        self.n_missed_deadlines = 0
+
+    def startFrame(self):
+        # called at the start of the first task of a frame; publishes the measurements of the previous frame
+        frame_start = time.perf_counter()
+        if self.frame_start is not None:
+            frame_interval = (frame_start - self.frame_start) * 1000.0
+            self.frame_sample[0] = frame_interval
+            self.frame_sample[1] = frame_interval > self.deadline
+            self.n_missed_deadlines += int(self.frame_sample[1])
+
+            self.lsl_outlet.push_sample(self.frame_sample, self.frame_start_lsl_time)
+
+            bin_idcs = np.minimum((self.frame_sample / HISTOGRAM_RESOLUTION).astype(np.int64), self.n_histogram_bins - 1)
+            self.histograms[self.channel_idcs, bin_idcs] += 1
+            np.maximum(self.max_durations, self.frame_sample, out=self.max_durations)
+            self.n_frames += 1
+            self.frame_sample[:] = 0
+
+        self.frame_start = frame_start
+        self.frame_start_lsl_time = pylsl.local_clock()
+
+    def timeTask(self, task_function, task_name, starts_frame=False):
+        # wraps a Panda3D task function so that its execution time is measured
+        channel = self.task_channels[task_name]
+
+        def timedTask(task):
+            if starts_frame:
+                self.startFrame()
+            start = time.perf_counter()
+            result = task_function(task)
+            self.frame_sample[channel] = (time.perf_counter() - start) * 1000.0
+            return result
+
+        return timedTask
+
+    def readLSLStreams(self, interface_objects):
+        for object_idx, interface_object in enumerate(interface_objects):
+            start = time.perf_counter()
+            interface_object.readLSLStream()
+            self.frame_sample[self.read_channel_offset + object_idx] = (time.perf_counter() - start) * 1000.0
+
+    def updateStates(self, interface_objects, local_time):
+        signals = []
+        for object_idx, interface_object in enumerate(interface_objects):
+            start = time.perf_counter()
+            signals.append(interface_object.updateState(local_time))
+            self.frame_sample[self.update_channel_offset + object_idx] = (time.perf_counter() - start) * 1000.0
+        return signals
+
+    def printSummary(self):
+        if self.n_frames == 0:
+            return
+
+        print('frame timing summary: %d frames, %d missed deadlines (frame interval > %.2f ms)' % (self.n_frames, self.n_missed_deadlines, self.deadline))
+        print('%-40s' % 'duration [ms]' + ''.join(['%10s' % ('p%g' % percentile) for percentile in SUMMARY_PERCENTILES]) + '%10s' % 'max')
+        cumulative_histograms = np.cumsum(self.histograms, axis=1)
+        for channel_idx, channel_label in enumerate(self.channel_labels):
+            if channel_label == 'missed_deadline':
+                continue
+            # the percentile is the upper edge of the first histogram bin that reaches the requested fraction of frames
+            percentiles = [(np.searchsorted(cumulative_histograms[channel_idx], percentile / 100.0 * self.n_frames) + 1) * HISTOGRAM_RESOLUTION for percentile in SUMMARY_PERCENTILES]
+            percentiles = [min(value, self.max_durations[channel_idx]) for value in percentiles]
+            print('%-40s' % channel_label + ''.join(['%10.2f' % value for value in percentiles]) + '%10.2f' % self.max_durations[channel_idx])
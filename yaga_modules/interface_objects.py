@@ -1,25 +1,796 @@
 from collections import namedtuple
+import copy
+import inspect
+import multiprocessing
+import threading
+import time
+import traceback
 
 import pylsl
 import numpy as np
 
+from yaga_modules.flight_recorder import LSL_CHUNK
+from yaga_modules.ring_buffer import SampleRingBuffer, SharedSampleRingBuffer, WindowAggregator
 
-MAX_LSL_BUFFER_SAMPLES = 1024 # this allows for sampling rates up to 61 kHz when run with 60 FPS (i.e. 1024*60 Hz)
 
+MAX_LSL_BUFFER_SAMPLES = 1024 # minimum number of samples pulled at once (the pull buffers of streams with a regular sampling rate hold all samples of the inlet buffer)
+INLET_BUFFER_DURATION = 1 # [s]; LSL inlet buffer size (for streams with an irregular sampling rate: 100 samples)
+RING_BUFFER_DURATION = 2 # [s]; minimum duration of the per-stream ring buffers used by the ingestion thread and the catchup backlog policy
+DEFAULT_FRAME_RATE = 60 # [Hz]; initial value of the measured frame rate
+FRAME_RATE_SMOOTHING = 0.95 # smoothing factor of the measured frame rate
+OVERFLOW_FACTOR = 2 # a frame with more than OVERFLOW_FACTOR times the expected number of samples counts as overflow
+DEFAULT_AGGREGATION_WINDOW = 0.2 # [s]; window length of the window aggregation modes
+MAX_FLIP_EXTRAPOLATION = 0.1 # [s]; the aggregation mode "flip" extrapolates samples at most this interval beyond the newest sample (afterwards, the value is held)
+AFFINE_STEP = 'affine' # marks fused affine steps in processor chain plans
+INGESTION_IDLE_INTERVAL = 0.001 # [s]; the ingestion thread sleeps for this interval when no LSL stream delivered new samples
+WORKER_STOP_TIMEOUT = 1 # [s]; time to wait for a worker process of an offloaded processor chain to stop
+
+# data types of numeric LSL channel formats
+LSL_CHANNEL_FORMAT_DTYPES = {pylsl.cf_float32: np.float32, pylsl.cf_double64: np.float64, pylsl.cf_int8: np.int8, pylsl.cf_int16: np.int16, pylsl.cf_int32: np.int32, pylsl.cf_int64: np.int64}
+
+PlanStep = namedtuple('PlanStep', ('processor', 'channels', 'supports_out', 'n_channels', 'fs', 'changes_rate', 'internal_dtype', 'affine_mode', 'matrix', 'offset')) # step of a ProcessorChainPlan
 SignalProcessor = namedtuple('SignalProcessor', ('object', 'channels'))
 
 
+# converts a parameter (e.g. the channel list of a processor) into a hashable value
+def _freezeParameter(value):
+    if isinstance(value, np.ndarray):
+        return ('ndarray', value.dtype.str, value.shape, value.tobytes())
+    if isinstance(value, (list, tuple)):
+        return tuple([_freezeParameter(element) for element in value])
+    if isinstance(value, dict):
+        return tuple(sorted([(key, _freezeParameter(element)) for key, element in value.items()], key=lambda item: str(item[0])))
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        return ('id', id(value)) # unhashable parameters prevent sharing the processor
+
+
+# compares the parameters of a processor with a snapshot (see ProcessorChainPlan); arrays are compared element-wise
+def _sameParameter(value, snapshot_value):
+    if isinstance(value, np.ndarray) or isinstance(snapshot_value, np.ndarray):
+        return isinstance(value, np.ndarray) and isinstance(snapshot_value, np.ndarray) and value.shape == snapshot_value.shape and np.array_equal(value, snapshot_value)
+    if isinstance(value, (list, tuple)) or isinstance(snapshot_value, (list, tuple)):
+        return type(value) is type(snapshot_value) and len(value) == len(snapshot_value) and all(_sameParameter(element, snapshot_element) for element, snapshot_element in zip(value, snapshot_value))
+    if isinstance(value, dict) or isinstance(snapshot_value, dict):
+        return type(value) is type(snapshot_value) and value.keys() == snapshot_value.keys() and all(_sameParameter(value[key], snapshot_value[key]) for key in value)
+    return type(value) is type(snapshot_value) and bool(value == snapshot_value)
+
+
+def _sameParameters(processor, parameters):
+    processor_parameters = vars(processor)
+    return processor_parameters.keys() == parameters.keys() and all(_sameParameter(value, parameters[name]) for name, value in processor_parameters.items())
+
+
+def processorChainSignature(processors, offload=False):
+    # chains are only shared by interface objects which hold the same processor objects (in the same order and with the same channels): every processor
+    # object is updated once per frame, and parameter changes or resets of a processor reach every subscriber of its chain (equal processor objects
+    # of different interface objects are not shared, as only the processors of one subscriber would be updated); offloaded chains are not shared with
+    # chains which run in the render loop (their output is delayed)
+    signature = tuple([(id(processor.object), _freezeParameter(processor.channels)) for processor in processors])
+    if offload:
+        signature += ('offload',)
+    return signature
+
+
+# an LSL stream with one inlet, shared by all interface objects which are controlled by the stream
+# backlog policies determine how many of the samples which arrived since the last frame are processed in a frame:
+#   drain:   process all samples (default); after a hiccup (e.g. garbage collection, window move), all delayed samples are processed in the next frame
+#   newest:  process only the samples of the last "newest_duration" seconds; older samples are dropped
+#   catchup: process the expected number of samples per frame plus an equal part of the backlog, which is fixed when the backlog occurs, i.e. the backlog is
+#            processed within "catchup_frames" frames
+# with time_sync, LSL synchronizes the time stamps with the local clock and removes their jitter (required for latency measurements and the aggregation mode "flip")
+# dtype ('float64' or 'float32') is the data type in which the samples are buffered and processed (processors which need float64 declare it, see
+# signal_processing.py); float32 halves the memory traffic of the signal path
+class LSLStream:
+
+    def __init__(self, name, backlog_policy='drain', newest_duration=0.1, catchup_frames=10, time_sync=False, dtype='float64'):
+        print('connecting to LSL stream %s...' % name)
+        lsl_info = pylsl.resolve_byprop('name', name, timeout=15)
+        if not lsl_info:
+            raise Exception('timeout: LSL stream "%s" not found' % name)
+        if len(lsl_info) > 1:
+            raise Exception('found more than one LSL stream with name "%s"' % name)
+        self.name = name
+        self.lsl_info = lsl_info[0]
+        self.time_sync = time_sync
+        self.inlet = self._openInlet()
+        self.fs = self.inlet.info().nominal_srate()
+        self.n_channels = self.inlet.info().channel_count()
+
+        # the pull buffer can hold all samples of the inlet buffer, i.e. a single pull drains the inlet
+        if self.fs > 0:
+            self.max_pull_samples = max(MAX_LSL_BUFFER_SAMPLES, int(np.ceil(2 * self.fs * INLET_BUFFER_DURATION)))
+        else:
+            self.max_pull_samples = MAX_LSL_BUFFER_SAMPLES
+
+        self.dtype = None
+        self.ring_buffer = None # used when samples are pulled by the ingestion thread or when the backlog is processed over several frames
+        self.ingestion_thread = False
+        self.samples = None # samples received in the current frame [channels x samples] (read-only); None if no samples were received
+        self.time_stamps = None # LSL time stamps of the samples received in the current frame
+        self.latency = None # [s]; age of the newest sample at the predicted screen update (only with time_sync)
+
+        # backlog statistics
+        self.n_frames = 0
+        self.n_samples = 0
+        self.n_dropped_samples = 0
+        self.n_overflows = 0 # number of overflows, i.e. frames in which more than OVERFLOW_FACTOR times the expected number of samples were available (a backlog
+                             # which is processed over several frames counts once)
+        self.overflow = False # True until the backlog of an overflow is processed
+        self.backlog = 0 # samples which were available but not processed in the last frame
+        self.max_backlog = 0
+        self.catchup_samples = 0 # samples of the backlog which are processed per frame in addition to the expected samples (catchup policy)
+        self.catchup_frames_left = 0 # frames until the backlog is processed (catchup policy)
+
+        self.configure(backlog_policy, newest_duration, catchup_frames, time_sync, dtype)
+        print('connected')
+
+    def _openInlet(self):
+        # note: max_buflen is in seconds if there is a nominal sampling rate
+        if self.time_sync:
+            return pylsl.StreamInlet(self.lsl_info, max_buflen=INLET_BUFFER_DURATION, recover=True, processing_flags=pylsl.proc_clocksync | pylsl.proc_dejitter)
+        return pylsl.StreamInlet(self.lsl_info, max_buflen=INLET_BUFFER_DURATION, recover=True)
+
+    def configure(self, backlog_policy='drain', newest_duration=0.1, catchup_frames=10, time_sync=False, dtype='float64'):
+        if backlog_policy not in ('drain', 'newest', 'catchup'):
+            raise Exception('unknown backlog policy: "%s"' % backlog_policy)
+        if np.dtype(dtype) not in (np.float32, np.float64):
+            raise Exception('unsupported data type: "%s" (supported: float32, float64)' % dtype)
+        assert newest_duration > 0, '"newest_duration" must be positive'
+        assert isinstance(catchup_frames, int) and catchup_frames > 0, '"catchup_frames" must be a positive integer'
+        if backlog_policy != 'drain' and self.fs <= 0:
+            raise Exception('backlog policy "%s" requires a stream with a regular sampling rate' % backlog_policy)
+        self.backlog_policy = backlog_policy
+        self.newest_duration = newest_duration
+        self.catchup_frames = catchup_frames
+        if time_sync != self.time_sync:
+            # the processing flags of an inlet are fixed, i.e. the inlet must be reopened
+            self.time_sync = time_sync
+            self.inlet.close_stream()
+            self.inlet = self._openInlet()
+        if self.dtype is None or np.dtype(dtype) != self.dtype:
+            self.dtype = np.dtype(dtype)
+            self._allocateBuffers()
+        if backlog_policy == 'catchup':
+            self._createRingBuffer()
+
+    def _allocateBuffers(self):
+        # preallocated buffers; liblsl writes pulled samples directly into the pull buffer (in the stream's data type, [samples x channels])
+        # streams with another data type than the processing data type are converted into the work buffer
+        lsl_dtype = LSL_CHANNEL_FORMAT_DTYPES.get(self.inlet.info().channel_format())
+        if lsl_dtype:
+            self.pull_buffer = np.empty((self.max_pull_samples, self.n_channels), dtype=lsl_dtype)
+            self.work_buffer = self.pull_buffer if lsl_dtype == self.dtype else np.empty((self.max_pull_samples, self.n_channels), dtype=self.dtype)
+        else:
+            self.pull_buffer = None # e.g. string streams
+            self.work_buffer = None
+        if self.ring_buffer:
+            self.ring_buffer = None
+            self._createRingBuffer()
+
+    def _createRingBuffer(self):
+        if not self.ring_buffer:
+            # the ring buffer holds samples of at least RING_BUFFER_DURATION seconds
+            capacity = max(int(self.fs * RING_BUFFER_DURATION), 2 * self.max_pull_samples)
+            self.ring_buffer = SampleRingBuffer(self.n_channels, capacity, self.dtype)
+
+    def pullChunk(self):
+        # read all available samples from LSL inlet (non-blocking); returns samples [channels x samples] and time stamps, or (None, None)
+        # note: the returned samples are a view of the work buffer, which is overwritten by the next pull
+        if self.pull_buffer is None:
+            samples_list, time_stamps = self.inlet.pull_chunk(timeout=0.0, max_samples=self.max_pull_samples)
+            if len(samples_list) == 0:
+                return None, None
+            return np.array(samples_list).transpose(), np.array(time_stamps) # [channels x samples]
+
+        _, time_stamps = self.inlet.pull_chunk(timeout=0.0, max_samples=self.max_pull_samples, dest_obj=self.pull_buffer)
+        n_samples = len(time_stamps)
+        if n_samples == 0:
+            return None, None
+        if self.work_buffer is not self.pull_buffer:
+            np.copyto(self.work_buffer[:n_samples], self.pull_buffer[:n_samples])
+        return self.work_buffer[:n_samples].T, np.asarray(time_stamps) # [channels x samples]
+
+    def enableIngestionThread(self):
+        self._createRingBuffer()
+        self.ingestion_thread = True
+
+    def ingest(self):
+        # called by the ingestion thread (or once per frame for the catchup policy); returns the number of pulled samples
+        samples, time_stamps = self.pullChunk()
+        if samples is None:
+            return 0
+        self.ring_buffer.write(samples, time_stamps)
+        return samples.shape[1]
+
+    def pull(self, frame_rate):
+        # called once per frame; takes the samples received since the last frame according to the backlog policy
+        expected_samples = self.fs / frame_rate
+        if self.ring_buffer:
+            if not self.ingestion_thread:
+                self.ingest()
+            n_available = self.ring_buffer.available()
+            if self.backlog_policy == 'catchup':
+                max_samples = self._catchupSamples(n_available, expected_samples)
+            else:
+                max_samples = None
+            n_lost_samples = self.ring_buffer.n_lost_samples
+            samples, time_stamps = self.ring_buffer.read(max_samples)
+            self.n_dropped_samples += self.ring_buffer.n_lost_samples - n_lost_samples
+            self.backlog = self.ring_buffer.available()
+        else:
+            samples, time_stamps = self.pullChunk()
+            n_available = samples.shape[1] if samples is not None else 0
+            self.backlog = 0
+
+        # statistics
+        if self.fs > 0 and n_available > OVERFLOW_FACTOR * expected_samples and not self.overflow:
+            self.n_overflows += 1
+            self.overflow = True
+        if self.backlog == 0:
+            self.overflow = False
+        self.max_backlog = max(self.max_backlog, self.backlog)
+        self.n_frames += 1
+
+        # drop samples older than "newest_duration"
+        if samples is not None and self.backlog_policy == 'newest':
+            n_newest_samples = max(1, int(np.ceil(self.newest_duration * self.fs)))
+            if samples.shape[1] > n_newest_samples:
+                self.n_dropped_samples += samples.shape[1] - n_newest_samples
+                samples = samples[:, -n_newest_samples:]
+                time_stamps = time_stamps[-n_newest_samples:]
+
+        if InterfaceObject.flight_recorder:
+            InterfaceObject.flight_recorder.record(LSL_CHUNK, self.name, samples.shape[1] if samples is not None else 0)
+
+        if samples is not None:
+            samples.flags.writeable = False
+            self.n_samples += samples.shape[1]
+        self.samples = samples
+        self.time_stamps = time_stamps
+
+    def _catchupSamples(self, n_available, expected_samples):
+        # number of samples to process in this frame with the catchup policy
+        backlog = n_available - expected_samples
+        if backlog > self.catchup_samples * self.catchup_frames_left:
+            # a new backlog (e.g. after a hiccup) or a backlog which grew: it is processed in equal parts within catchup_frames frames
+            self.catchup_samples = int(np.ceil(backlog / self.catchup_frames))
+            self.catchup_frames_left = self.catchup_frames
+        max_samples = int(np.ceil(expected_samples)) + self.catchup_samples
+        self.catchup_frames_left = max(0, self.catchup_frames_left - 1)
+        if self.catchup_frames_left == 0 or max_samples >= n_available:
+            # the backlog is processed
+            self.catchup_samples = 0
+            self.catchup_frames_left = 0
+        return max_samples
+
+    def statistics(self):
+        return {'frames': self.n_frames, 'samples': self.n_samples, 'dropped_samples': self.n_dropped_samples, 'overflows': self.n_overflows, 'backlog': self.backlog, 'max_backlog': self.max_backlog, 'latency': self.latency}
+
+
+# execution plan of a processor chain, compiled when the chain is attached to an interface object (see LSLStreamHub.attachChain)
+# channel selections are precomputed as slices (consecutive channels) or index arrays, the samples are processed in preallocated buffers, and processors
+# which support an output array (see signal_processing.py) write their results directly into the buffers, i.e. these processors do not allocate memory per frame
+# runs of affine processors (processors with the method linearTransform, e.g. Scaler, LinearMap, Sum, SpatialFilter) are fused into a single affine
+# transform, which is applied with one matrix multiplication (or with one multiply-add if the fused matrix is diagonal, or with one row-vector product if
+# all channels are mapped to the same output, e.g. Scaler followed by Mean); the parameters of fused processors are compared with a snapshot in every frame, and a fused transform is recomputed
+# when a parameter changed (e.g. the scale of a Scaler set by the paradigm)
+# processors with the method outputChannels (e.g. SpatialFilter) applied to all channels can change the number of channels
+# processors with the method outputRate (e.g. Decimate) change the sampling rate (and the number of samples); subsequent processors operate with the new rate
+# and the method outputSampleIndices returns the indices of the input samples of the last update which correspond to the output samples, i.e. the output
+# samples keep the time stamps of these input samples
+# the buffers have the data type of the stream (float64 or float32); processors with the method internalDtype (e.g. ButterFilter with a low cutoff frequency)
+# receive their input converted into the data type they need
+class ProcessorChainPlan:
+
+    def __init__(self, processors, n_channels, capacity, fs, dtype=np.float64):
+        self.n_channels_in = n_channels
+        self.fs = fs # sampling rate of the processed samples
+        self.time_stamps = None # time stamps of the samples returned by the last run
+        self.dtype = np.dtype(dtype)
+        self.steps = []
+        self.fused_runs = [] # [step index, affine processors, number of input channels, parameter snapshots] of the fused affine steps
+        self.max_channels = n_channels
+        affine_run = []
+        for processor in processors:
+            if hasattr(processor.object, 'linearTransform'):
+                affine_run.append(processor)
+            else:
+                n_channels = self._addAffineRun(affine_run, n_channels)
+                affine_run = []
+                n_channels = self._addStep(processor.object, self._channelSelection(processor.channels, n_channels), n_channels)
+        self.n_channels_out = self._addAffineRun(affine_run, n_channels)
+        self._allocate(capacity)
+
+    def _channelSelection(self, channels, n_channels):
+        # None (all channels), a slice (consecutive channels) or an index array
+        if channels is None or len(channels) == 0:
+            return None
+        channel_idcs = np.array(channels, dtype=np.intp) % n_channels
+        if np.all(np.diff(channel_idcs) == 1):
+            return slice(int(channel_idcs[0]), int(channel_idcs[-1]) + 1)
+        return channel_idcs
+
+    def _outputChannels(self, processor, channels, n_channels):
+        if not hasattr(processor, 'outputChannels'):
+            return n_channels # outputs with one channel are broadcasted
+        if channels is None:
+            return processor.outputChannels(n_channels)
+        n_selected_channels = len(np.arange(n_channels)[channels])
+        assert processor.outputChannels(n_selected_channels) == n_selected_channels, '%s: the number of output channels must match the number of selected channels' % type(processor).__name__
+        return n_channels
+
+    def _addStep(self, processor, channels, n_channels):
+        n_channels_out = self._outputChannels(processor, channels, n_channels)
+        supports_out = 'out' in inspect.signature(processor.update).parameters
+        changes_rate = hasattr(processor, 'outputRate')
+        if changes_rate:
+            assert channels is None, '%s: processors which change the sampling rate must be applied to all channels' % type(processor).__name__
+        internal_dtype = processor.internalDtype(self.fs) if hasattr(processor, 'internalDtype') else None
+        if internal_dtype is not None and np.dtype(internal_dtype) != self.dtype:
+            internal_dtype = np.dtype(internal_dtype)
+            supports_out = False # the processor's output is converted into the buffer's data type
+        else:
+            internal_dtype = None
+        self.steps.append(PlanStep(processor, channels, supports_out, n_channels_out, self.fs, changes_rate, internal_dtype, None, None, None))
+        if changes_rate:
+            self.fs = processor.outputRate(self.fs)
+        self.max_channels = max(self.max_channels, n_channels_out)
+        return n_channels_out
+
+    def _addAffineRun(self, affine_run, n_channels):
+        # returns the number of channels after the run
+        if not affine_run:
+            return n_channels
+        if len(affine_run) == 1 and not hasattr(affine_run[0].object, 'outputChannels'):
+            # a single element-wise affine processor is applied with its update method (cheaper than a matrix multiplication)
+            return self._addStep(affine_run[0].object, self._channelSelection(affine_run[0].channels, n_channels), n_channels)
+
+        self.fused_runs.append([len(self.steps), affine_run, n_channels, [copy.deepcopy(vars(processor.object)) for processor in affine_run]])
+        step = self._fuseAffineRun(affine_run, n_channels)
+        self.steps.append(step)
+        return step.n_channels
+
+    def _fuseAffineRun(self, affine_run, n_channels):
+        # fuses the affine transforms: samples_out = matrix @ samples_in + offset
+        n_channels_in = n_channels
+        matrix = np.eye(n_channels)
+        offset = np.zeros((n_channels,))
+        for processor in affine_run:
+            step_matrix, step_offset = self._affineStep(processor.object, self._channelSelection(processor.channels, n_channels), n_channels)
+            matrix = step_matrix @ matrix
+            offset = step_matrix @ offset + step_offset
+            n_channels = step_matrix.shape[0]
+            self.max_channels = max(self.max_channels, n_channels)
+
+        if n_channels == n_channels_in and np.count_nonzero(matrix - np.diag(np.diag(matrix))) == 0:
+            return PlanStep(AFFINE_STEP, None, True, n_channels, self.fs, False, None, 'diagonal', np.diag(matrix).reshape((-1, 1)).astype(self.dtype), offset.reshape((-1, 1)).astype(self.dtype))
+        if n_channels == n_channels_in and np.all(matrix == matrix[0]) and np.all(offset == offset[0]):
+            return PlanStep(AFFINE_STEP, None, True, n_channels, self.fs, False, None, 'row', matrix[:1, :].astype(self.dtype), offset[:1].reshape((1, 1)).astype(self.dtype))
+        return PlanStep(AFFINE_STEP, None, True, n_channels, self.fs, False, None, 'matrix', matrix.astype(self.dtype), offset.reshape((-1, 1)).astype(self.dtype))
+
+    def _refuseChangedRuns(self):
+        # recomputes the fused affine transforms whose processor parameters changed since the last frame
+        for fused_run in self.fused_runs:
+            step_idx, affine_run, n_channels, parameters = fused_run
+            if all(_sameParameters(processor.object, processor_parameters) for processor, processor_parameters in zip(affine_run, parameters)):
+                continue
+            fused_run[3] = [copy.deepcopy(vars(processor.object)) for processor in affine_run]
+            step = self._fuseAffineRun(affine_run, n_channels)
+            assert step.n_channels == self.steps[step_idx].n_channels, 'the number of output channels of fused affine processors must not change'
+            self.steps[step_idx] = step._replace(fs=self.steps[step_idx].fs) # self.fs is the sampling rate at the end of the chain
+
+    def _affineStep(self, processor, channels, n_channels):
+        # affine transform of a processor applied to a channel selection, expressed for all channels
+        n_channels_out = self._outputChannels(processor, channels, n_channels)
+        channel_idcs = np.arange(n_channels)[channels] if channels is not None else np.arange(n_channels)
+        local_matrix, local_offset = processor.linearTransform(len(channel_idcs))
+        if channels is None and n_channels_out != n_channels:
+            return local_matrix, local_offset
+        if local_matrix.shape[0] == 1 and len(channel_idcs) > 1:
+            # single-channel outputs are broadcasted to all selected channels
+            local_matrix = np.repeat(local_matrix, len(channel_idcs), axis=0)
+            local_offset = np.repeat(local_offset, len(channel_idcs))
+        matrix = np.eye(n_channels)
+        matrix[channel_idcs, :] = 0
+        matrix[np.ix_(channel_idcs, channel_idcs)] = local_matrix
+        offset = np.zeros((n_channels,))
+        offset[channel_idcs] = local_offset
+        return matrix, offset
+
+    def _allocate(self, capacity):
+        # two flat buffers (the current samples and the output of channel mixing steps), so that the samples of a frame are a contiguous
+        # [channels x samples] view (NumPy ufuncs on contiguous views do not need temporary buffers)
+        self.capacity = capacity
+        self.buffer = np.empty((self.max_channels * capacity,), dtype=self.dtype)
+        self.mix_buffer = np.empty((self.max_channels * capacity,), dtype=self.dtype)
+        # gather buffers for processors which support an output array but operate on non-consecutive channels
+        self.gather_buffers = [np.empty((len(step.channels) * capacity,), dtype=self.dtype) if step.processor is not AFFINE_STEP and step.supports_out and isinstance(step.channels, np.ndarray) else None for step in self.steps]
+
+    def run(self, samples, time_stamps=None):
+        # samples: [channels x samples]; returns a view of the plan's buffers, which are overwritten in the next frame, or None if a processor which
+        # changes the sampling rate did not produce an output sample
+        # time_stamps: time stamps of the samples (optional); the time stamps of the returned samples are stored in self.time_stamps
+        self.time_stamps = None
+        n_samples = samples.shape[1]
+        if n_samples > self.capacity:
+            self._allocate(n_samples) # e.g. a large backlog read from a ring buffer
+        lsl_samples = self.buffer[:self.n_channels_in * n_samples].reshape((self.n_channels_in, n_samples))
+        np.copyto(lsl_samples, samples)
+        if self.fused_runs:
+            self._refuseChangedRuns()
+
+        for step, gather_buffer in zip(self.steps, self.gather_buffers):
+            processor, channels, supports_out, fs = step.processor, step.channels, step.supports_out, step.fs
+            n_samples = lsl_samples.shape[1]
+            if processor is AFFINE_STEP:
+                if step.affine_mode == 'diagonal':
+                    np.multiply(lsl_samples, step.matrix, out=lsl_samples)
+                    np.add(lsl_samples, step.offset, out=lsl_samples)
+                elif step.affine_mode == 'row':
+                    # all channels have the same output: compute it once and broadcast it
+                    row_samples = self.mix_buffer[:n_samples].reshape((1, n_samples))
+                    np.matmul(step.matrix, lsl_samples, out=row_samples)
+                    np.add(row_samples, step.offset, out=row_samples)
+                    lsl_samples[:, :] = row_samples
+                else:
+                    mixed_samples = self._mix(step.matrix, lsl_samples, step.n_channels, n_samples)
+                    np.add(mixed_samples, step.offset, out=mixed_samples)
+                    lsl_samples = mixed_samples
+            elif step.changes_rate:
+                # the number of output samples depends on the processor's state; its output is copied into the second buffer
+                processed_samples = self._update(step, lsl_samples)
+                if processed_samples.shape[1] == 0:
+                    return None
+                if time_stamps is not None:
+                    time_stamps = time_stamps[processor.outputSampleIndices()]
+                mixed_samples = self.mix_buffer[:processed_samples.size].reshape(processed_samples.shape)
+                np.copyto(mixed_samples, processed_samples)
+                self.buffer, self.mix_buffer = self.mix_buffer, self.buffer
+                lsl_samples = mixed_samples
+            elif channels is None and step.n_channels != lsl_samples.shape[0]:
+                # the processor changes the number of channels; its output is written into the second buffer
+                mixed_samples = self.mix_buffer[:step.n_channels * n_samples].reshape((step.n_channels, n_samples))
+                if supports_out:
+                    processor.update(lsl_samples, fs, out=mixed_samples)
+                else:
+                    mixed_samples[:, :] = self._update(step, lsl_samples)
+                self.buffer, self.mix_buffer = self.mix_buffer, self.buffer
+                lsl_samples = mixed_samples
+            elif channels is None:
+                if supports_out:
+                    processor.update(lsl_samples, fs, out=lsl_samples)
+                else:
+                    lsl_samples[:, :] = self._update(step, lsl_samples)
+            elif isinstance(channels, slice):
+                if supports_out:
+                    processor.update(lsl_samples[channels], fs, out=lsl_samples[channels])
+                else:
+                    lsl_samples[channels] = self._update(step, lsl_samples[channels])
+            else:
+                if supports_out:
+                    selected_samples = gather_buffer[:len(channels) * n_samples].reshape((len(channels), n_samples))
+                    np.take(lsl_samples, channels, axis=0, out=selected_samples, mode='clip')
+                    lsl_samples[channels] = processor.update(selected_samples, fs, out=selected_samples)
+                else:
+                    lsl_samples[channels] = self._update(step, lsl_samples[channels])
+        self.time_stamps = time_stamps
+        return lsl_samples
+
+    def _update(self, step, lsl_samples):
+        # update of a processor without an output array; the samples are converted if the processor needs another data type
+        if step.internal_dtype is not None:
+            lsl_samples = lsl_samples.astype(step.internal_dtype)
+        return step.processor.update(lsl_samples, step.fs)
+
+    def _mix(self, matrix, lsl_samples, n_channels_out, n_samples):
+        # matrix multiplication into the second buffer; afterwards, the buffers swap their roles
+        mixed_samples = self.mix_buffer[:n_channels_out * n_samples].reshape((n_channels_out, n_samples))
+        np.matmul(matrix, lsl_samples, out=mixed_samples)
+        self.buffer, self.mix_buffer = self.mix_buffer, self.buffer
+        return mixed_samples
+
+
+# worker process of an offloaded processor chain: processes the samples of the input ring buffer whenever the render loop signals new samples
+def _runOffloadedChain(processors, n_channels, capacity, fs, dtype, input_arguments, output_arguments, connection):
+    input_buffer = SharedSampleRingBuffer(*input_arguments)
+    output_buffer = SharedSampleRingBuffer(*output_arguments)
+    try:
+        chain_plan = ProcessorChainPlan(processors, n_channels, capacity, fs, dtype)
+        while connection.recv():
+            samples, time_stamps = input_buffer.read()
+            if samples is None:
+                continue
+            processed_samples = chain_plan.run(samples, time_stamps)
+            if processed_samples is not None:
+                output_buffer.write(processed_samples, chain_plan.time_stamps)
+    except Exception:
+        connection.send(traceback.format_exc()) # the error is raised in the render loop
+    finally:
+        input_buffer.close()
+        output_buffer.close()
+
+
+# processor chain which runs in a worker process, e.g. an expensive chain on a high-density stream, which would otherwise delay the screen updates
+# (threads do not help, as the processors hold the GIL); every offloaded chain has its own worker process, i.e. chains of different streams run in parallel
+# 1. the render loop writes the samples of a frame into a shared memory ring buffer and notifies the worker through a pipe
+# 2. the worker processes the samples with a ProcessorChainPlan and writes the processed samples and their time stamps into a second shared memory ring buffer
+# 3. the render loop reads all samples which were processed since the last frame (usually the samples of the previous frame, i.e. the output is delayed
+#    by the processing time of the worker)
+# the processors are copied into the worker process (spawn); their state in the render loop is not updated
+# the worker process is started by start() (YAGA starts the workers of all chains before the first frame, see LSLStreamHub.startChainWorkers), as starting
+# a process takes tens of milliseconds; run() starts the worker if it has not been started yet
+class OffloadedProcessorChain:
+
+    def __init__(self, processors, n_channels, capacity, fs, dtype=np.float64, name='chain'):
+        # the plan is compiled once in the render loop to determine the number of output channels and the output sampling rate (compiling a plan does
+        # not change the processors' states)
+        chain_plan = ProcessorChainPlan(processors, n_channels, capacity, fs, dtype)
+        self.fs = chain_plan.fs
+        self.n_channels_out = chain_plan.n_channels_out
+        self.dtype = chain_plan.dtype
+        self.time_stamps = None # time stamps of the samples returned by the last run
+
+        # the ring buffers hold samples of at least RING_BUFFER_DURATION seconds (processors do not increase the number of samples)
+        buffer_capacity = max(int(fs * RING_BUFFER_DURATION), 2 * capacity)
+        self.input_buffer = SharedSampleRingBuffer(n_channels, buffer_capacity, dtype)
+        self.output_buffer = SharedSampleRingBuffer(self.n_channels_out, buffer_capacity, dtype)
+
+        # spawn (instead of fork) works on all platforms and does not copy the render loop's threads and graphics state
+        context = multiprocessing.get_context('spawn')
+        self.connection, worker_connection = context.Pipe()
+        self.worker = context.Process(target=_runOffloadedChain, args=(processors, n_channels, capacity, fs, dtype, self.input_buffer.attachArguments(), self.output_buffer.attachArguments(), worker_connection), name='yaga_%s_worker' % name, daemon=True)
+        self.started = False
+
+    def start(self):
+        if not self.started:
+            self.worker.start()
+            self.started = True
+
+    def run(self, samples, time_stamps):
+        # samples: [channels x samples] or None; returns the samples processed since the last call (or None) and sets their time stamps
+        self.start()
+        if self.connection.poll():
+            raise Exception('worker process of an offloaded processor chain failed:\n%s' % self.connection.recv())
+        if samples is not None:
+            self.input_buffer.write(samples, time_stamps)
+            self.connection.send(True)
+        processed_samples, self.time_stamps = self.output_buffer.read()
+        return processed_samples
+
+    def stop(self):
+        if self.started and self.worker.is_alive():
+            self.connection.send(False)
+            self.worker.join(WORKER_STOP_TIMEOUT)
+            if self.worker.is_alive():
+                self.worker.terminate()
+        self.input_buffer.close()
+        self.output_buffer.close()
+
+
+# resolves, pulls and processes each LSL stream once per frame, independent of the number of interface objects controlled by the stream
+# 1. every LSL stream has exactly one inlet, which is pulled once per frame (see pull)
+# 2. interface objects receive read-only views of the pulled samples
+# 3. processor chains with the same processor objects and channels on the same stream are executed once per frame, and their output is shared
+# optionally, a background thread pulls all inlets continuously into ring buffers; the render loop then only reads the buffered samples (see startIngestionThread)
+# the outputs of signal graphs (see signal_graph.py) are streams of the hub as well; they are evaluated once per frame after all LSL streams have been pulled
+class LSLStreamHub:
+
+    def __init__(self):
+        self.streams = {}
+        self.stream_options = {}
+        self.chain_outputs = {}
+        self.chain_plans = {}
+        self.chain_processors = {} # processors of the compiled chains (used to recompile a chain when the data type of its stream changes)
+        self.chain_subscribers = {} # number of interface objects which use a compiled chain
+        self.signal_graphs = []
+        self.ingestion_thread = None
+        self.ingestion_running = False
+        self.frame_rate = DEFAULT_FRAME_RATE
+        self.last_pull_time = None
+        self.flip_time = None # LSL time of the last screen update
+        self.predicted_flip_time = None # LSL time of the next screen update, i.e. when the samples of the current frame become visible
+
+    def configureStream(self, lsl_stream_name, **options):
+        # set stream options (see LSLStream); the options are applied when the stream is connected
+        self.stream_options.setdefault(lsl_stream_name, {}).update(options)
+        if lsl_stream_name in self.streams:
+            stream = self.streams[lsl_stream_name]
+            stream.configure(**self.stream_options[lsl_stream_name])
+            for chain_key, chain_plan in list(self.chain_plans.items()):
+                if chain_key[0] == lsl_stream_name and chain_plan.dtype != stream.dtype:
+                    # the chains of the stream process the samples in the stream's data type
+                    if isinstance(chain_plan, OffloadedProcessorChain):
+                        chain_plan.stop()
+                    self.chain_plans[chain_key] = self._compileChain(lsl_stream_name, self.chain_processors[chain_key], 'offload' in chain_key[1])
+
+    def connect(self, lsl_stream_name):
+        if lsl_stream_name not in self.streams:
+            signal_graph = next((signal_graph for signal_graph in self.signal_graphs if signal_graph.hasNode(lsl_stream_name)), None)
+            if signal_graph:
+                stream = signal_graph.connectNode(lsl_stream_name)
+                if lsl_stream_name in self.stream_options:
+                    stream.configure(**self.stream_options[lsl_stream_name])
+            else:
+                stream = LSLStream(lsl_stream_name, **self.stream_options.get(lsl_stream_name, {}))
+                if self.ingestion_thread:
+                    stream.enableIngestionThread()
+            self.streams[lsl_stream_name] = stream
+        return self.streams[lsl_stream_name]
+
+    def addSignalGraph(self, signal_graph):
+        # the nodes of the signal graph can be connected like LSL streams
+        self.signal_graphs.append(signal_graph)
+
+    def setFlipTime(self, flip_time):
+        # called by YAGA right after each screen update
+        self.flip_time = flip_time
+
+    def streamStatistics(self, lsl_stream_name):
+        # returns the backlog statistics of a stream and the measured frame rate
+        statistics = self.streams[lsl_stream_name].statistics()
+        statistics['frame_rate'] = self.frame_rate
+        return statistics
+
+    def startIngestionThread(self):
+        # decouples LSL I/O from the render loop: the thread pulls the inlets, pull() only reads the ring buffers
+        if self.ingestion_thread:
+            return
+        for stream in self.streams.values():
+            stream.enableIngestionThread()
+        self.ingestion_running = True
+        self.ingestion_thread = threading.Thread(target=self._ingest, name='lsl_ingestion', daemon=True)
+        self.ingestion_thread.start()
+
+    def stopIngestionThread(self):
+        if self.ingestion_thread:
+            self.ingestion_running = False
+            self.ingestion_thread.join()
+
+    def startChainWorkers(self):
+        # starts the worker processes of offloaded processor chains (called before the first frame)
+        for chain_plan in self.chain_plans.values():
+            if isinstance(chain_plan, OffloadedProcessorChain):
+                chain_plan.start()
+
+    def stopChainWorkers(self):
+        # stops the worker processes of offloaded processor chains
+        for chain_plan in self.chain_plans.values():
+            if isinstance(chain_plan, OffloadedProcessorChain):
+                chain_plan.stop()
+
+    def reset(self):
+        # disconnects all streams and removes all processor chains and signal graphs (e.g. between tests or before a paradigm is loaded again)
+        self.stopIngestionThread()
+        self.stopChainWorkers()
+        for stream in self.streams.values():
+            if isinstance(stream, LSLStream):
+                stream.inlet.close_stream()
+        self.__init__()
+
+    def _ingest(self):
+        while self.ingestion_running:
+            n_samples = 0
+            for stream in list(self.streams.values()):
+                if stream.ingestion_thread:
+                    n_samples += stream.ingest()
+            if n_samples == 0:
+                time.sleep(INGESTION_IDLE_INTERVAL)
+
+    def pull(self):
+        # this function is called once per frame before the interface objects read their LSL streams
+
+        # measure the frame rate (exponential moving average); it determines the expected number of samples per frame
+        pull_time = time.perf_counter()
+        if self.last_pull_time is not None:
+            frame_interval = min(max(pull_time - self.last_pull_time, 0.001), 1.0)
+            self.frame_rate = FRAME_RATE_SMOOTHING * self.frame_rate + (1 - FRAME_RATE_SMOOTHING) / frame_interval
+        self.last_pull_time = pull_time
+
+        # predict the next screen update (screen updates occur in multiples of the frame interval after the last screen update)
+        local_time = pylsl.local_clock()
+        frame_interval = 1.0 / self.frame_rate
+        if self.flip_time is None:
+            self.predicted_flip_time = local_time + frame_interval
+        else:
+            self.predicted_flip_time = self.flip_time + max(1, np.ceil((local_time - self.flip_time) / frame_interval)) * frame_interval
+
+        self.chain_outputs.clear()
+        for stream in self.streams.values():
+            stream.pull(self.frame_rate)
+        for signal_graph in self.signal_graphs:
+            signal_graph.evaluate()
+        for stream in self.streams.values():
+            if stream.time_sync and stream.time_stamps is not None:
+                stream.latency = self.predicted_flip_time - stream.time_stamps[-1]
+
+    def attachChain(self, lsl_stream_name, processors, chain_signature, offload=False):
+        # compiles the processor chain of an interface object when the chain is attached (i.e. not during a frame), or returns the compiled chain if
+        # another interface object uses the same chain; the compiled chain determines the number of output channels and the output sampling rate
+        chain_key = (lsl_stream_name, chain_signature)
+        if chain_key not in self.chain_plans:
+            self.chain_plans[chain_key] = self._compileChain(lsl_stream_name, processors, offload)
+            self.chain_processors[chain_key] = list(processors)
+            self.chain_subscribers[chain_key] = 0
+        self.chain_subscribers[chain_key] += 1
+        return self.chain_plans[chain_key]
+
+    def detachChain(self, lsl_stream_name, chain_signature):
+        # removes the compiled chain when no interface object uses it anymore (e.g. when a processor is added to the chain of an interface object)
+        chain_key = (lsl_stream_name, chain_signature)
+        self.chain_subscribers[chain_key] -= 1
+        if self.chain_subscribers[chain_key] == 0:
+            chain_plan = self.chain_plans.pop(chain_key)
+            if isinstance(chain_plan, OffloadedProcessorChain):
+                chain_plan.stop()
+            del self.chain_processors[chain_key]
+            del self.chain_subscribers[chain_key]
+            self.chain_outputs.pop(chain_key, None)
+
+    def _compileChain(self, lsl_stream_name, processors, offload):
+        # the processors operate with the sampling rate of the LSL source (or the sampling rate after a processor like Decimate)
+        stream = self.streams[lsl_stream_name]
+        if offload:
+            return OffloadedProcessorChain(processors, stream.n_channels, stream.max_pull_samples, stream.fs, stream.dtype, lsl_stream_name)
+        return ProcessorChainPlan(processors, stream.n_channels, stream.max_pull_samples, stream.fs, stream.dtype)
+
+    def processedSamples(self, lsl_stream_name, chain_signature):
+        # returns the samples of the current frame processed with the given processor chain (read-only) or None if no samples were received
+        # offloaded chains run in a worker process (see OffloadedProcessorChain); they return the samples which the worker processed since the last frame
+        stream = self.streams[lsl_stream_name]
+        if chain_signature is None:
+            return stream.samples
+        chain_key = (lsl_stream_name, chain_signature)
+        chain_plan = self.chain_plans[chain_key]
+        if stream.samples is None and not isinstance(chain_plan, OffloadedProcessorChain):
+            return None
+
+        if chain_key not in self.chain_outputs:
+            lsl_samples = chain_plan.run(stream.samples, stream.time_stamps)
+            if lsl_samples is not None:
+                lsl_samples.flags.writeable = False
+            self.chain_outputs[chain_key] = lsl_samples
+        return self.chain_outputs[chain_key]
+
+    def processedRate(self, lsl_stream_name, chain_signature):
+        # sampling rate of the processed samples
+        chain_plan = self.chain_plans.get((lsl_stream_name, chain_signature))
+        return chain_plan.fs if chain_plan else self.streams[lsl_stream_name].fs
+
+    def processedChannels(self, lsl_stream_name, chain_signature):
+        # number of channels of the processed samples (e.g. SpatialFilter or BandPower change the number of channels)
+        chain_plan = self.chain_plans.get((lsl_stream_name, chain_signature))
+        return chain_plan.n_channels_out if chain_plan else self.streams[lsl_stream_name].n_channels
+
+    def processedTimeStamps(self, lsl_stream_name, chain_signature):
+        # returns the time stamps of the processed samples of the current frame (processors like Decimate keep the time stamps of the retained samples)
+        chain_plan = self.chain_plans.get((lsl_stream_name, chain_signature))
+        return chain_plan.time_stamps if chain_plan else self.streams[lsl_stream_name].time_stamps
+
+
+lsl_stream_hub = LSLStreamHub()
+
+
 class InterfaceObject:
     NO_SIGNAL = None
+    flight_recorder = None # set by YAGA when frame events are traced
 
     def __init__(self):
         self.active = False
-        self.lsl_inlets = {}
+        self.lsl_streams = {}
         self.lsl_fs = {}
         self.lsl_signal_processors = {}
+        self.lsl_chain_signatures = {}
+        self.lsl_offloaded_chains = {}
         self.lsl_streams_samples = {}
         self.lsl_aggregation_modes = {}
+        self.lsl_flip_histories = {}
+        self.lsl_aggregation_windows = {}
+        self.lsl_window_aggregators = {}
         self.lsl_relay_outlet = None
+        self.lsl_relay_mode = None
 
     def activate(self):
         self.active = True
@@ -32,72 +803,116 @@ class InterfaceObject:
 
     def connectToLSLStreams(self, lsl_stream_names, aggregation_mode='last'):
         for lsl_stream_name in lsl_stream_names:
-            if lsl_stream_name not in self.lsl_inlets:
-                print('connecting to LSL stream %s...' % lsl_stream_name)
-                lsl_info = pylsl.resolve_byprop('name', lsl_stream_name, timeout=15)
-                if not lsl_info:
-                    raise Exception('timeout: LSL stream "%s" not found' % lsl_stream_name)
-                if len(lsl_info) > 1:
-                    raise Exception('found more than one LSL stream with name "%s"' % lsl_stream_name)
-                lsl_inlet = pylsl.StreamInlet(lsl_info[0], max_buflen=1, recover=True) # note: max_buflen is in seconds if there is a nominal sampling rate
-                lsl_fs = lsl_inlet.info().nominal_srate()
-                self.lsl_inlets[lsl_stream_name] = lsl_inlet
-                self.lsl_fs[lsl_stream_name] = lsl_fs
-                self.lsl_signal_processors[lsl_stream_name] = []
-                if aggregation_mode == 'last' or aggregation_mode == 'sum' or aggregation_mode == 'mean':
+            if lsl_stream_name not in self.lsl_streams:
+                if aggregation_mode == 'last' or aggregation_mode == 'sum' or aggregation_mode == 'mean' or aggregation_mode == 'flip':
+                    self.lsl_aggregation_modes[lsl_stream_name] = aggregation_mode
+                elif aggregation_mode.startswith('window_') and aggregation_mode[len('window_'):] in WindowAggregator.MODES:
                     self.lsl_aggregation_modes[lsl_stream_name] = aggregation_mode
+                    self.lsl_aggregation_windows[lsl_stream_name] = DEFAULT_AGGREGATION_WINDOW
                 else:
-                    raise Exception('unkown buffer aggregation mode: "%s"', aggregation_mode)
-                self.lsl_streams_samples[lsl_stream_name] = np.zeros((lsl_inlet.info().channel_count(), 1)) # initialize buffer with float64 zeros of shape [channels x 1]
-                print('connected')
+                    raise Exception('unkown buffer aggregation mode: "%s"' % aggregation_mode)
+                if aggregation_mode == 'flip':
+                    lsl_stream_hub.configureStream(lsl_stream_name, time_sync=True) # the time stamps must be synchronized with the local clock
+                    self.lsl_flip_histories[lsl_stream_name] = None
+                lsl_stream = lsl_stream_hub.connect(lsl_stream_name)
+                self.lsl_streams[lsl_stream_name] = lsl_stream
+                self.lsl_fs[lsl_stream_name] = lsl_stream.fs
+                if aggregation_mode.startswith('window_') and lsl_stream.fs <= 0:
+                    raise Exception('window aggregation modes require an LSL stream with a regular sampling rate (stream "%s")' % lsl_stream_name)
+                self.lsl_signal_processors[lsl_stream_name] = []
+                self.lsl_chain_signatures[lsl_stream_name] = None
+                self.lsl_offloaded_chains[lsl_stream_name] = False
+                self.lsl_streams_samples[lsl_stream_name] = np.zeros((lsl_stream.n_channels, 1)) # initialize buffer with float64 zeros of shape [channels x 1]
+                if lsl_stream_name in self.lsl_aggregation_windows:
+                    self._createWindowAggregator(lsl_stream_name)
             else:
                 print('stream "%s" is already connected; ignoring connection request' % lsl_stream_name)
 
     def readLSLStream(self):
-        # 1. this function is called with a frequency equal to FPS
-        # 2. when new LSL samples are available, the samples are processed with their original sampling rate using a buffer
+        # 1. this function is called with a frequency equal to FPS, after the LSL stream hub pulled new samples from all LSL streams
+        # 2. when new LSL samples are available, the samples are processed with their original sampling rate (processor chains are shared between interface objects)
         # 3a. if LSL sampling rate > FPS: samples are aggregated (i.e., take only last sample (default), sum of samples, or mean of samples)
         # 3b. if LSL sampling rate < FPS: signal is sampled with sample & hold
+        # 3c. window aggregation modes: samples are aggregated over a time window (i.e., mean, rms, max, min or count of non-zero samples of the last T seconds)
+        # 3d. aggregation mode "flip": the signal is interpolated/extrapolated to the predicted screen update based on the LSL time stamps (independent of the sampling rate)
         # 4. the abstract method _newLSLSampleReceived() is called; it is up to subclasses to implement updates when new LSL samples are received
 
-        if self.lsl_inlets:
-            for lsl_stream_name in self.lsl_inlets.keys():
+        if self.lsl_streams:
+            for lsl_stream_name in self.lsl_streams.keys():
 
-                # read chunk of samples from LSL inlet (non-blocking)
-                samples_list, _ = self.lsl_inlets[lsl_stream_name].pull_chunk(timeout=0.0, max_samples=MAX_LSL_BUFFER_SAMPLES)
-                assert type(samples_list) is list
+                # get processed samples (read-only) of the current frame
+                lsl_samples = lsl_stream_hub.processedSamples(lsl_stream_name, self.lsl_chain_signatures[lsl_stream_name])
 
-                # check if new samples were received, if so, run signal processing methods
-                if len(samples_list) > 0:
-                    if len(samples_list) == MAX_LSL_BUFFER_SAMPLES:
-                        # raise Exception('LSL buffer size is probably too small, extend it to prevent data loss from LSL signals')
-                        print('LSL buffer size is probably too small, extend it to prevent data loss from LSL signals (it is OK if this message shows up right after startup)')
-
-                    # convert list of lists into a numpy array
-                    lsl_samples = np.array(samples_list).transpose() # [channels x samples]
-                    # apply signal processing methods; they operate with sampling rate of the LSL source
-                    for processor in self.lsl_signal_processors[lsl_stream_name]:
-                        if processor.channels:
-                            lsl_samples[processor.channels, :] = processor.object.update(lsl_samples[processor.channels, :], self.lsl_fs[lsl_stream_name])
-                        else:
-                            lsl_samples[:, :] = processor.object.update(lsl_samples, self.lsl_fs[lsl_stream_name])
+                if self.lsl_relay_mode == 'chunk' and lsl_stream_name == self.lsl_relay_in_signals[0]:
+                    self.lsl_relay_samples = lsl_samples
 
+                # check if new samples were received
+                if lsl_samples is not None:
                     # downsample signal to FPS with the specified aggregation method
                     if self.lsl_aggregation_modes[lsl_stream_name] == 'last':
-                        self.lsl_streams_samples[lsl_stream_name] = lsl_samples[:, -1] # keep only the most recent sample
+                        self.lsl_streams_samples[lsl_stream_name] = lsl_samples[:, -1].copy() # keep only the most recent sample (copy it, as the samples are a view of the stream's pull buffer)
                     elif self.lsl_aggregation_modes[lsl_stream_name] == 'sum':
                         self.lsl_streams_samples[lsl_stream_name] = np.sum(lsl_samples, axis=1) # calculate buffer sum
                     elif self.lsl_aggregation_modes[lsl_stream_name] == 'mean':
                         self.lsl_streams_samples[lsl_stream_name] = np.mean(lsl_samples, axis=1) # calculate buffer average
+                    elif self.lsl_aggregation_modes[lsl_stream_name] == 'flip':
+                        self._updateFlipHistory(lsl_stream_name, lsl_samples)
+                    elif self.lsl_aggregation_modes[lsl_stream_name].startswith('window_'):
+                        self.lsl_window_aggregators[lsl_stream_name].write(lsl_samples)
+                        self.lsl_streams_samples[lsl_stream_name] = self.lsl_window_aggregators[lsl_stream_name].value()
                     else:
-                        raise Exception('unkown buffer aggregation mode: "%s"', self.lsl_agregation_modes[lsl_stream_name])
+                        raise Exception('unkown buffer aggregation mode: "%s"' % self.lsl_aggregation_modes[lsl_stream_name])
+
+                # interpolate/extrapolate the signal to the predicted screen update (also in frames without new samples)
+                if self.lsl_aggregation_modes[lsl_stream_name] == 'flip' and self.lsl_flip_histories[lsl_stream_name]:
+                    self.lsl_streams_samples[lsl_stream_name] = self._valueAtFlip(lsl_stream_name)
 
             self._relay()
             self._newLSLSampleReceived() # when no new sample has been received, this method uses the last received sample (i.e., sample & hold)
 
+    def _updateFlipHistory(self, lsl_stream_name, lsl_samples):
+        # keep the two most recent samples [channels x 2] and their time stamps
+        time_stamps = lsl_stream_hub.processedTimeStamps(lsl_stream_name, self.lsl_chain_signatures[lsl_stream_name])
+        history = self.lsl_flip_histories[lsl_stream_name]
+        if lsl_samples.shape[1] >= 2:
+            self.lsl_flip_histories[lsl_stream_name] = (lsl_samples[:, -2:].copy(), time_stamps[-2:].copy())
+        elif history:
+            self.lsl_flip_histories[lsl_stream_name] = (np.stack((history[0][:, -1], lsl_samples[:, -1]), axis=1), np.array((history[1][-1], time_stamps[-1])))
+        else:
+            self.lsl_streams_samples[lsl_stream_name] = lsl_samples[:, -1].copy() # a single sample cannot be extrapolated
+            self.lsl_flip_histories[lsl_stream_name] = (np.repeat(lsl_samples[:, -1:], 2, axis=1), np.array((time_stamps[-1], time_stamps[-1])))
+
+    def _valueAtFlip(self, lsl_stream_name):
+        # linear interpolation/extrapolation of the two most recent samples to the predicted screen update
+        samples, time_stamps = self.lsl_flip_histories[lsl_stream_name]
+        sample_interval = time_stamps[1] - time_stamps[0]
+        if sample_interval <= 0:
+            return samples[:, 1].copy()
+        dt = min(lsl_stream_hub.predicted_flip_time - time_stamps[1], MAX_FLIP_EXTRAPOLATION)
+        return samples[:, 1] + (samples[:, 1] - samples[:, 0]) * (dt / sample_interval)
+
+    # set the window length [s] of a window aggregation mode (e.g. "window_mean")
+    def setLSLAggregationWindow(self, window_length, lsl_stream_name=None):
+        if lsl_stream_name is None:
+            assert len(self.lsl_aggregation_windows) == 1, 'interface object must be controlled by exactly one LSL stream with a window aggregation mode, otherwise "lsl_stream_name" must be specified'
+            lsl_stream_name = list(self.lsl_aggregation_windows)[0]
+        assert lsl_stream_name in self.lsl_aggregation_windows, 'LSL stream "%s" is not connected with a window aggregation mode' % lsl_stream_name
+        assert window_length > 0, '"window_length" must be positive'
+        assert self.lsl_fs[lsl_stream_name] > 0, 'window aggregation modes require an LSL stream with a regular sampling rate'
+        self.lsl_aggregation_windows[lsl_stream_name] = window_length
+        self._createWindowAggregator(lsl_stream_name)
+
+    def _createWindowAggregator(self, lsl_stream_name):
+        # the window has the sampling rate and the number of channels of the processed samples
+        processed_fs = lsl_stream_hub.processedRate(lsl_stream_name, self.lsl_chain_signatures[lsl_stream_name])
+        n_channels = lsl_stream_hub.processedChannels(lsl_stream_name, self.lsl_chain_signatures[lsl_stream_name])
+        window_length = max(1, int(round(self.lsl_aggregation_windows[lsl_stream_name] * processed_fs)))
+        self.lsl_window_aggregators[lsl_stream_name] = WindowAggregator(n_channels, window_length, self.lsl_aggregation_modes[lsl_stream_name][len('window_'):])
+
     # signal processing methods must generate output samples with (1) the same number of channels as the input samples, or (2) outputs with exactly one channel
     # in the latter case, output sample channels are broadcasted
-    def addSignalProcessingToLSLStream(self, processor_object, channels=None, lsl_stream_name=None):
+    # with offload=True, the processor chain of the stream runs in a worker process (see OffloadedProcessorChain)
+    def addSignalProcessingToLSLStream(self, processor_object, channels=None, lsl_stream_name=None, offload=False):
         if isinstance(lsl_stream_name, str):
             assert lsl_stream_name in self.lsl_signal_processors, 'unknown stream name'
         elif lsl_stream_name == None:
@@ -109,30 +924,84 @@ class InterfaceObject:
         else:
             raise Exception('"lsl_stream_name" must be None or a string (None selects the first added stream)')
         self.lsl_signal_processors[lsl_stream_name].append(SignalProcessor(object=processor_object, channels=channels))
+        if offload:
+            self.lsl_offloaded_chains[lsl_stream_name] = True
+
+        # compile the extended chain (before the processors change their state); the held sample and the window aggregator get the number of output
+        # channels of the chain, e.g. when a SpatialFilter or BandPower changes the number of channels
+        if self.lsl_chain_signatures[lsl_stream_name] is not None:
+            lsl_stream_hub.detachChain(lsl_stream_name, self.lsl_chain_signatures[lsl_stream_name])
+        self.lsl_chain_signatures[lsl_stream_name] = processorChainSignature(self.lsl_signal_processors[lsl_stream_name], self.lsl_offloaded_chains[lsl_stream_name])
+        chain_plan = lsl_stream_hub.attachChain(lsl_stream_name, self.lsl_signal_processors[lsl_stream_name], self.lsl_chain_signatures[lsl_stream_name], self.lsl_offloaded_chains[lsl_stream_name])
+        self.lsl_streams_samples[lsl_stream_name] = np.zeros((chain_plan.n_channels_out, 1))
+        if lsl_stream_name in self.lsl_aggregation_windows:
+            self._createWindowAggregator(lsl_stream_name)
 
     # configure LSL signal relay after processing
-    def relayLSLSignals(self, lsl_in_signals, channels, lsl_out_signal, fps=60):
+    # mode 'frame': relays the aggregated sample of every frame (one sample per frame, nominal sampling rate fps)
+    # mode 'chunk': relays all processed samples with their LSL time stamps (nominal sampling rate of the processed samples); relays a single LSL stream
+    # (several LSL streams can be combined with a signal graph, see signal_graph.py)
+    def relayLSLSignals(self, lsl_in_signals, channels, lsl_out_signal, fps=60, mode='frame'):
         assert len(lsl_in_signals) == len(channels), "relayLSLSignals: for every LSL input signal, a list of channels to be relayed must be specified ('lsl_in_signals' must be a list; 'channel' must be a list of lists)"
+        if mode not in ('frame', 'chunk'):
+            raise Exception('unknown relay mode: "%s"' % mode)
+        if mode == 'chunk':
+            assert len(lsl_in_signals) == 1, 'relayLSLSignals: the relay mode "chunk" supports a single LSL input signal'
         n_total_channels = sum([len(element) for element in channels])
 
-        lsl_info = pylsl.StreamInfo(lsl_out_signal, 'relay', n_total_channels, fps, 'float32', lsl_out_signal + "_relay")
-        self.lsl_relay_outlet = pylsl.StreamOutlet(lsl_info)
+        self.lsl_relay_mode = mode
         self.lsl_relay_in_signals = lsl_in_signals
         self.lsl_relay_channels = channels
-        self.lsl_relay_buffer = np.zeros((n_total_channels))
+        self.lsl_relay_out_signal = lsl_out_signal
+
+        # precomputed channel selections (a slice for consecutive channels) and their positions in the relayed samples
+        self.lsl_relay_selections = []
+        start_ch_idx = 0
+        for signal_channels in channels:
+            channel_idcs = np.array(signal_channels, dtype=np.intp)
+            if len(channel_idcs) > 0 and channel_idcs[0] >= 0 and np.all(np.diff(channel_idcs) == 1):
+                channel_selection = slice(int(channel_idcs[0]), int(channel_idcs[-1]) + 1)
+            else:
+                channel_selection = channel_idcs
+            self.lsl_relay_selections.append((channel_selection, slice(start_ch_idx, start_ch_idx + len(channel_idcs))))
+            start_ch_idx += len(channel_idcs)
+
+        if mode == 'frame':
+            lsl_info = pylsl.StreamInfo(lsl_out_signal, 'relay', n_total_channels, fps, 'float32', lsl_out_signal + "_relay")
+            self.lsl_relay_outlet = pylsl.StreamOutlet(lsl_info)
+            self.lsl_relay_buffer = np.zeros((n_total_channels,), dtype=np.float32)
+        else:
+            # the outlet is created when the first samples are relayed, i.e. when the sampling rate of the processed samples is known
+            self.lsl_relay_outlet = None
+            self.lsl_relay_buffer = np.zeros((0, n_total_channels), dtype=np.float32) # [samples x channels]
+            self.lsl_relay_samples = None
 
     # relay LSL signals
     def _relay(self):
-        if self.lsl_relay_outlet:
+        if self.lsl_relay_mode == 'frame':
             # copy LSL samples from current time frame into buffer
-            start_ch_idx = 0
-            for signal_idx in range(len(self.lsl_relay_in_signals)):
-                end_ch_idx = start_ch_idx + len(self.lsl_relay_channels[signal_idx])
-                self.lsl_relay_buffer[start_ch_idx:end_ch_idx] = self.lsl_streams_samples[self.lsl_relay_in_signals[signal_idx]][self.lsl_relay_channels[signal_idx]].reshape((-1,))
-                start_ch_idx = end_ch_idx
+            for lsl_stream_name, (channel_selection, relay_channels) in zip(self.lsl_relay_in_signals, self.lsl_relay_selections):
+                self.lsl_relay_buffer[relay_channels] = self.lsl_streams_samples[lsl_stream_name][channel_selection].reshape((-1,))
 
             self.lsl_relay_outlet.push_sample(self.lsl_relay_buffer, pushthrough=True)
 
+        elif self.lsl_relay_mode == 'chunk' and self.lsl_relay_samples is not None:
+            lsl_stream_name = self.lsl_relay_in_signals[0]
+            if self.lsl_relay_outlet is None:
+                fs = lsl_stream_hub.processedRate(lsl_stream_name, self.lsl_chain_signatures[lsl_stream_name])
+                lsl_info = pylsl.StreamInfo(self.lsl_relay_out_signal, 'relay', self.lsl_relay_buffer.shape[1], fs, 'float32', self.lsl_relay_out_signal + "_relay")
+                self.lsl_relay_outlet = pylsl.StreamOutlet(lsl_info)
+
+            # copy the selected channels of all processed samples into the buffer [samples x channels] and push them with their time stamps
+            n_samples = self.lsl_relay_samples.shape[1]
+            if n_samples > self.lsl_relay_buffer.shape[0]:
+                self.lsl_relay_buffer = np.zeros((n_samples, self.lsl_relay_buffer.shape[1]), dtype=np.float32)
+            relay_samples = self.lsl_relay_buffer[:n_samples]
+            np.copyto(relay_samples.T, self.lsl_relay_samples[self.lsl_relay_selections[0][0]])
+            time_stamps = lsl_stream_hub.processedTimeStamps(lsl_stream_name, self.lsl_chain_signatures[lsl_stream_name])
+            self.lsl_relay_outlet.push_chunk(relay_samples, time_stamps, pushthrough=True)
+            self.lsl_relay_samples = None
+
     # subclasses can re-implement this method to execute specific updates based on the most recent LSL sample (i.e. self.lsl_sample)
     # by default, this method does nothing
     def _newLSLSampleReceived(self):
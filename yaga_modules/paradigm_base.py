@@ -5,15 +5,18 @@ import time
 import socket
 import pylsl
 
+from yaga_modules.interface_objects import lsl_stream_hub
+
 
 ScriptItem = namedtuple('ScriptItem', ('name', 'time', 'time_type', 'rel_name', 'wait_for_signal', 'wait_for_lsl_marker', 'actions'), defaults=(None, None, 'abs', None, None, None, None))
 
 
 class ParadigmBase:
 
-    def __init__(self, paradigm_variables, lsl_recorder_remote_control=False, lsl_recorder_host='localhost', lsl_recorder_port=22345, nidaqmx_event='trial_start', nidaqmx_trigger_line=None, nidaqmx_high_duration=0):
+    def __init__(self, paradigm_variables, lsl_recorder_remote_control=False, lsl_recorder_host='localhost', lsl_recorder_port=22345, nidaqmx_event='trial_start', nidaqmx_trigger_line=None, nidaqmx_high_duration=0, script_lookahead=1, frame_timing=False, frame_timing_fps=60, lsl_ingestion_thread=False):
        self.interface_objects = []
-       self.script = None
+       self.script = None # list, iterator or generator of ScriptItems
+       self.script_lookahead = script_lookahead # number of ScriptItems pulled ahead from an iterator/generator script
        self.signals = {}
        self.lsl_markers = {}
        self.lsl_marker_inlet = None
@@ -25,6 +28,9 @@ class ParadigmBase:
        self.nidaqmx_trigger_line = nidaqmx_trigger_line
        self.nidaqmx_high_duration = nidaqmx_high_duration
        self.paradigm_variables = paradigm_variables
+       self.frame_timing = frame_timing # publish frame timing measurements as LSL stream "yaga_frame_timing"
+       self.frame_timing_fps = frame_timing_fps # expected screen refresh rate; used to detect missed frame deadlines
+       self.lsl_ingestion_thread = lsl_ingestion_thread # pull LSL streams in a background thread instead of the render loop
 
     def registerObject(self, object):
         self.interface_objects.append(object)
@@ -40,6 +46,13 @@ class ParadigmBase:
     def checkForSignal(self, signal):
         return self.signals.get(signal, False)
 
+    def configureLSLStream(self, lsl_stream_name, **options):
+        # options (see LSLStream): backlog_policy ('drain', 'newest' or 'catchup'), newest_duration [s], catchup_frames, time_sync, dtype ('float64' or 'float32')
+        lsl_stream_hub.configureStream(lsl_stream_name, **options)
+
+    def lslStreamStatistics(self, lsl_stream_name):
+        return lsl_stream_hub.streamStatistics(lsl_stream_name)
+
     def listenForLSLMarkers(self, lsl_stream_name, lsl_marker_channel=0):
         print('connecting to LSL stream %s...' % lsl_stream_name)
         lsl_info = pylsl.resolve_byprop('name', lsl_stream_name, timeout=15)
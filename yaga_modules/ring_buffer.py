@@ -0,0 +1,184 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+# ring buffer for samples [channels x capacity] and their time stamps with one writer and one reader (e.g. an LSL ingestion thread and the render loop)
+# no locks are needed: the writer copies the samples first and then advances the write counter, the reader only advances the read counter
+# when the reader falls behind by more than the capacity, the oldest unread samples are overwritten and counted as lost samples
+class SampleRingBuffer:
+
+    def __init__(self, n_channels, capacity, dtype=np.float64):
+        self.capacity = capacity
+        self.samples = np.zeros((n_channels, capacity), dtype=dtype)
+        self.time_stamps = np.zeros((capacity,))
+        self.write_count = 0 # total number of written samples; only changed by the writer
+        self.read_count = 0 # total number of read samples; only changed by the reader
+        self.n_lost_samples = 0
+
+    def write(self, samples, time_stamps):
+        # samples: [channels x samples]
+        n_samples = samples.shape[1]
+        skipped_samples = max(0, n_samples - self.capacity) # only the newest samples fit into the buffer
+        if skipped_samples > 0:
+            samples = samples[:, skipped_samples:]
+            time_stamps = time_stamps[skipped_samples:]
+            n_samples = self.capacity
+
+        start_idx = (self.write_count + skipped_samples) % self.capacity
+        end_idx = start_idx + n_samples
+        if end_idx <= self.capacity:
+            self.samples[:, start_idx:end_idx] = samples
+            self.time_stamps[start_idx:end_idx] = time_stamps
+        else:
+            n_first = self.capacity - start_idx
+            self.samples[:, start_idx:] = samples[:, :n_first]
+            self.samples[:, :n_samples - n_first] = samples[:, n_first:]
+            self.time_stamps[start_idx:] = time_stamps[:n_first]
+            self.time_stamps[:n_samples - n_first] = time_stamps[n_first:]
+
+        # publish the samples to the reader
+        self.write_count += skipped_samples + n_samples
+
+    def available(self):
+        return self.write_count - self.read_count
+
+    def read(self, max_samples=None):
+        # returns copies of all unread samples [channels x samples] and their time stamps (or the oldest max_samples unread samples), or (None, None)
+        write_count = self.write_count
+        read_count = max(self.read_count, write_count - self.capacity)
+        n_lost = read_count - self.read_count
+        if max_samples is not None:
+            write_count = min(write_count, read_count + max_samples)
+        n_samples = write_count - read_count
+        if n_samples <= 0:
+            self.read_count = read_count
+            self.n_lost_samples += n_lost
+            return None, None
+
+        idcs = np.arange(read_count, write_count) % self.capacity
+        samples = self.samples[:, idcs]
+        time_stamps = self.time_stamps[idcs]
+
+        # samples which were overwritten by the writer while copying are dropped
+        overwritten = max(0, self.write_count - self.capacity - read_count)
+        if overwritten > 0:
+            samples = samples[:, overwritten:]
+            time_stamps = time_stamps[overwritten:]
+            n_lost += overwritten
+
+        self.n_lost_samples += n_lost
+        self.read_count = write_count
+        if samples.shape[1] == 0:
+            return None, None
+        return samples, time_stamps
+
+
+# SampleRingBuffer in a shared memory block, e.g. between the render loop and a worker process (one writer process and one reader process)
+# the block contains the write and read counters, the time stamps and the samples; the process which creates the buffer (name=None) unlinks the block in close,
+# other processes attach to the block with its name
+class SharedSampleRingBuffer(SampleRingBuffer):
+
+    def __init__(self, n_channels, capacity, dtype=np.float64, name=None):
+        dtype = np.dtype(dtype)
+        self.owner = name is None
+        n_bytes = 2*8 + capacity*8 + n_channels*capacity*dtype.itemsize # counters, time stamps, samples
+        self.shared_memory = shared_memory.SharedMemory(name=name, create=self.owner, size=n_bytes if self.owner else 0)
+        self.name = self.shared_memory.name
+        self.n_channels = n_channels
+        self.dtype = dtype
+        self.capacity = capacity
+        self.counters = np.ndarray((2,), dtype=np.int64, buffer=self.shared_memory.buf) # write count, read count
+        self.time_stamps = np.ndarray((capacity,), dtype=np.float64, buffer=self.shared_memory.buf, offset=2*8)
+        self.samples = np.ndarray((n_channels, capacity), dtype=dtype, buffer=self.shared_memory.buf, offset=2*8 + capacity*8)
+        if self.owner:
+            self.counters[:] = 0
+        self.n_lost_samples = 0
+
+    @property
+    def write_count(self):
+        return int(self.counters[0])
+
+    @write_count.setter
+    def write_count(self, write_count):
+        self.counters[0] = write_count
+
+    @property
+    def read_count(self):
+        return int(self.counters[1])
+
+    @read_count.setter
+    def read_count(self, read_count):
+        self.counters[1] = read_count
+
+    def attachArguments(self):
+        # arguments for attaching to the buffer in another process
+        return (self.n_channels, self.capacity, self.dtype.str, self.name)
+
+    def close(self):
+        # the views of the shared memory block must be released before the block can be closed
+        self.counters = None
+        self.time_stamps = None
+        self.samples = None
+        self.shared_memory.close()
+        if self.owner:
+            self.shared_memory.unlink()
+
+
+# aggregates the samples [channels x samples] of the last "window_length" samples (e.g. the window of an LSL stream's aggregation mode)
+# mean, rms and count (number of non-zero samples) are based on running sums: each write adds the new samples and subtracts the overwritten samples
+# (the running sums are recomputed from the buffer once per window to prevent the accumulation of rounding errors); max and min are computed over the buffer
+class WindowAggregator:
+    MODES = ('mean', 'rms', 'max', 'min', 'count')
+
+    def __init__(self, n_channels, window_length, mode):
+        if mode not in WindowAggregator.MODES:
+            raise Exception('unknown window aggregation mode: "%s"' % mode)
+        assert isinstance(window_length, int) and window_length > 0, '"window_length" must be a positive integer'
+        self.mode = mode
+        self.window_length = window_length
+        self.buffer = np.zeros((n_channels, window_length)) # contains x, x^2 or (x != 0) for the running sums, x for max and min
+        self.running_sum = np.zeros((n_channels,))
+        self.write_idx = 0
+        self.n_filled = 0
+        self.n_written_since_resync = 0
+
+    def write(self, samples):
+        n_samples = samples.shape[1]
+        if n_samples > self.window_length:
+            samples = samples[:, -self.window_length:]
+            n_samples = self.window_length
+
+        if self.mode == 'rms':
+            values = np.square(samples)
+        elif self.mode == 'count':
+            values = (samples != 0).astype(np.float64)
+        else:
+            values = samples
+
+        idcs = (self.write_idx + np.arange(n_samples)) % self.window_length
+        if self.mode in ('mean', 'rms', 'count'):
+            self.running_sum += values.sum(axis=1) - self.buffer[:, idcs].sum(axis=1)
+        self.buffer[:, idcs] = values
+        self.write_idx = (self.write_idx + n_samples) % self.window_length
+        self.n_filled = min(self.n_filled + n_samples, self.window_length)
+
+        self.n_written_since_resync += n_samples
+        if self.n_written_since_resync >= self.window_length:
+            self.running_sum = self.buffer.sum(axis=1)
+            self.n_written_since_resync = 0
+
+    def value(self):
+        # aggregated value of each channel over the filled part of the window
+        if self.n_filled == 0:
+            return np.zeros((self.buffer.shape[0],))
+        if self.mode == 'mean':
+            return self.running_sum / self.n_filled
+        elif self.mode == 'rms':
+            return np.sqrt(np.maximum(self.running_sum, 0) / self.n_filled)
+        elif self.mode == 'count':
+            return np.round(self.running_sum)
+        elif self.mode == 'max':
+            return self.buffer[:, :self.n_filled].max(axis=1)
+        else:
+            return self.buffer[:, :self.n_filled].min(axis=1)
@@ -0,0 +1,122 @@
+from collections import namedtuple, deque
+import math
+
+
+# ScriptItem with validated fields; it is created once when the paradigm is loaded so that no checks are necessary at run time
+CompiledScriptItem = namedtuple('CompiledScriptItem', ('name', 'time', 'time_type', 'rel_name', 'wait_for_signal', 'wait_for_lsl_marker', 'actions'))
+
+
+def compileScriptItem(script_item, item_idx):
+    if script_item.time is not None and not isinstance(script_item.time, (int, float)):
+        raise Exception('ScriptItem %d ("%s"): field "time" must be a number' % (item_idx, script_item.name))
+    if script_item.time is not None and script_item.time_type not in ('abs', 'rel'):
+        raise Exception('ScriptItem %d ("%s"): field "time_type" is not supported: "%s"' % (item_idx, script_item.name, script_item.time_type))
+    if script_item.name is not None and not isinstance(script_item.name, str):
+        raise Exception('ScriptItem %d: field "name" must be "None" or a string' % item_idx)
+
+    time = float(script_item.time) if script_item.time is not None else None
+    actions = tuple(script_item.actions) if script_item.actions else ()
+    return CompiledScriptItem(script_item.name, time, script_item.time_type, script_item.rel_name, script_item.wait_for_signal, script_item.wait_for_lsl_marker, actions)
+
+
+# runs the ScriptItems of a paradigm script in their sequential order
+# the script is compiled when the paradigm is loaded; at run time, the scheduler takes the next ScriptItem from the head of a queue
+# (instead of removing items from the head of a list) and triggers all ScriptItems which are due within the current frame (instead of at most one ScriptItem per frame)
+# the script can be a list or an iterator/generator of ScriptItems; an iterator is pulled lazily during the paradigm run, keeping at most "lookahead"
+# ScriptItems in the queue (e.g. a generator can select the next trial based on the performance in the previous trial)
+class ScriptScheduler:
+
+    def __init__(self, script, lookahead=1):
+        assert isinstance(lookahead, int) and lookahead > 0, '"lookahead" must be a positive integer'
+
+        self.items = deque()
+        self.triggered_names = set()
+        self.n_compiled_items = 0
+        self.lookahead = lookahead
+
+        if isinstance(script, list):
+            # compile the complete script
+            self.script_iterator = None
+            for script_item in script:
+                self.items.append(self._compile(script_item))
+        else:
+            # compile the script lazily while running the paradigm
+            try:
+                self.script_iterator = iter(script)
+            except TypeError:
+                raise Exception('the paradigm script must be a list, an iterator or a generator of ScriptItems')
+            self._fill()
+
+    def _compile(self, script_item):
+        item = compileScriptItem(script_item, self.n_compiled_items)
+
+        # a relative time trigger can only fire when the referenced ScriptItem is triggered before
+        if item.time is not None and item.time_type == 'rel' and item.rel_name not in self.triggered_names:
+            print('warning: ScriptItem %d ("%s") has a relative time trigger referencing "%s", which is not triggered before; the time trigger will not fire' % (self.n_compiled_items, item.name, item.rel_name))
+
+        if item.name:
+            self.triggered_names.add(item.name)
+        self.n_compiled_items += 1
+        return item
+
+    def _fill(self):
+        # pull ScriptItems from the script iterator until the lookahead queue is full
+        while self.script_iterator is not None and len(self.items) < self.lookahead:
+            try:
+                self.items.append(self._compile(next(self.script_iterator)))
+            except StopIteration:
+                self.script_iterator = None
+
+    def finished(self):
+        return not self.items and self.script_iterator is None
+
+    def runDueItems(self, time, start_time, execution_times, paradigm):
+        # time: time since paradigm start [s]
+        # execution_times: LSL time stamps of already triggered ScriptItems (note: they are logged after the screen update, therefore
+        #                  ScriptItems with a relative time trigger can fire at the earliest in the frame after the referenced ScriptItem)
+        # returns the names of all triggered ScriptItems
+        triggered_item_names = []
+        while self.items:
+            item = self.items[0]
+            run_actions = False
+
+            # the execution time of a ScriptItem triggered in this frame is only known after the screen update (execution_times still contains the time
+            # of its previous occurrence); ScriptItems with a relative time trigger referencing it wait for the next frame
+            if item.time is not None and item.time_type == 'rel' and item.rel_name in triggered_item_names:
+                break
+
+            # check if it is time to activate the ScriptItem
+            if item.time is not None:
+                if item.time_type == 'abs':
+                    if time >= item.time:
+                        run_actions = True
+                else:
+                    if time >= execution_times.get(item.rel_name, math.inf) - start_time + item.time:
+                        run_actions = True
+
+            # if ScriptItem is waiting for a signal, check for it
+            if item.wait_for_signal and paradigm.checkForSignal(item.wait_for_signal):
+                run_actions = True
+                paradigm.removeSignal(item.wait_for_signal)
+
+            # if ScriptItem is waiting for an LSL marker, check for it
+            if item.wait_for_lsl_marker and paradigm.checkForLSLMarker(item.wait_for_lsl_marker):
+                run_actions = True
+                paradigm.removeLSLMarker(item.wait_for_lsl_marker)
+
+            # ScriptItems are processed sequentially; stop at the first ScriptItem which is not due yet
+            if not run_actions:
+                break
+
+            # execute ScriptItem's actions
+            for action in item.actions:
+                action()
+
+            # save script item names for later when they are send via LSL
+            if item.name:
+                triggered_item_names.append(item.name)
+
+            self.items.popleft()
+            self._fill()
+
+        return triggered_item_names
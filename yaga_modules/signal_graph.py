@@ -0,0 +1,167 @@
+import graphlib
+
+import numpy as np
+
+from yaga_modules.interface_objects import lsl_stream_hub, ProcessorChainPlan, SignalProcessor
+
+
+# a signal graph combines LSL streams (e.g. an EMG envelope and a force signal) without relaying them through a second LSL stream
+# every node takes the samples of one or more inputs (LSL streams or other nodes), stacks their channels in the order of the inputs, processes them with
+# a processor chain and publishes the result under the name of the node; interface objects connect to a node like to an LSL stream:
+#
+#   graph = SignalGraph()
+#   graph.addNode('envelope', ['hdemg'], [SP.ButterFilter(4, [20, 500], 'bandpass'), SP.Abs(), SP.MovAvg(0.1), SP.Mean()])
+#   graph.addNode('error', ['envelope', 'force'], [SP.LinearMap(...)])
+#   bar.controlStateWithLSLStream('error', channels=[0])
+#
+# the first input is the reference input: the node has its sampling rate and time stamps (after processors like Decimate: the reduced sampling rate and the
+# time stamps of the retained samples), and the samples of the other inputs are linearly interpolated at the time stamps of the reference input (the
+# newest sample is held until the next samples arrive); the time stamps of LSL streams which are inputs of nodes with several inputs are synchronized
+# with the local clock (time_sync)
+# the graph is evaluated by the LSL stream hub once per frame in topological order, i.e. every node is processed once, independent of the number of
+# subscribed interface objects
+class SignalGraph:
+
+    def __init__(self):
+        self.nodes = {}
+        self.evaluation_order = []
+        lsl_stream_hub.addSignalGraph(self)
+
+    def addNode(self, name, inputs, processors=()):
+        # inputs: names of LSL streams or nodes
+        # processors: processor objects or (processor object, channels) tuples; channels refer to the stacked channels of all inputs
+        if name in self.nodes or name in lsl_stream_hub.streams:
+            raise Exception('a stream or signal graph node with the name "%s" already exists' % name)
+        assert len(inputs) > 0, 'signal graph node "%s" has no inputs' % name
+        signal_processors = [SignalProcessor(*processor) if isinstance(processor, tuple) else SignalProcessor(processor, None) for processor in processors]
+        self.nodes[name] = SignalGraphNode(name, list(inputs), signal_processors)
+
+    def hasNode(self, name):
+        return name in self.nodes
+
+    def connectNode(self, name):
+        # called by the LSL stream hub when a node is connected for the first time; connects the inputs of the node
+        try:
+            graphlib.TopologicalSorter({node.name: [input_name for input_name in node.input_names if input_name in self.nodes] for node in self.nodes.values()}).prepare()
+        except graphlib.CycleError as err:
+            raise Exception('signal graph contains a cycle: %s' % ' -> '.join(err.args[1]))
+        node = self.nodes[name]
+        if len(node.input_names) > 1:
+            for input_name in node.input_names:
+                lsl_stream_hub.configureStream(input_name, time_sync=True) # the time stamps of all inputs must refer to the same clock
+        node.connect([lsl_stream_hub.connect(input_name) for input_name in node.input_names])
+
+        # evaluation order of the connected nodes
+        sorter = graphlib.TopologicalSorter({node.name: [input_name for input_name in node.input_names if input_name in self.nodes] for node in self.nodes.values() if node.inputs})
+        self.evaluation_order = [self.nodes[node_name] for node_name in sorter.static_order() if self.nodes[node_name].inputs]
+        return node
+
+    def evaluate(self):
+        # called by the LSL stream hub once per frame after all LSL streams have been pulled
+        for node in self.evaluation_order:
+            node.evaluate()
+
+
+# output stream of a signal graph node; provides the attributes of an LSLStream which are used by the LSL stream hub and by interface objects
+class SignalGraphNode:
+
+    def __init__(self, name, input_names, processors):
+        self.name = name
+        self.input_names = input_names
+        self.processors = processors
+        self.inputs = None # set when the node is connected
+        self.time_sync = False
+        self.latency = None
+        self.ingestion_thread = False
+        self.samples = None
+        self.time_stamps = None
+        self.n_frames = 0
+        self.n_samples = 0
+
+    def connect(self, inputs):
+        reference_input = inputs[0]
+        if reference_input.fs <= 0:
+            raise Exception('the reference input "%s" of signal graph node "%s" must have a regular sampling rate' % (reference_input.name, self.name))
+        self.inputs = inputs
+        self.input_histories = [None] * len(inputs) # the most recent samples and time stamps of the other inputs
+        self.time_sync = all(input_stream.time_sync for input_stream in inputs)
+        self.max_pull_samples = reference_input.max_pull_samples
+        self.dtype = reference_input.dtype
+        self.n_input_channels = sum(input_stream.n_channels for input_stream in inputs)
+        self.stacked_buffer = np.zeros((self.n_input_channels, self.max_pull_samples), dtype=self.dtype)
+        self.chain_plan = ProcessorChainPlan(self.processors, self.n_input_channels, self.max_pull_samples, reference_input.fs, self.dtype)
+        self.fs = self.chain_plan.fs
+        self.n_channels = self.chain_plan.n_channels_out
+
+    def configure(self, time_sync=False, **options):
+        if options:
+            raise Exception('signal graph node "%s" only supports the option time_sync (got: %s)' % (self.name, ', '.join(options)))
+        if time_sync and not self.time_sync:
+            for input_stream in self.inputs:
+                lsl_stream_hub.configureStream(input_stream.name, time_sync=True)
+            self.time_sync = True
+
+    def enableIngestionThread(self):
+        pass # the node is evaluated by the render loop
+
+    def pull(self, frame_rate):
+        pass # the node is evaluated after all LSL streams have been pulled (see evaluate)
+
+    def evaluate(self):
+        reference_input = self.inputs[0]
+        for input_idx, input_stream in enumerate(self.inputs[1:], 1):
+            if input_stream.samples is not None:
+                self._updateHistory(input_idx, input_stream.samples, input_stream.time_stamps)
+
+        self.n_frames += 1
+        if reference_input.samples is None:
+            self.samples = None
+            self.time_stamps = None
+            return
+
+        # stack the channels of all inputs at the time stamps of the reference input
+        n_samples = reference_input.samples.shape[1]
+        if n_samples > self.stacked_buffer.shape[1]:
+            self.stacked_buffer = np.zeros((self.n_input_channels, n_samples), dtype=self.dtype)
+        stacked_samples = self.stacked_buffer[:, :n_samples]
+        stacked_samples[:reference_input.n_channels] = reference_input.samples
+        start_channel = reference_input.n_channels
+        for input_stream, history in zip(self.inputs[1:], self.input_histories[1:]):
+            end_channel = start_channel + input_stream.n_channels
+            if history:
+                stacked_samples[start_channel:end_channel] = interpolateSamples(history[1], history[0], reference_input.time_stamps)
+            else:
+                stacked_samples[start_channel:end_channel] = 0 # no samples received yet
+            start_channel = end_channel
+
+        samples = self.chain_plan.run(stacked_samples, reference_input.time_stamps)
+        if samples is None:
+            self.samples = None
+            self.time_stamps = None
+            return
+        samples.flags.writeable = False
+        self.samples = samples
+        self.time_stamps = self.chain_plan.time_stamps # e.g. the time stamps of the samples retained by Decimate
+        self.n_samples += samples.shape[1]
+
+    def _updateHistory(self, input_idx, samples, time_stamps):
+        # keep the newest sample of the previous chunk and the current chunk, so that reference time stamps between two chunks can be interpolated
+        history = self.input_histories[input_idx]
+        if history:
+            self.input_histories[input_idx] = (np.concatenate((history[0][:, -1:], samples), axis=1), np.concatenate((history[1][-1:], time_stamps)))
+        else:
+            self.input_histories[input_idx] = (samples.copy(), time_stamps.copy())
+
+    def statistics(self):
+        return {'frames': self.n_frames, 'samples': self.n_samples, 'dropped_samples': 0, 'overflows': 0, 'backlog': 0, 'max_backlog': 0, 'latency': self.latency}
+
+
+def interpolateSamples(time_stamps, samples, target_time_stamps):
+    # linear interpolation of samples [channels x samples] at the target time stamps (like np.interp for every channel); target time stamps before the first or
+    # after the last time stamp get the first or last sample
+    if len(time_stamps) == 1:
+        return np.repeat(samples, len(target_time_stamps), axis=1)
+    idcs = np.clip(np.searchsorted(time_stamps, target_time_stamps, side='right'), 1, len(time_stamps) - 1)
+    interval = time_stamps[idcs] - time_stamps[idcs - 1]
+    weights = np.clip(np.divide(target_time_stamps - time_stamps[idcs - 1], interval, out=np.ones(len(target_time_stamps)), where=interval > 0), 0, 1)
+    return samples[:, idcs - 1] + (samples[:, idcs] - samples[:, idcs - 1]) * weights
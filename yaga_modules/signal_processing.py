@@ -1,6 +1,27 @@
-from scipy import signal
+import os
+from pathlib import Path
+from scipy import ndimage, signal
 import numpy as np
-import pyxdf
+
+from yaga_modules.calibration import PARALLEL_MIN_VALUES, loadStreams, cachedConstants, sampleChunks, channelSamples, workerPool, mapChunks, markerEpochs, epochedSignal
+
+
+# affine processors implement linearTransform(n_channels), which returns the matrix A [channels_out x n_channels] and the offset b [channels_out] with
+# samples_out = A @ samples_in + b (channels_out is n_channels or 1); the LSL stream hub fuses runs of consecutive affine processors into a single transform
+
+# processors can accept an optional output array in update(samples_in, fs, out=None) (like the "out" argument of NumPy ufuncs)
+# the output array has the shape of the output (the shape of samples_in unless the processor implements outputChannels) and may be samples_in itself
+# (in-place processing); this allows the LSL stream hub to run processor
+# chains in preallocated buffers without allocating memory per frame
+
+# the samples can be float64 or float32 (see the dtype option of LSL streams); stateful processors keep their state in the data type of the samples
+# processors which need float64 implement internalDtype(fs), which returns the data type in which they have to operate (or None)
+FLOAT32_MIN_CUTOFF = 0.01 # IIR filters with a cutoff frequency below this fraction of the Nyquist frequency operate in float64 (float32 is too imprecise)
+
+
+# data type of an IIR filter with the given cutoff frequencies
+def iirFilterDtype(cutoff_frqs, fs):
+    return np.float64 if np.min(cutoff_frqs) < FLOAT32_MIN_CUTOFF * fs/2 else None
 
 
 # set channels to a constant value
@@ -9,9 +30,14 @@ class Constant:
     def __init__(self, value):
         self.value = value
 
-    def update(self, samples_in, fs):
-        samples_out = np.full(samples_in.shape, self.value)
-        return samples_out
+    def update(self, samples_in, fs, out=None):
+        if out is None:
+            return np.full(samples_in.shape, self.value)
+        out[...] = self.value
+        return out
+
+    def linearTransform(self, n_channels):
+        return np.zeros((n_channels, n_channels)), np.full((n_channels,), self.value, dtype=np.float64)
 
 
 # copy channel
@@ -27,6 +53,12 @@ class CopyChannel:
         samples_out[self.channel_out, :] = samples_in[self.channel_in, :]
         return samples_out
 
+    def linearTransform(self, n_channels):
+        matrix = np.eye(n_channels)
+        matrix[self.channel_out, :] = 0
+        matrix[self.channel_out, self.channel_in] = 1
+        return matrix, np.zeros((n_channels,))
+
 
 # Butterworth filter
 class ButterFilter:
@@ -37,18 +69,21 @@ class ButterFilter:
         self.filter_type = filter_type
         self.z = None
 
+    def internalDtype(self, fs):
+        return iirFilterDtype(self.cutoff_frqs, fs)
+
     def update(self, samples_in, fs):
         # samples_in/out: [channels x samples]
 
         # design and initialize filter
         if self.z is None:
             # design filter
-            self.sos = signal.butter(self.order, self.cutoff_frqs, self.filter_type, fs=fs, output='sos')
+            self.sos = signal.butter(self.order, self.cutoff_frqs, self.filter_type, fs=fs, output='sos').astype(samples_in.dtype)
 
             # initialize filter state for step response steady-state
             z_one_channel = signal.sosfilt_zi(self.sos) # [sections x 2]
             n_channels = samples_in.shape[0]
-            self.z = np.tile(z_one_channel[:, np.newaxis, :], [1, n_channels, 1]) # [sections x n_channels x 2]
+            self.z = np.tile(z_one_channel[:, np.newaxis, :], [1, n_channels, 1]).astype(samples_in.dtype) # [sections x n_channels x 2]
 
         # apply Butterworth filter using cascaded second-order sections (filter along last dimension)
         samples_out, self.z = signal.sosfilt(self.sos, samples_in, zi=self.z)
@@ -56,32 +91,215 @@ class ButterFilter:
         return samples_out
 
 
+# moving average over the last window_samples samples computed with a running sum, i.e. the costs per sample do not depend on the window length
+# the output is identical to an FIR filter with window_samples coefficients 1/window_samples (lfilter); the filter state is the history of the last
+# window_samples input samples (a ring buffer), which is initialized with initial_value (0: lfilter with zero state, 1: lfilter with lfilter_zi state)
+class RunningSumFilter:
+
+    def __init__(self, n_channels, window_samples, initial_value=0.0, dtype=np.float64):
+        assert window_samples > 0, 'the moving average window must contain at least one sample'
+        self.window_samples = window_samples
+        self.history = np.full((n_channels, window_samples), float(initial_value), dtype=dtype)
+        self.history_idx = 0 # index of the oldest sample in the history
+
+    def filter(self, samples_in):
+        # samples_in/out: [channels x samples]
+        n_samples = samples_in.shape[1]
+
+        # samples which leave the window: the oldest history samples followed by the first input samples
+        history_idcs = (self.history_idx + np.arange(min(n_samples, self.window_samples))) % self.window_samples
+        if n_samples <= self.window_samples:
+            leaving_samples = self.history[:, history_idcs]
+        else:
+            leaving_samples = np.concatenate((self.history[:, history_idcs], samples_in[:, :n_samples - self.window_samples]), axis=1)
+
+        # running sum; the sum of the history is recomputed for every chunk, so that rounding errors do not accumulate
+        window_sum = self.history.sum(axis=1, keepdims=True) + np.cumsum(samples_in, axis=1) - np.cumsum(leaving_samples, axis=1)
+        samples_out = window_sum / self.window_samples
+
+        # update history
+        if n_samples < self.window_samples:
+            self.history[:, history_idcs] = samples_in
+            self.history_idx = (self.history_idx + n_samples) % self.window_samples
+        else:
+            self.history[:, :] = samples_in[:, -self.window_samples:]
+            self.history_idx = 0
+
+        return samples_out
+
+
 # moving average filter
 class MovAvg:
 
     def __init__(self, window_length):
         self.window_length = window_length
-        self.b = None
-        self.a = None
-        self.z = None
+        self.running_sum_filter = None
 
     def update(self, samples_in, fs):
         # samples_in/out: [channels x samples]
 
-        # specify and initialize filter
-        if self.z is None:
-            # compute filter coefficients
+        # initialize filter
+        if self.running_sum_filter is None:
             window_samples = int(np.round(self.window_length*fs)) # convert [s] into [samples]
-            self.b = np.repeat(1.0/window_samples, window_samples)
-            self.a = 1
-            self.z = np.tile(0, (samples_in.shape[0], window_samples-1)) # [channels x window_samples - 1]
+            self.running_sum_filter = RunningSumFilter(samples_in.shape[0], window_samples, dtype=samples_in.dtype) # filter state is initialized with zeros
+
+        # apply moving average filter (filter along last dimension)
+        samples_out = self.running_sum_filter.filter(samples_in)
+
+        return samples_out
+
+
+# causal running median of the last window_length seconds (e.g. to remove spikes from force signals); the window is rounded to an odd number of samples
+# the last window samples - 1 input samples are carried across chunks (initialized with zeros, like MovAvg)
+class MedFilt:
+
+    def __init__(self, window_length):
+        self.window_length = window_length
+        self.window_samples = None
+        self.buffer = None
+        self.filtered_buffer = None
+
+    def update(self, samples_in, fs, out=None):
+        # samples_in/out: [channels x samples]
+        n_samples = samples_in.shape[1]
+
+        # initialize filter
+        if self.window_samples is None:
+            self.window_samples = int(np.round(self.window_length*fs))//2*2 + 1 # convert [s] into [samples], odd number of samples (unique median)
+            self.buffer = np.zeros((samples_in.shape[0], self.window_samples - 1 + n_samples), dtype=samples_in.dtype)
+            self.filtered_buffer = np.empty_like(self.buffer)
+
+        # the buffer contains the last window_samples - 1 input samples followed by the input samples; the buffers only grow (i.e. they are reallocated
+        # until they hold the largest chunk) and smaller chunks use slices of them
+        if self.buffer.shape[1] < self.window_samples - 1 + n_samples:
+            buffer = np.empty((self.buffer.shape[0], self.window_samples - 1 + n_samples), dtype=self.buffer.dtype)
+            buffer[:, :self.window_samples - 1] = self.buffer[:, :self.window_samples - 1]
+            self.buffer = buffer
+            self.filtered_buffer = np.empty_like(buffer)
+        buffer = self.buffer[:, :self.window_samples - 1 + n_samples]
+        buffer[:, self.window_samples - 1:] = samples_in
+        filtered_buffer = self.filtered_buffer[:, :self.window_samples - 1 + n_samples]
+
+        # centered median filter of each channel; the output sample centered at window_samples//2 + i is the median of the window which ends at input sample i
+        # ndimage.median_filter keeps a running median when it filters a one-dimensional array, i.e. it is applied channel by channel (with size (1, window)
+        # on the two-dimensional buffer, it sorts every window and is 3-40 times slower); it filters the whole buffer, i.e. a chunk of n samples costs
+        # O((window_samples + n) log window_samples), also the window_samples - 1 positions of the carried samples whose outputs are discarded; computing
+        # only the n new outputs from a sliding window view with np.median costs O(n window_samples) and is slower for all tested windows (51-1001 samples)
+        for channel_idx in range(buffer.shape[0]):
+            ndimage.median_filter(buffer[channel_idx], size=self.window_samples, mode='constant', output=filtered_buffer[channel_idx])
+        samples_out = filtered_buffer[:, self.window_samples//2:self.window_samples//2 + n_samples]
+
+        # keep the last window_samples - 1 samples as filter state
+        buffer[:, :self.window_samples - 1] = buffer[:, n_samples:].copy()
+
+        if out is None:
+            return samples_out.copy()
+        out[...] = samples_out
+        return out
+
+
+# decimation by an integer factor with an anti-aliasing FIR lowpass filter (like scipy.signal.decimate with ftype='fir')
+# polyphase implementation: the filter output is only computed for the retained samples; the filter state (the last input samples and the phase of the
+# decimation) is carried across chunks; processors after Decimate operate with the reduced sampling rate (fs/factor)
+class Decimate:
+
+    def __init__(self, factor, n_taps=None):
+        assert isinstance(factor, int) and factor > 0, '"factor" must be a positive integer'
+        self.factor = factor
+        self.n_taps = n_taps if n_taps else 20*factor + 1
+        self.coefficients = None
+        self.buffer = None
+        self.phase = 0 # position of the next retained sample in the next chunk
+        self.retained_idcs = np.zeros((0,), dtype=np.intp)
+
+    def outputRate(self, fs):
+        return fs / self.factor
+
+    def outputSampleIndices(self):
+        # indices of the input samples of the last update which were retained, i.e. the output samples have the time stamps of these input samples
+        return self.retained_idcs
+
+    def update(self, samples_in, fs):
+        # samples_in: [channels x samples]
+        # samples_out: [channels x retained samples] (can be empty)
+        n_samples = samples_in.shape[1]
 
-        # apply FIR filter (filter along last dimension)
-        samples_out, self.z = signal.lfilter(self.b, self.a, samples_in, zi=self.z)
+        # design and initialize filter
+        if self.coefficients is None:
+            if self.factor == 1:
+                self.n_taps = 1
+                self.coefficients = np.ones((1,), dtype=samples_in.dtype) # no decimation
+            else:
+                self.coefficients = signal.firwin(self.n_taps, 1.0/self.factor, window='hamming')[::-1].astype(samples_in.dtype) # reversed coefficients, i.e. a dot product with the last n_taps input samples
+            self.buffer = np.zeros((samples_in.shape[0], self.n_taps - 1 + n_samples), dtype=samples_in.dtype) # the filter state (the last n_taps - 1 samples) is initialized with zeros
+
+        # the buffer contains the filter state followed by the input samples
+        if self.buffer.shape[1] < self.n_taps - 1 + n_samples:
+            buffer = np.empty((self.buffer.shape[0], self.n_taps - 1 + n_samples), dtype=self.buffer.dtype)
+            buffer[:, :self.n_taps - 1] = self.buffer[:, :self.n_taps - 1]
+            self.buffer = buffer
+        self.buffer[:, self.n_taps - 1:self.n_taps - 1 + n_samples] = samples_in
+
+        # filter output of the retained samples: dot products of the coefficients with a strided view of the last n_taps input samples of each retained sample
+        self.retained_idcs = np.arange(self.phase, n_samples, self.factor)
+        n_retained = len(self.retained_idcs)
+        windows = np.lib.stride_tricks.as_strided(self.buffer[:, self.phase:], shape=(self.buffer.shape[0], n_retained, self.n_taps), strides=(self.buffer.strides[0], self.buffer.strides[1]*self.factor, self.buffer.strides[1]), writeable=False)
+        samples_out = np.einsum('cst,t->cs', windows, self.coefficients)
+
+        # keep the last n_taps - 1 samples as filter state
+        self.buffer[:, :self.n_taps - 1] = self.buffer[:, n_samples:n_samples + self.n_taps - 1].copy()
+        self.phase = (self.phase - n_samples) % self.factor
 
         return samples_out
 
 
+# band power in several frequency bands: each band is filtered with a Butterworth bandpass filter, squared and smoothed with a moving average
+# the bands of all channels are stacked into one array [bands*channels x samples] (band-major: all channels of the first band, then all channels of the
+# second band, ...), so that squaring and smoothing are done once for all bands; the filters of all bands are designed once
+class BandPower:
+
+    def __init__(self, bands, order=4, window_length=0.25):
+        self.bands = [tuple(band) for band in bands]
+        assert len(self.bands) > 0 and all(len(band) == 2 and band[0] < band[1] for band in self.bands), '"bands" must be a list of [low, high] frequencies'
+        self.order = order
+        self.window_length = window_length
+        self.sos = None
+        self.running_sum_filter = None
+
+    def outputChannels(self, n_channels):
+        return len(self.bands) * n_channels
+
+    def internalDtype(self, fs):
+        return iirFilterDtype([band[0] for band in self.bands], fs)
+
+    def update(self, samples_in, fs, out=None):
+        # samples_in: [channels x samples]
+        # samples_out: [bands*channels x samples]
+        n_channels, n_samples = samples_in.shape
+
+        # design and initialize filters
+        if self.sos is None:
+            for band in self.bands:
+                assert band[1] < fs/2, 'the band %g-%g Hz exceeds the Nyquist frequency (%g Hz)' % (band[0], band[1], fs/2)
+            self.sos = [signal.butter(self.order, band, 'bandpass', fs=fs, output='sos').astype(samples_in.dtype) for band in self.bands]
+            self.z = [np.tile(signal.sosfilt_zi(sos)[:, np.newaxis, :], [1, n_channels, 1]).astype(samples_in.dtype) for sos in self.sos] # step response steady-state (see ButterFilter)
+            window_samples = max(1, int(np.round(self.window_length*fs))) # convert [s] into [samples]
+            self.running_sum_filter = RunningSumFilter(len(self.bands)*n_channels, window_samples, dtype=samples_in.dtype) # filter state is initialized with zeros
+
+        if out is None:
+            out = np.empty((len(self.bands)*n_channels, n_samples), dtype=samples_in.dtype)
+
+        # bandpass filter every band into its block of the stacked array
+        for band_idx, sos in enumerate(self.sos):
+            out[band_idx*n_channels:(band_idx + 1)*n_channels], self.z[band_idx] = signal.sosfilt(sos, samples_in, zi=self.z[band_idx])
+
+        # power of all bands, smoothed with one running sum
+        np.square(out, out=out)
+        out[...] = self.running_sum_filter.filter(out)
+
+        return out
+
+
 # calculates the angle in radians between the x-axis and the point given by (x,y)
 class Angle:
 
@@ -126,7 +344,7 @@ class Diff:
             samples_out = np.diff(samples_in, 1, axis=1, prepend=self.buffer[:, np.newaxis])
         else:
             samples_out = np.diff(samples_in, 1, axis=1, prepend=0)
-        self.buffer = samples_in[:, -1] # buffer last sample
+        self.buffer = samples_in[:, -1].copy() # buffer last sample (copy it, as samples_in can be a view of a buffer which is reused in the next frame)
         return samples_out
 
 
@@ -140,6 +358,9 @@ class Sum:
         samples_out = np.sum(samples_in, axis=0, keepdims=True)
         return samples_out
 
+    def linearTransform(self, n_channels):
+        return np.ones((1, n_channels)), np.zeros((1,))
+
 
 # mean over channels
 class Mean:
@@ -151,6 +372,9 @@ class Mean:
         samples_out = np.mean(samples_in, axis=0, keepdims=True)
         return samples_out
 
+    def linearTransform(self, n_channels):
+        return np.full((1, n_channels), 1.0/n_channels), np.zeros((1,))
+
 
 # sample-wise standard deviation (aka Global Field Power)
 class StdDev:
@@ -163,7 +387,12 @@ class StdDev:
         return samples_out
 
 
-# multiply channels by a scaling factor and add offsets before and after scaling
+# scalar parameters apply to all channels; lists and arrays contain one value per channel [channels x 1]
+def _channelValues(value):
+    return np.reshape(value, (-1, 1)) if np.ndim(value) > 0 else value
+
+
+# multiply channels by a scaling factor and add offsets before and after scaling (scalars or one value per channel)
 class Scaler:
 
     def __init__(self, scale=1, pre_offset=0, post_offset=0):
@@ -171,11 +400,20 @@ class Scaler:
         self.pre_offset = pre_offset
         self.post_offset = post_offset
 
-    def update(self, samples_in, fs):
+    def update(self, samples_in, fs, out=None):
         # samples_in/out: [channels x samples]
+        scale, pre_offset, post_offset = _channelValues(self.scale), _channelValues(self.pre_offset), _channelValues(self.post_offset)
 
-        samples_out = (samples_in + self.pre_offset) * self.scale + self.post_offset
-        return samples_out
+        if out is None:
+            return (samples_in + pre_offset) * scale + post_offset
+        np.add(samples_in, pre_offset, out=out)
+        np.multiply(out, scale, out=out)
+        np.add(out, post_offset, out=out)
+        return out
+
+    def linearTransform(self, n_channels):
+        scale = np.broadcast_to(self.scale, (n_channels,))
+        return np.diag(scale).astype(np.float64), np.broadcast_to(np.multiply(self.pre_offset, self.scale) + self.post_offset, (n_channels,)).astype(np.float64)
 
 
 # linearly map channels to a target range
@@ -187,11 +425,19 @@ class LinearMap:
         self.out_val1 = out_val1
         self.out_val2 = out_val2
 
-    def update(self, samples_in, fs):
+    def update(self, samples_in, fs, out=None):
         # samples_in/out: [channels x samples]
 
-        samples_out = (samples_in - self.in_val1) / (self.in_val2 - self.in_val1) * (self.out_val2 - self.out_val1) + self.out_val1
-        return samples_out
+        if out is None:
+            return (samples_in - self.in_val1) / (self.in_val2 - self.in_val1) * (self.out_val2 - self.out_val1) + self.out_val1
+        np.subtract(samples_in, self.in_val1, out=out)
+        np.multiply(out, (self.out_val2 - self.out_val1) / (self.in_val2 - self.in_val1), out=out)
+        np.add(out, self.out_val1, out=out)
+        return out
+
+    def linearTransform(self, n_channels):
+        gain = (self.out_val2 - self.out_val1) / (self.in_val2 - self.in_val1)
+        return np.eye(n_channels) * gain, np.full((n_channels,), self.out_val1 - self.in_val1 * gain, dtype=np.float64)
 
 
 # limit channels to minimum and maximum values
@@ -201,20 +447,20 @@ class Limit:
             self.min_val = min_val
             self.max_val = max_val
 
-        def update(self, samples_in, fs):
+        def update(self, samples_in, fs, out=None):
             # samples_in/out: [channels x samples]
 
-            samples_out = np.clip(samples_in, self.min_val, self.max_val)
+            samples_out = np.clip(samples_in, self.min_val, self.max_val, out=out)
             return samples_out
 
 
 # calculate absolute values
 class Abs:
 
-    def update(self, samples_in, fs):
+    def update(self, samples_in, fs, out=None):
         # samples_in/out: [channels x samples]
 
-        samples_out = np.absolute(samples_in)
+        samples_out = np.absolute(samples_in, out=out)
         return samples_out
 
 
@@ -224,10 +470,10 @@ class Power:
     def __init__(self, exponent):
         self.exponent = exponent
 
-    def update(self, samples_in, fs):
+    def update(self, samples_in, fs, out=None):
         # samples_in/out: [channels x samples]
 
-        samples_out = np.power(samples_in, self.exponent)
+        samples_out = np.power(samples_in, self.exponent, out=out)
         return samples_out
 
 
@@ -241,70 +487,77 @@ class EuclidNorm:
         return samples_out
 
 
+# spatial filter: mixes the channels with a matrix [channels_out x channels_in] (e.g. common average reference, Laplacian, ICA or CSP unmixing matrix)
+# the matrix can be given as an array or as the file name of a NumPy .npy file; when the filter is applied to all channels of a stream, the number of output
+# channels can differ from the number of input channels
+class SpatialFilter:
+
+    def __init__(self, matrix):
+        if isinstance(matrix, (str, Path)):
+            matrix = np.load(matrix)
+        self.matrix = np.array(matrix, dtype=np.float64)
+        assert self.matrix.ndim == 2, 'the spatial filter matrix must be 2-dimensional [channels_out x channels_in]'
+
+    def outputChannels(self, n_channels):
+        assert n_channels == self.matrix.shape[1], 'the spatial filter matrix expects %d input channels (got %d channels)' % (self.matrix.shape[1], n_channels)
+        return self.matrix.shape[0]
+
+    def linearTransform(self, n_channels):
+        self.outputChannels(n_channels)
+        return self.matrix, np.zeros((self.matrix.shape[0],))
+
+    def update(self, samples_in, fs, out=None):
+        # samples_in: [channels_in x samples]
+        # samples_out: [channels_out x samples]
+
+        if out is not None and np.shares_memory(out, samples_in):
+            out[...] = self.matrix @ samples_in # a matrix multiplication cannot be computed in place
+            return out
+        return np.matmul(self.matrix, samples_in, out=out)
+
+
+# spatial filter matrix of the common average reference (CAR): subtracts the mean of all channels from each channel
+def carMatrix(n_channels):
+    return np.eye(n_channels) - 1.0/n_channels
+
+
+# spatial filter matrix of the Laplacian of a grid of electrodes (e.g. HD-EMG grid): subtracts the mean of the direct neighbours (4 or 8) from each channel
+# channels are numbered row by row (channel_order='rows') or column by column (channel_order='columns'); electrodes at the border have fewer neighbours
+def gridLaplacianMatrix(n_rows, n_columns, n_neighbours=4, channel_order='rows'):
+    assert n_neighbours in (4, 8), '"n_neighbours" must be 4 or 8'
+    assert channel_order in ('rows', 'columns'), '"channel_order" must be "rows" or "columns"'
+    channel_idcs = np.arange(n_rows*n_columns).reshape((n_rows, n_columns), order='C' if channel_order == 'rows' else 'F')
+    if n_neighbours == 4:
+        offsets = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+    else:
+        offsets = [(row_offset, column_offset) for row_offset in (-1, 0, 1) for column_offset in (-1, 0, 1) if row_offset or column_offset]
+
+    matrix = np.eye(n_rows*n_columns)
+    for row in range(n_rows):
+        for column in range(n_columns):
+            neighbours = [channel_idcs[row + row_offset, column + column_offset] for row_offset, column_offset in offsets if 0 <= row + row_offset < n_rows and 0 <= column + column_offset < n_columns]
+            matrix[channel_idcs[row, column], neighbours] = -1.0/len(neighbours)
+    return matrix
+
+
 # normalize channels by the maximum Euclidean norm found in the specified XDF file (e.g. force normalization)
+# the calibration constants are cached (see calibration.py); set use_cache to False to calculate them from the XDF file without reading or writing the
+# cache, and cache_streams to True to cache the extracted streams as well
 class MaxEuclidNormalizationXDF:
 
-    def __init__(self, xdf_file, data_stream_name, marker_stream_name, start_marker, end_marker, data_stream_channels=None, offset=None, filter_window_length=31):
-        data, _ = pyxdf.load_xdf(xdf_file)
-
-        # self.filter_cutoff_frqs = filter_cutoff_frqs
-        # self.filter_order = filter_order
-
-        # find data and marker streams
-        data_stream = list(filter(lambda x: x['info']['name'] == [data_stream_name], data))
-        marker_stream = list(filter(lambda x: x['info']['name'] == [marker_stream_name], data))
-        if len(data_stream) == 0:
-            raise Exception('data stream "%s" not found' % data_stream_name)
-        if len(marker_stream) == 0:
-            raise Exception('marker stream "%s" not found' % marker_stream_name)
-        if len(data_stream) > 1:
-            raise Exception('found more than one data stream "%s"' % data_stream_name)
-        if len(marker_stream) > 1:
-            raise Exception('found more than one marker stream "%s"' % marker_stream_name)
-        data_stream = data_stream[0]
-        marker_stream = marker_stream[0]
-
-        # find start and end marker indices
-        start_marker_idcs = [idx for idx, item in enumerate(marker_stream['time_series']) if item[0] == start_marker]
-        end_marker_idcs = [idx for idx, item in enumerate(marker_stream['time_series']) if item[0] == end_marker]
-        assert len(start_marker_idcs) == len(end_marker_idcs), 'number of start and end markers are different'
-
-        # get signal
-        stream_fs = int(float(data_stream['info']['nominal_srate'][0]))
-        if data_stream_channels:
-            raw_signal = data_stream['time_series'][:, data_stream_channels].transpose() # [channels x samples]
-        else:
-            raw_signal = data_stream['time_series'].transpose() # [channels x samples]
-        n_channels = raw_signal.shape[0]
-
-        # filter signal
+    def __init__(self, xdf_file, data_stream_name, marker_stream_name, start_marker, end_marker, data_stream_channels=None, offset=None, filter_window_length=31, use_cache=True, cache_streams=False, n_workers=None):
         assert np.mod(filter_window_length, 2), '"filter_window_length" must be odd'
-        filtered_signal = np.empty(raw_signal.shape)
-        for channel_idx in range(n_channels):
-            filtered_signal[channel_idx, :] = signal.medfilt(raw_signal[channel_idx, :], filter_window_length)
+        parameters = {'data_stream_name': data_stream_name, 'marker_stream_name': marker_stream_name, 'start_marker': start_marker, 'end_marker': end_marker,
+                      'data_stream_channels': data_stream_channels, 'offset': offset, 'filter_window_length': filter_window_length}
+        calculate = lambda: maxEuclidNormalizationConstants(loadStreams(xdf_file, [data_stream_name, marker_stream_name], use_cache, cache_streams), **parameters, n_workers=n_workers)
+        constants = cachedConstants(xdf_file, 'MaxEuclidNormalizationXDF', parameters, calculate) if use_cache else calculate()
 
+        self.min_values = np.array(constants['min_values'])
+        self.norm_value = constants['norm_value']
         if offset:
-            self.min_values = offset*np.ones((n_channels,))
             print('max Euclidean norm normalization: using predefined offset: ', self.min_values)
         else:
-            self.min_values = np.amin(filtered_signal, axis=1)
             print('max Euclidean norm normalization: found offset: ', self.min_values)
-        offsetfree_signal = filtered_signal - self.min_values[:, np.newaxis] # [channels x samples]
-
-        # calculate 2-norm
-        signal_norm = np.linalg.norm(offsetfree_signal, axis=0)
-
-        # extract epochs
-        epoched_signal = np.array(())
-        for start_marker_idx, end_marker_idx in zip(start_marker_idcs, end_marker_idcs):
-            start_timestamp = marker_stream['time_stamps'][start_marker_idx]
-            end_timestamp = marker_stream['time_stamps'][end_marker_idx]
-            assert end_timestamp > start_timestamp, 'end maker must be after start marker'
-            signal_epoch = signal_norm[np.where(np.logical_and(data_stream['time_stamps'] >= start_timestamp, data_stream['time_stamps'] <= end_timestamp))]
-            epoched_signal = np.concatenate((epoched_signal, signal_epoch))
-
-        # find maximum value
-        self.norm_value = np.amax(epoched_signal)
         print('max Euclidean norm normalization: found maximum value of %.2f' % self.norm_value)
 
 
@@ -317,100 +570,49 @@ class MaxEuclidNormalizationXDF:
 
 
 # normalize channels by the maximum power found in the specified XDF file (e.g. EMG power normalization)
+# the calibration constants are cached (see calibration.py); set use_cache to False to calculate them from the XDF file without reading or writing the
+# cache, and cache_streams to True to cache the extracted streams as well
 class MaxAvgPowerNormalizationXDF:
 
-    def __init__(self, xdf_file, data_stream_name, marker_stream_name, start_marker, end_marker, data_stream_channels=None, prefilter_order=4, prefilter_cutoff_frqs=[150, 300], postfilter_win_length=1):
-        data, _ = pyxdf.load_xdf(xdf_file)
-
+    def __init__(self, xdf_file, data_stream_name, marker_stream_name, start_marker, end_marker, data_stream_channels=None, prefilter_order=4, prefilter_cutoff_frqs=[150, 300], postfilter_win_length=1, use_cache=True, cache_streams=False):
         self.prefilter_cutoff_frqs = prefilter_cutoff_frqs
         self.prefilter_order = prefilter_order
         self.postfilter_win_length = postfilter_win_length # [s]
 
-        # find data and marker streams
-        data_stream = list(filter(lambda x: x['info']['name'] == [data_stream_name], data))
-        marker_stream = list(filter(lambda x: x['info']['name'] == [marker_stream_name], data))
-        if len(data_stream) == 0:
-            raise Exception('data stream "%s" not found' % data_stream_name)
-        if len(marker_stream) == 0:
-            raise Exception('marker stream "%s" not found' % marker_stream_name)
-        if len(data_stream) > 1:
-            raise Exception('found more than one data stream "%s"' % data_stream_name)
-        if len(marker_stream) > 1:
-            raise Exception('found more than one marker stream "%s"' % marker_stream_name)
-        data_stream = data_stream[0]
-        marker_stream = marker_stream[0]
-
-        # find start and end marker indices
-        start_marker_idcs = [idx for idx, item in enumerate(marker_stream['time_series']) if item[0] == start_marker]
-        end_marker_idcs = [idx for idx, item in enumerate(marker_stream['time_series']) if item[0] == end_marker]
-        assert len(start_marker_idcs) == len(end_marker_idcs), 'number of start and end markers are different'
-
-        # get signal
-        stream_fs = int(float(data_stream['info']['nominal_srate'][0]))
-        if data_stream_channels:
-            raw_signal = data_stream['time_series'][:, data_stream_channels].transpose() # [channels x samples]
-        else:
-            raw_signal = data_stream['time_series'].transpose() # [channels x samples]
-        n_channels = raw_signal.shape[0]
-
-        # bandpass filter raw signals
-        prefilter_sos = signal.butter(self.prefilter_order, self.prefilter_cutoff_frqs, 'bandpass', fs=stream_fs, output='sos')
-        # initialize filter state for step response steady-state
-        prefilter_z_one_channel = signal.sosfilt_zi(prefilter_sos) # [sections x 2]
-        prefilter_z = np.tile(prefilter_z_one_channel[:, np.newaxis, :], [1, n_channels, 1]) # [sections x n_channels x 2]
-        filtered_signal, _ = signal.sosfilt(prefilter_sos, raw_signal, zi=prefilter_z)
-
-        # calculate signal power, smooth with a moving average filter, then average over all channels
-        mov_avg_samples = int(stream_fs*self.postfilter_win_length)
-        postfilter_B = 1.0/mov_avg_samples*np.ones((mov_avg_samples,))
-        postfilter_A = 1
-        # initialize filter state for step response steady-state
-        postfilter_z_one_channel = signal.lfilter_zi(postfilter_B, postfilter_A)
-        postfilter_z = np.tile(postfilter_z_one_channel.reshape(1, -1), [n_channels, 1])
-        filtered_signal_power, _ = signal.lfilter(postfilter_B, postfilter_A, filtered_signal**2, zi=postfilter_z) # [channels x samples]
-        # avg_filtered_signal_power = 10.0*np.log10(np.median(filtered_signal_power, axis=0)) # [samples, ]
-        avg_filtered_signal_power = np.median(filtered_signal_power, axis=0) # [samples, ]
+        parameters = {'data_stream_name': data_stream_name, 'marker_stream_name': marker_stream_name, 'start_marker': start_marker, 'end_marker': end_marker,
+                      'data_stream_channels': data_stream_channels, 'prefilter_order': prefilter_order, 'prefilter_cutoff_frqs': prefilter_cutoff_frqs,
+                      'postfilter_win_length': postfilter_win_length}
+        calculate = lambda: maxAvgPowerNormalizationConstants(loadStreams(xdf_file, [data_stream_name, marker_stream_name], use_cache, cache_streams), **parameters)
+        constants = cachedConstants(xdf_file, 'MaxAvgPowerNormalizationXDF', parameters, calculate) if use_cache else calculate()
 
-        # extract epochs
-        epoched_signal = np.array(())
-        for start_marker_idx, end_marker_idx in zip(start_marker_idcs, end_marker_idcs):
-            start_timestamp = marker_stream['time_stamps'][start_marker_idx]
-            end_timestamp = marker_stream['time_stamps'][end_marker_idx]
-            assert end_timestamp > start_timestamp, 'end maker must be after start marker'
-            signal_epoch = avg_filtered_signal_power[np.where(np.logical_and(data_stream['time_stamps'] >= start_timestamp, data_stream['time_stamps'] <= end_timestamp))]
-            epoched_signal = np.concatenate((epoched_signal, signal_epoch))
-
-        # find 90 percentile
-        self.max_value = np.percentile(epoched_signal, 90)
+        self.max_value = constants['max_value']
         print('max power normalization: found maximum value of %.2f' % self.max_value)
 
         # reset filter coefficients; they are set in the first update call and adjusted to the online sampling rate
         self.prefilter_sos = None
         self.prefilter_z = None
-        self.postfilter_B = None
-        self.postfilter_A = None
-        self.postfilter_z = None
+        self.postfilter = None
+
 
+    def internalDtype(self, fs):
+        return iirFilterDtype(self.prefilter_cutoff_frqs, fs)
 
     def update(self, samples_in, fs):
         # samples_in: [channels x samples]
         # samples_out: [1 x samples]
 
         # initialize pre&post filters
-        if self.prefilter_z is None or self.postfilter_z is None:
+        if self.prefilter_z is None or self.postfilter is None:
             n_channels = samples_in.shape[0]
 
             # initialize bandpass filter (aka prefilter)
-            self.prefilter_sos = signal.butter(self.prefilter_order, self.prefilter_cutoff_frqs, 'bandpass', fs=fs, output='sos')
+            self.prefilter_sos = signal.butter(self.prefilter_order, self.prefilter_cutoff_frqs, 'bandpass', fs=fs, output='sos').astype(samples_in.dtype)
             prefilter_z_one_channel = signal.sosfilt_zi(self.prefilter_sos) # [sections x 2]
-            self.prefilter_z = np.tile(prefilter_z_one_channel[:, np.newaxis, :], [1, n_channels, 1]) # [sections x n_channels x 2]
+            self.prefilter_z = np.tile(prefilter_z_one_channel[:, np.newaxis, :], [1, n_channels, 1]).astype(samples_in.dtype) # [sections x n_channels x 2]
 
-            # initialize moving average filter (aka postfilter)
+            # initialize moving average filter (aka postfilter); its state corresponds to the step response steady-state (lfilter_zi)
             mov_avg_samples = int(fs*self.postfilter_win_length)
-            self.postfilter_B = 1.0/mov_avg_samples*np.ones((mov_avg_samples,))
-            self.postfilter_A = 1
-            z_one_channel = signal.lfilter_zi(self.postfilter_B, self.postfilter_A)
-            self.postfilter_z = np.tile(z_one_channel.reshape(1, -1), [n_channels, 1]) # [channels x max(len(a),len(b))-1]
+            self.postfilter = RunningSumFilter(n_channels, mov_avg_samples, initial_value=1.0, dtype=samples_in.dtype)
 
             print('update: initialized filters with the stream sampling rate of %f Hz' % fs)
 
@@ -418,7 +620,7 @@ class MaxAvgPowerNormalizationXDF:
         filtered_samples, self.prefilter_z = signal.sosfilt(self.prefilter_sos, samples_in, zi=self.prefilter_z)
 
         # calculate signal power, smooth with a moving average filter, then average over all channels
-        filtered_samples_power, self.postfilter_z = signal.lfilter(self.postfilter_B, self.postfilter_A, filtered_samples**2, zi=self.postfilter_z) # [channels x samples]
+        filtered_samples_power = self.postfilter.filter(filtered_samples**2) # [channels x samples]
         # avg_filtered_samples_power = (10.0*np.log10(np.median(filtered_samples_power, axis=0))).reshape((1, -1)) # [1, samples]
         avg_filtered_samples_power = np.median(filtered_samples_power, axis=0).reshape((1, -1)) # [1, samples]
 
@@ -430,6 +632,97 @@ class MaxAvgPowerNormalizationXDF:
         return samples_out
 
 
+# calibration constants of MaxEuclidNormalizationXDF: channel offsets and the maximum Euclidean norm during the epochs
+# the median filter dominates the calibration time; the chunks of the data stream are filtered in n_workers worker processes (None: one per CPU core for
+# long recordings)
+def maxEuclidNormalizationConstants(streams, data_stream_name, marker_stream_name, start_marker, end_marker, data_stream_channels=None, offset=None, filter_window_length=31, n_workers=None):
+    data_stream = streams[data_stream_name]
+    epochs = markerEpochs(streams[marker_stream_name], start_marker, end_marker)
+    n_samples = data_stream.time_series.shape[0]
+    n_channels = len(data_stream_channels) if data_stream_channels else data_stream.time_series.shape[1]
+    chunks = list(sampleChunks(n_samples))
+    if n_workers is None:
+        n_workers = os.cpu_count() if n_samples*n_channels >= PARALLEL_MIN_VALUES else 1
+    n_workers = min(n_workers, len(chunks))
+
+    # samples between the start and end indices extended by half the filter window; the chunks overlap, and the signal is zero-padded at its ends (like
+    # medfilt applied to the whole signal)
+    half_window = filter_window_length//2
+    def paddedSignal(start, end):
+        padded_start, padded_end = max(start - half_window, 0), min(end + half_window, n_samples)
+        raw_signal = channelSamples(data_stream, data_stream_channels, padded_start, padded_end) # [channels x samples]
+        return np.pad(raw_signal, ((0, 0), (half_window - (start - padded_start), half_window - (padded_end - end))))
+
+    pool = workerPool(n_workers)
+    try:
+        if offset:
+            min_values = offset*np.ones((n_channels,))
+        else:
+            chunk_arguments = ((paddedSignal(start, end), filter_window_length) for start, end in chunks)
+            min_values = np.amin(list(mapChunks(_filteredChunkMinimum, chunk_arguments, pool, n_workers)), axis=0)
+
+        # calculate 2-norm, extract epochs and find maximum value
+        epoch_chunks = [(start, end) for start, end in chunks if np.any((epochs[:, 0] <= data_stream.time_stamps[end - 1]) & (epochs[:, 1] >= data_stream.time_stamps[start]))]
+        chunk_arguments = ((paddedSignal(start, end), filter_window_length, min_values, data_stream.time_stamps[start:end], epochs) for start, end in epoch_chunks)
+        norm_value = max(mapChunks(_filteredChunkMaxNorm, chunk_arguments, pool, n_workers), default=-np.inf)
+    finally:
+        if pool:
+            pool.shutdown()
+    if norm_value == -np.inf:
+        raise Exception('no samples of the data stream "%s" within the epochs' % data_stream_name)
+    return {'min_values': min_values.tolist(), 'norm_value': float(norm_value)}
+
+
+# median filter of a chunk [channels x samples] which is padded by half the filter window on both sides; medfilt of one-dimensional signals is much faster
+# than the two-dimensional median filters of SciPy (medfilt2d, ndimage.median_filter with a [1 x window] kernel)
+def _medianFilteredChunk(padded_signal, filter_window_length):
+    half_window = filter_window_length//2
+    filtered_signal = np.empty((padded_signal.shape[0], padded_signal.shape[1] - 2*half_window))
+    for channel_idx in range(padded_signal.shape[0]):
+        filtered_signal[channel_idx, :] = signal.medfilt(padded_signal[channel_idx, :], filter_window_length)[half_window:padded_signal.shape[1] - half_window]
+    return filtered_signal
+
+
+def _filteredChunkMinimum(padded_signal, filter_window_length):
+    return np.amin(_medianFilteredChunk(padded_signal, filter_window_length), axis=1)
+
+
+def _filteredChunkMaxNorm(padded_signal, filter_window_length, min_values, time_stamps, epochs):
+    offsetfree_signal = _medianFilteredChunk(padded_signal, filter_window_length) - min_values[:, np.newaxis] # [channels x samples]
+    epoched_signal = epochedSignal(np.linalg.norm(offsetfree_signal, axis=0), time_stamps, epochs)
+    return np.amax(epoched_signal) if len(epoched_signal) > 0 else -np.inf
+
+
+# calibration constants of MaxAvgPowerNormalizationXDF: 90th percentile of the median smoothed power over channels during the epochs
+def maxAvgPowerNormalizationConstants(streams, data_stream_name, marker_stream_name, start_marker, end_marker, data_stream_channels=None, prefilter_order=4, prefilter_cutoff_frqs=[150, 300], postfilter_win_length=1):
+    data_stream = streams[data_stream_name]
+    epochs = markerEpochs(streams[marker_stream_name], start_marker, end_marker)
+    stream_fs = int(data_stream.fs)
+    n_channels = len(data_stream_channels) if data_stream_channels else data_stream.time_series.shape[1]
+
+    # bandpass filter
+    prefilter_sos = signal.butter(prefilter_order, prefilter_cutoff_frqs, 'bandpass', fs=stream_fs, output='sos')
+    # initialize filter state for step response steady-state
+    prefilter_z_one_channel = signal.sosfilt_zi(prefilter_sos) # [sections x 2]
+    prefilter_z = np.tile(prefilter_z_one_channel[:, np.newaxis, :], [1, n_channels, 1]) # [sections x n_channels x 2]
+
+    # moving average filter of the signal power (state for step response steady-state, like lfilter_zi)
+    mov_avg_samples = int(stream_fs*postfilter_win_length)
+    postfilter = RunningSumFilter(n_channels, mov_avg_samples, initial_value=1.0)
+
+    # filter the signal chunk by chunk (the filter states are carried over), average the power over all channels and extract the epochs
+    epoched_signal_chunks = []
+    for start, end in sampleChunks(data_stream.time_series.shape[0]):
+        raw_signal = channelSamples(data_stream, data_stream_channels, start, end) # [channels x samples]
+        filtered_signal, prefilter_z = signal.sosfilt(prefilter_sos, raw_signal, zi=prefilter_z)
+        filtered_signal_power = postfilter.filter(np.square(filtered_signal, out=filtered_signal)) # [channels x samples]
+        avg_filtered_signal_power = np.median(filtered_signal_power, axis=0) # [samples, ]
+        epoched_signal_chunks.append(epochedSignal(avg_filtered_signal_power, data_stream.time_stamps[start:end], epochs))
+
+    # find 90 percentile
+    return {'max_value': float(np.percentile(np.concatenate(epoched_signal_chunks), 90))}
+
+
 # implements a Flappy Bird style control with spikes
 class FlappyBirdController:
 